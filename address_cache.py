@@ -0,0 +1,150 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Optional, Tuple
+from settings import load_settings
+
+load_settings()
+
+ADDRESS_CACHE_SIZE = int(os.environ.get("ADDRESS_CACHE_SIZE", 100000))
+ADDRESS_CACHE_NEGATIVE_SIZE = int(os.environ.get("ADDRESS_CACHE_NEGATIVE_SIZE", 10000))
+ADDRESS_CACHE_NEGATIVE_TTL = float(os.environ.get("ADDRESS_CACHE_NEGATIVE_TTL", 5))
+ADDRESS_CACHE_WARM_SIZE = int(os.environ.get("ADDRESS_CACHE_WARM_SIZE", 1000))
+
+
+class AddressCache:
+    def __init__(
+        self,
+        max_size: int = ADDRESS_CACHE_SIZE,
+        negative_size: int = ADDRESS_CACHE_NEGATIVE_SIZE,
+        negative_ttl: float = ADDRESS_CACHE_NEGATIVE_TTL,
+    ) -> None:
+        """
+        Initializes a bounded LRU cache of addresses by ID. Stored addresses never
+        change, so they stay cached until evicted. IDs found missing are cached apart,
+        for a short time only, since they may be created later.
+
+        Args:
+            max_size (int, optional): Maximum number of cached addresses. Defaults to
+                ADDRESS_CACHE_SIZE.
+            negative_size (int, optional): Maximum number of cached missing IDs.
+                Defaults to ADDRESS_CACHE_NEGATIVE_SIZE.
+            negative_ttl (float, optional): Seconds a missing ID stays cached.
+                Defaults to ADDRESS_CACHE_NEGATIVE_TTL.
+        """
+        self.max_size = max_size
+        self.negative_size = negative_size
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._addresses: "OrderedDict[int, str]" = OrderedDict()
+        self._missing: "OrderedDict[int, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_load(self, id: int, loader: Callable[[int], Optional[str]]) -> Optional[str]:
+        """
+        Returns the address of an ID, loading it on a cache miss.
+
+        Args:
+            id (int): The ID of the address.
+            loader (Callable): Function loading the address of an ID, returning None
+                if it does not exist.
+
+        Returns:
+            str: The address, or None if the ID does not exist.
+        """
+        with self._lock:
+            address = self._addresses.get(id)
+            if address is not None:
+                self._addresses.move_to_end(id)
+                self.hits += 1
+                return address
+            expires = self._missing.get(id)
+            if expires is not None:
+                if expires > time.monotonic():
+                    self.negative_hits += 1
+                    return None
+                del self._missing[id]
+            self.misses += 1
+
+        address = loader(id)
+        if address:
+            self.put(id, address)
+        else:
+            self._put_missing(id)
+        return address
+
+    def put(self, id: int, address: str) -> None:
+        """
+        Caches the address of an ID, evicting the least recently used one if full.
+
+        Args:
+            id (int): The ID of the address.
+            address (str): The address.
+        """
+        with self._lock:
+            self._missing.pop(id, None)
+            self._addresses[id] = address
+            self._addresses.move_to_end(id)
+            while len(self._addresses) > self.max_size:
+                self._addresses.popitem(last=False)
+                self.evictions += 1
+
+    def forget_missing(self) -> None:
+        """
+        Drops the cached missing IDs, which new inserts may have created.
+        """
+        with self._lock:
+            self._missing.clear()
+
+    def warm(self, rows: Iterable[Tuple[int, str]]) -> int:
+        """
+        Caches rows ahead of the lookups, e.g. the most recent addresses at startup.
+
+        Args:
+            rows (Iterable[Tuple[int, str]]): The ID and address of each row.
+
+        Returns:
+            int: The number of cached rows.
+        """
+        count = 0
+        for id, address in rows:
+            self.put(id, address)
+            count += 1
+        return count
+
+    def clear(self) -> None:
+        """
+        Drops every cached entry.
+        """
+        with self._lock:
+            self._addresses.clear()
+            self._missing.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the cache counters.
+
+        Returns:
+            dict: The hit, negative hit, miss and eviction counters, and the number of
+                cached addresses and missing IDs.
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._addresses),
+                "missing": len(self._missing),
+            }
+
+    def _put_missing(self, id: int) -> None:
+        with self._lock:
+            self._missing[id] = time.monotonic() + self.negative_ttl
+            self._missing.move_to_end(id)
+            while len(self._missing) > self.negative_size:
+                self._missing.popitem(last=False)
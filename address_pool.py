@@ -0,0 +1,168 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, List, Optional
+from settings import load_settings
+
+load_settings()
+
+logger = logging.getLogger()
+
+ADDRESS_POOL_ENABLED = os.environ.get("ADDRESS_POOL_ENABLED", "false").lower() == "true"
+ADDRESS_POOL_CURRENCIES = os.environ.get("ADDRESS_POOL_CURRENCIES", "BTC,ETH,TRO").split(",")
+ADDRESS_POOL_LOW_WATERMARK = int(os.environ.get("ADDRESS_POOL_LOW_WATERMARK", 100))
+ADDRESS_POOL_HIGH_WATERMARK = int(os.environ.get("ADDRESS_POOL_HIGH_WATERMARK", 500))
+ADDRESS_POOL_REFILL_BATCH = int(os.environ.get("ADDRESS_POOL_REFILL_BATCH", 100))
+ADDRESS_POOL_INTERVAL = float(os.environ.get("ADDRESS_POOL_INTERVAL", 1.0))
+
+
+class AddressPool:
+    def __init__(
+        self,
+        currencies: Iterable[str],
+        refill: Callable[[str, int], List[str]],
+        low_watermark: int = ADDRESS_POOL_LOW_WATERMARK,
+        high_watermark: int = ADDRESS_POOL_HIGH_WATERMARK,
+        batch_size: int = ADDRESS_POOL_REFILL_BATCH,
+        interval: float = ADDRESS_POOL_INTERVAL,
+    ) -> None:
+        """
+        Initializes a per-currency pool of addresses generated and persisted ahead of
+        time, topped up by a background warmer.
+
+        Args:
+            currencies (Iterable[str]): The pooled cryptocurrency symbols.
+            refill (Callable): Function generating and persisting a batch of addresses
+                of a cryptocurrency, returning them.
+            low_watermark (int, optional): Depth below which the warmer is woken up.
+                Defaults to ADDRESS_POOL_LOW_WATERMARK.
+            high_watermark (int, optional): Depth the warmer tops the pool up to.
+                Defaults to ADDRESS_POOL_HIGH_WATERMARK.
+            batch_size (int, optional): Addresses generated per refill batch.
+                Defaults to ADDRESS_POOL_REFILL_BATCH.
+            interval (float, optional): Seconds between the warmer checks when it is
+                not woken up. Defaults to ADDRESS_POOL_INTERVAL.
+        """
+        self.refill = refill
+        self.low_watermark = low_watermark
+        self.high_watermark = high_watermark
+        self.batch_size = batch_size
+        self.interval = interval
+        self.pools: Dict[str, Deque[str]] = {crypto: deque() for crypto in currencies}
+        self.popped = {crypto: 0 for crypto in self.pools}
+        self.misses = {crypto: 0 for crypto in self.pools}
+        self.refilled = {crypto: 0 for crypto in self.pools}
+        self.refill_rate = {crypto: 0.0 for crypto in self.pools}
+        self.refill_errors = 0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._warmer: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def pop(self, crypto_symbol: str) -> Optional[str]:
+        """
+        Takes the next ready address of a cryptocurrency in O(1), waking the warmer up
+        when the pool drops below its low watermark.
+
+        Args:
+            crypto_symbol (str): The cryptocurrency symbol.
+
+        Returns:
+            str: The address, or None if the cryptocurrency is not pooled or its pool
+                ran dry.
+        """
+        pool = self.pools.get(crypto_symbol)
+        if pool is None:
+            return None
+        try:
+            address = pool.popleft()
+        except IndexError:
+            self.misses[crypto_symbol] += 1
+            self._wake.set()
+            return None
+        self.popped[crypto_symbol] += 1
+        if len(pool) < self.low_watermark:
+            self._wake.set()
+        return address
+
+    def refill_once(self, crypto_symbol: str) -> int:
+        """
+        Tops the pool of a cryptocurrency up to its high watermark, in batches.
+
+        Args:
+            crypto_symbol (str): The cryptocurrency symbol.
+
+        Returns:
+            int: The number of addresses added.
+        """
+        pool = self.pools[crypto_symbol]
+        added = 0
+        start = time.perf_counter()
+        while len(pool) < self.high_watermark and not self._stop.is_set():
+            count = min(self.batch_size, self.high_watermark - len(pool))
+            addresses = self.refill(crypto_symbol, count)
+            pool.extend(addresses)
+            added += len(addresses)
+        if added:
+            self.refilled[crypto_symbol] += added
+            self.refill_rate[crypto_symbol] = added / (time.perf_counter() - start)
+        return added
+
+    def start(self) -> None:
+        """
+        Starts the background warmer, if not running yet.
+        """
+        with self._lock:
+            if self._warmer is not None and self._warmer.is_alive():
+                return
+            self._stop.clear()
+            self._wake.set()
+            self._warmer = threading.Thread(
+                target=self._warm_loop, name="address-pool-warmer", daemon=True
+            )
+            self._warmer.start()
+
+    def stop(self) -> None:
+        """
+        Stops the background warmer.
+        """
+        self._stop.set()
+        self._wake.set()
+        if self._warmer is not None:
+            self._warmer.join()
+            self._warmer = None
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Returns the depth and refill metrics of every pool.
+
+        Returns:
+            dict: By cryptocurrency, the pool depth, the addresses served from the pool,
+                the misses served inline, the addresses refilled and the refill rate
+                in addresses per second of the last refill.
+        """
+        return {
+            crypto: {
+                "depth": len(pool),
+                "popped": self.popped[crypto],
+                "misses": self.misses[crypto],
+                "refilled": self.refilled[crypto],
+                "refill_rate": self.refill_rate[crypto],
+            }
+            for crypto, pool in self.pools.items()
+        }
+
+    def _warm_loop(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            for crypto_symbol, pool in self.pools.items():
+                if self._stop.is_set() or len(pool) >= self.low_watermark:
+                    continue
+                try:
+                    self.refill_once(crypto_symbol)
+                except Exception as error:
+                    self.refill_errors += 1
+                    logger.warning(f"Address pool refill of {crypto_symbol} failed: {error}")
@@ -0,0 +1,245 @@
+import os
+import time
+import hashlib
+import threading
+from array import array
+from typing import Callable, Dict, Iterator, Optional, Tuple
+from settings import load_settings
+
+load_settings()
+
+ADDRESS_REGISTRY_ENABLED = os.environ.get("ADDRESS_REGISTRY_ENABLED", "false").lower() == "true"
+ADDRESS_REGISTRY_CAPACITY = int(os.environ.get("ADDRESS_REGISTRY_CAPACITY", 1 << 16))
+ADDRESS_REGISTRY_MAX_LOAD = float(os.environ.get("ADDRESS_REGISTRY_MAX_LOAD", 0.7))
+ADDRESS_REGISTRY_SYNC_INTERVAL = float(os.environ.get("ADDRESS_REGISTRY_SYNC_INTERVAL", 5))
+ADDRESS_REGISTRY_RETRIES = int(os.environ.get("ADDRESS_REGISTRY_RETRIES", 3))
+
+
+class DuplicateAddressError(Exception):
+    """
+    Raised when no unused address could be generated.
+    """
+
+
+class HashTable:
+    def __init__(self, capacity: int, max_load: float) -> None:
+        """
+        Initializes a HashTable object, a set of 64-bit hashes stored in a flat array
+        with open addressing and linear probing, so each entry costs 8 bytes divided by
+        the load factor, and no Python object.
+
+        Args:
+            capacity (int): The initial number of slots, rounded up to a power of two.
+            max_load (float): The load factor from which the table doubles.
+        """
+        self.max_load = max_load
+        self.count = 0
+        self._slots = array("Q", [0]) * (1 << max(capacity - 1, 1).bit_length())
+        self._mask = len(self._slots) - 1
+
+    @property
+    def nbytes(self) -> int:
+        """
+        The size of the slot array in bytes.
+
+        Returns:
+            int: The size.
+        """
+        return len(self._slots) * self._slots.itemsize
+
+    def add(self, value: int) -> bool:
+        """
+        Adds a hash to the set.
+
+        Args:
+            value (int): The non-zero 64-bit hash.
+
+        Returns:
+            bool: False if the hash was already in the set.
+        """
+        slots, mask = self._slots, self._mask
+        index = value & mask
+        while slots[index]:
+            if slots[index] == value:
+                return False
+            index = (index + 1) & mask
+        slots[index] = value
+        self.count += 1
+        if self.count > len(slots) * self.max_load:
+            self._grow()
+        return True
+
+    def __contains__(self, value: int) -> bool:
+        """
+        Checks whether a hash is in the set.
+
+        Args:
+            value (int): The non-zero 64-bit hash.
+
+        Returns:
+            bool: True if the hash is in the set.
+        """
+        slots, mask = self._slots, self._mask
+        index = value & mask
+        while slots[index]:
+            if slots[index] == value:
+                return True
+            index = (index + 1) & mask
+        return False
+
+    def _grow(self) -> None:
+        old = self._slots
+        self._slots = array("Q", [0]) * (len(old) * 2)
+        self._mask = len(self._slots) - 1
+        self.count = 0
+        for value in old:
+            if value:
+                self.add(value)
+
+
+class AddressRegistry:
+    def __init__(self, capacity: int = ADDRESS_REGISTRY_CAPACITY,
+                 max_load: float = ADDRESS_REGISTRY_MAX_LOAD,
+                 sync_interval: float = ADDRESS_REGISTRY_SYNC_INTERVAL) -> None:
+        """
+        Initializes an AddressRegistry object, which records a 64-bit hash of every
+        known address of each cryptocurrency, to detect duplicates in O(1) without a
+        database round trip. Two distinct addresses share a hash with a probability of
+        about n^2 / 2^65 for n addresses, in which case the second is reported as a
+        duplicate.
+
+        The registry is loaded from the database on the first sync, records the
+        addresses claimed by this process, and catches up with the rows stored by
+        other processes at most every `sync_interval` seconds.
+
+        Args:
+            capacity (int, optional): The initial number of slots per cryptocurrency.
+                Defaults to ADDRESS_REGISTRY_CAPACITY.
+            max_load (float, optional): The load factor from which a table doubles.
+                Defaults to ADDRESS_REGISTRY_MAX_LOAD.
+            sync_interval (float, optional): Seconds between syncs done by claims.
+                Defaults to ADDRESS_REGISTRY_SYNC_INTERVAL.
+        """
+        self.capacity = capacity
+        self.max_load = max_load
+        self.sync_interval = sync_interval
+        self.duplicates = 0
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self.clear()
+
+    def claim(self, crypto: str, address: str) -> bool:
+        """
+        Records an address, unless already known.
+
+        Args:
+            crypto (str): The cryptocurrency symbol.
+            address (str): The address.
+
+        Returns:
+            bool: False if the address is a duplicate.
+        """
+        value = address_hash(address)
+        with self._lock:
+            table = self._tables.get(crypto)
+            if table is None:
+                table = self._tables[crypto] = HashTable(self.capacity, self.max_load)
+            if table.add(value):
+                return True
+            self.duplicates += 1
+            return False
+
+    def contains(self, crypto: str, address: str) -> bool:
+        """
+        Checks whether an address is known.
+
+        Args:
+            crypto (str): The cryptocurrency symbol.
+            address (str): The address.
+
+        Returns:
+            bool: True if the address is known.
+        """
+        with self._lock:
+            table = self._tables.get(crypto)
+            return table is not None and address_hash(address) in table
+
+    def sync(self, stream: Callable[[int], Iterator[Tuple[int, str, str]]]) -> int:
+        """
+        Records the addresses stored since the last sync, under the upper-case
+        symbol that `claim` is called with, whatever the case of the stored one.
+
+        Args:
+            stream (Callable): Streams the ID, address and cryptocurrency of the rows
+                stored after the given ID, ordered by ID.
+
+        Returns:
+            int: The number of rows read.
+        """
+        with self._sync_lock:
+            added = 0
+            for id, address, crypto in stream(self.last_id):
+                value = address_hash(address)
+                with self._lock:
+                    crypto = crypto.upper()
+                    table = self._tables.get(crypto)
+                    if table is None:
+                        table = self._tables[crypto] = HashTable(self.capacity, self.max_load)
+                    table.add(value)
+                self.last_id = id
+                added += 1
+            self.synced_at = time.monotonic()
+            return added
+
+    def sync_if_due(self, stream: Callable[[int], Iterator[Tuple[int, str, str]]]) -> None:
+        """
+        Syncs the registry if it was never synced, or not for `sync_interval` seconds.
+
+        Args:
+            stream (Callable): Streams the rows stored after the given ID.
+        """
+        if self.synced_at is None or time.monotonic() - self.synced_at >= self.sync_interval:
+            self.sync(stream)
+
+    def clear(self) -> None:
+        """
+        Forgets every address, so the next sync loads them again from the database.
+        """
+        with self._lock:
+            self._tables: Dict[str, HashTable] = {}
+            self.last_id = 0
+            self.synced_at: Optional[float] = None
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Returns the size of the registry of each cryptocurrency.
+
+        Returns:
+            dict: The number of addresses, the bytes used and the bytes per address of
+                each cryptocurrency, and the number of duplicates detected.
+        """
+        with self._lock:
+            stats = {
+                crypto: {
+                    "addresses": table.count,
+                    "bytes": table.nbytes,
+                    "bytes_per_address": round(table.nbytes / table.count, 1) if table.count else 0,
+                }
+                for crypto, table in self._tables.items()
+            }
+        stats["duplicates"] = self.duplicates
+        return stats
+
+
+def address_hash(address: str) -> int:
+    """
+    Hashes an address to a non-zero 64-bit integer, zero marking the empty slots.
+
+    Args:
+        address (str): The address.
+
+    Returns:
+        int: The hash.
+    """
+    value = int.from_bytes(hashlib.blake2b(address.encode(), digest_size=8).digest(), "little")
+    return value or 1
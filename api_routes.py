@@ -0,0 +1,86 @@
+import re
+from typing import Any, Dict, List, Optional, Pattern, Tuple
+import address_registry
+
+PREFIX = "/api-blockchain"
+
+# The routes served by both run.py and asgi.py, as the method and the rule, in the
+# `<name>` placeholder syntax of Flask, under PREFIX.
+ROUTES: List[Tuple[str, str]] = [
+    ("GET", "/"),
+    ("POST", "/generate"),
+    ("POST", "/generate/batch"),
+    ("POST", "/validate/batch"),
+    ("GET", "/list"),
+    ("GET", "/export"),
+    ("GET", "/addresses/<address_id>"),
+    ("GET", "/addresses/lookup/<address>"),
+    ("GET", "/stats"),
+    ("GET", "/ready"),
+    ("GET", "/metrics"),
+    ("GET", "/profiles"),
+    ("GET", "/profiles/<name>"),
+]
+
+
+class BadRequestError(ValueError):
+    """
+    Raised when a request body or parameter is invalid.
+    """
+
+
+# The expected errors raised past the route handlers, and the status both servers
+# answer them with. Any other error is answered with 500. A duplicate address means
+# the key of the cryptocurrency keeps yielding addresses already issued.
+ERROR_STATUSES: List[Tuple[type, int]] = [
+    (BadRequestError, 400),
+    (address_registry.DuplicateAddressError, 409),
+]
+
+
+def error_response(error: Exception) -> Optional[Tuple[Dict[str, str], int]]:
+    """
+    Maps an error raised by a route handler to its response.
+
+    Args:
+        error (Exception): The error.
+
+    Returns:
+        tuple: The JSON body and the status code, or None if the error is unexpected.
+    """
+    for error_type, status in ERROR_STATUSES:
+        if isinstance(error, error_type):
+            return {"error": str(error)}, status
+    return None
+
+
+def json_object(data: Any) -> Dict[str, Any]:
+    """
+    Checks that a parsed request body is a JSON object.
+
+    Args:
+        data (Any): The parsed body.
+
+    Returns:
+        dict: The same body.
+
+    Raises:
+        BadRequestError: If the body is not a JSON object.
+    """
+    if not isinstance(data, dict):
+        raise BadRequestError("The request body must be a JSON object")
+    return data
+
+
+def compile_rule(rule: str) -> Pattern:
+    """
+    Compiles a route rule into the pattern matching its paths, each `<name>`
+    placeholder matching one path segment.
+
+    Args:
+        rule (str): The route rule, e.g. "/addresses/<address_id>".
+
+    Returns:
+        Pattern: The pattern, with a named group per placeholder.
+    """
+    return re.compile(re.sub(r"<(\w+)>", r"(?P<\1>[^/]+)", rule))
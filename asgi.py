@@ -0,0 +1,487 @@
+import os
+import re
+import json
+import time
+import asyncio
+import logging
+import metrics
+import profiling
+import controller
+import api_routes
+from itertools import islice
+from urllib.parse import parse_qsl
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Tuple
+from settings import load_settings
+
+load_settings()
+
+logger = logging.getLogger()
+
+ASGI_IO_WORKERS = int(os.environ.get("ASGI_IO_WORKERS", 64))
+STREAM_CHUNK_SIZE = int(os.environ.get("LIST_CHUNK_SIZE", 1000))
+PREFIX = api_routes.PREFIX
+
+io_executor = ThreadPoolExecutor(max_workers=ASGI_IO_WORKERS, thread_name_prefix="asgi-io")
+profiler = profiling.RequestProfiler()
+
+
+class Request:
+    def __init__(self, scope: Dict[str, Any], body: bytes) -> None:
+        """
+        Initializes a Request object from an ASGI HTTP scope.
+
+        Args:
+            scope (dict): The ASGI connection scope.
+            body (bytes): The request body.
+        """
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.args = dict(parse_qsl(scope.get("query_string", b"").decode()))
+        self.headers = {
+            name.decode().lower(): value.decode() for name, value in scope.get("headers", [])
+        }
+        self.body = body
+        # The label of the matched route, set by `dispatch`.
+        self.route = "unmatched"
+
+    def get_json(self) -> Dict[str, Any]:
+        """
+        Parses the request body as a JSON object.
+
+        Returns:
+            dict: The parsed body.
+
+        Raises:
+            BadRequestError: If the body is not a JSON object.
+        """
+        try:
+            data = json.loads(self.body or b"null")
+        except ValueError:
+            raise api_routes.BadRequestError("The request body is not valid JSON")
+        return api_routes.json_object(data)
+
+
+async def run_blocking(function: Callable, *args) -> Any:
+    """
+    Runs a blocking call (S3, database or CPU-bound derivation) on the I/O executor,
+    so the event loop keeps serving other requests meanwhile.
+
+    Args:
+        function (Callable): The blocking function.
+        *args: The function arguments.
+
+    Returns:
+        Any: The function result.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(io_executor, function, *args)
+
+
+async def send_json(send: Callable, payload: Any, status: int = 200) -> None:
+    """
+    Sends a complete JSON response.
+
+    Args:
+        send (Callable): The ASGI send callable.
+        payload (Any): The JSON-serializable response.
+        status (int, optional): The HTTP status code. Defaults to 200.
+    """
+    await send_body(send, json.dumps(payload).encode() + b"\n", "application/json", status)
+
+
+async def send_body(send: Callable, body: bytes, content_type: str, status: int = 200,
+                    headers: List[Tuple[bytes, bytes]] = ()) -> None:
+    """
+    Sends a complete response.
+
+    Args:
+        send (Callable): The ASGI send callable.
+        body (bytes): The response body.
+        content_type (str): The content type of the body.
+        status (int, optional): The HTTP status code. Defaults to 200.
+        headers (List[Tuple[bytes, bytes]], optional): Additional headers.
+    """
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", content_type.encode()),
+                (b"content-length", str(len(body)).encode()),
+                *headers,
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+async def hello_world(request: Request, send: Callable) -> None:
+    """
+    Hello World route.
+    """
+    await send_json(send, "Hello, World!")
+
+
+async def generate_address(request: Request, send: Callable) -> None:
+    """
+    Generates and persists an address for the `crypto_currency` of the request body, or
+    takes a pre-generated one from the address pool when it is enabled.
+    """
+    crypto_currency = request.get_json().get("crypto_currency")
+    if not crypto_currency:
+        return await send_json(send, {"error": "Missing crypto_currency parameter"}, 400)
+    address = await run_blocking(controller.issue_address, crypto_currency)
+    await send_json(send, {"address": address}, 201)
+
+
+async def generate_address_batch(request: Request, send: Callable) -> None:
+    """
+    Generates a batch of `count` addresses for the `crypto_currency` of the request
+    body, and persists them in a single transaction.
+    """
+    try:
+        crypto_currency, count = controller.parse_batch_request(request.get_json())
+    except ValueError as error:
+        return await send_json(send, {"error": str(error)}, 400)
+    addresses = await run_blocking(
+        controller.generate_addresses_to_crypto, crypto_currency, count
+    )
+    await run_blocking(controller.persist_addresses, addresses, crypto_currency)
+    await send_json(send, {"addresses": addresses}, 201)
+
+
+async def validate_address_batch(request: Request, send: Callable) -> None:
+    """
+    Validates a batch of addresses and checks which ones are stored, as the
+    `/validate/batch` route of run.py.
+    """
+    try:
+        addresses, crypto_currency = controller.parse_validate_request(request.get_json())
+    except ValueError as error:
+        return await send_json(send, {"error": str(error)}, 400)
+    result = await run_blocking(controller.validate_addresses, addresses, crypto_currency)
+    await send_json(send, result)
+
+
+async def list_addresses(request: Request, send: Callable) -> None:
+    """
+    Lists a page of addresses, tagged with an ETag and answered with 304 when the
+    client copy is current, or streams all of them as NDJSON, as the `/list` route of
+    run.py.
+    """
+    try:
+        after_id, limit = controller.parse_list_query(request.args)
+    except ValueError as error:
+        return await send_json(send, {"error": str(error)}, 400)
+
+    ndjson = "application/x-ndjson"
+    if request.args.get("format") == "ndjson" or request.headers.get("accept") == ndjson:
+        rows = controller.stream_addresses(after_id)
+        lines = (json.dumps({"id": id, "address": address}) + "\n" for id, address in rows)
+        return await stream_chunks(send, lines, rows.close, ndjson, STREAM_CHUNK_SIZE)
+
+    body, etag = await run_blocking(
+        controller.list_addresses_page_response, after_id, limit,
+        request.headers.get("if-none-match"),
+    )
+    headers = [(b"etag", etag.encode())]
+    if body is None:
+        await send({"type": "http.response.start", "status": 304, "headers": headers})
+        return await send({"type": "http.response.body", "body": b""})
+    await send_body(send, body, "application/json", headers=headers)
+
+
+async def stream_chunks(send: Callable, chunks: Iterator[str], close: Callable,
+                        content_type: str, batch_size: int = 1) -> None:
+    """
+    Streams a response body, producing each batch of chunks, and thereby reading it
+    from the database, on the I/O executor.
+
+    Args:
+        send (Callable): The ASGI send callable.
+        chunks (Iterator): The chunks of the body, as str or bytes.
+        close (Callable): Releases the database rows, once done or on error.
+        content_type (str): The content type of the response.
+        batch_size (int, optional): The number of chunks per body message. Defaults
+            to 1.
+    """
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", content_type.encode())],
+        }
+    )
+    try:
+        while True:
+            batch = await run_blocking(lambda: list(islice(chunks, batch_size)))
+            if not batch:
+                break
+            body = b"".join(
+                chunk if isinstance(chunk, bytes) else chunk.encode() for chunk in batch
+            )
+            await send({"type": "http.response.body", "body": body, "more_body": True})
+    finally:
+        await run_blocking(close)
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def export_addresses(request: Request, send: Callable) -> None:
+    """
+    Streams the stored addresses as a CSV or columnar export file, as the `/export`
+    route of run.py.
+    """
+    try:
+        format, since_id = controller.parse_export_query(request.args)
+    except ValueError as error:
+        return await send_json(send, {"error": str(error)}, 400)
+    chunks, content_type = controller.export_addresses(format, since_id)
+    await stream_chunks(send, chunks, chunks.close, content_type)
+
+
+async def retrieve_address(request: Request, send: Callable, address_id: str) -> None:
+    """
+    Retrieves the address stored with the given address ID.
+    """
+    address = await run_blocking(controller.retrieve_address, address_id)
+    if address:
+        await send_json(send, {"address": address})
+    else:
+        await send_json(send, {"error": "Address Id not found"}, 404)
+
+
+async def lookup_address(request: Request, send: Callable, address: str) -> None:
+    """
+    Checks whether an address is stored, rejecting unknown addresses through an
+    in-memory Bloom filter.
+    """
+    row = await run_blocking(controller.lookup_address, address)
+    if row:
+        await send_json(send, row)
+    else:
+        await send_json(send, {"error": "Address not found"}, 404)
+
+
+async def stats(request: Request, send: Callable) -> None:
+    """
+    Exposes the runtime counters of the service caches.
+    """
+    await send_json(send, await run_blocking(controller.get_stats))
+
+
+async def ready(request: Request, send: Callable) -> None:
+    """
+    Readiness probe: answers 200 once the warm-up, if started, has finished and the
+    database answers, and 503 otherwise.
+    """
+    is_ready, checks = await run_blocking(controller.check_readiness)
+    await send_json(send, checks, 200 if is_ready else 503)
+
+
+async def metrics_text(request: Request, send: Callable) -> None:
+    """
+    Exposes the latency histograms of the generation stages and of the routes, in the
+    Prometheus text format.
+    """
+    body = metrics.render().encode()
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", metrics.CONTENT_TYPE.encode()),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+async def list_profiles(request: Request, send: Callable) -> None:
+    """
+    Lists the saved request profiles, most recent first, as the `/profiles` route of
+    run.py.
+    """
+    denied = profiler.check_access(request.headers.get(profiling.PROFILE_HEADER.lower()))
+    if denied:
+        return await send_json(send, *denied)
+    await send_json(send, {"profiles": await run_blocking(profiler.list)})
+
+
+async def download_profile(request: Request, send: Callable, name: str) -> None:
+    """
+    Downloads a saved request profile, in the pstats format, as the `/profiles/<name>`
+    route of run.py.
+    """
+    denied = profiler.check_access(request.headers.get(profiling.PROFILE_HEADER.lower()))
+    if denied:
+        return await send_json(send, *denied)
+    path = profiler.path(name)
+    if path is None:
+        return await send_json(send, {"error": "Profile not found"}, 404)
+
+    def read() -> bytes:
+        with open(path, "rb") as file:
+            return file.read()
+
+    headers = [(b"content-disposition", f"attachment; filename={name}".encode())]
+    await send_body(send, await run_blocking(read), "application/octet-stream", headers=headers)
+
+
+HANDLERS: Dict[Tuple[str, str], Callable[..., Awaitable[None]]] = {
+    ("GET", "/"): hello_world,
+    ("POST", "/generate"): generate_address,
+    ("POST", "/generate/batch"): generate_address_batch,
+    ("POST", "/validate/batch"): validate_address_batch,
+    ("GET", "/list"): list_addresses,
+    ("GET", "/export"): export_addresses,
+    ("GET", "/addresses/<address_id>"): retrieve_address,
+    ("GET", "/addresses/lookup/<address>"): lookup_address,
+    ("GET", "/stats"): stats,
+    ("GET", "/ready"): ready,
+    ("GET", "/metrics"): metrics_text,
+    ("GET", "/profiles"): list_profiles,
+    ("GET", "/profiles/<name>"): download_profile,
+}
+
+# Built from the route table shared with run.py, so a route without a handler fails
+# at import.
+ROUTES: List[Tuple[str, re.Pattern, Callable[..., Awaitable[None]]]] = [
+    (method, api_routes.compile_rule(rule), HANDLERS[method, rule])
+    for method, rule in api_routes.ROUTES
+]
+
+
+def route_label(pattern: re.Pattern) -> str:
+    """
+    Names a route after its pattern, in the `<name>` placeholder syntax of the Flask
+    rules, so both servers report the same route labels.
+
+    Args:
+        pattern (re.Pattern): The route pattern.
+
+    Returns:
+        str: The route label, e.g. "/api-blockchain/addresses/<address_id>".
+    """
+    return PREFIX + re.sub(r"\(\?P<(\w+)>[^)]*\)", r"<\1>", pattern.pattern)
+
+
+async def app(scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+    """
+    ASGI entry point serving the `/api-blockchain` routes of run.py. Serve it with an
+    ASGI server, e.g. `uvicorn asgi:app`.
+
+    Args:
+        scope (dict): The ASGI connection scope.
+        receive (Callable): The ASGI receive callable.
+        send (Callable): The ASGI send callable.
+    """
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+    if scope["type"] != "http":
+        return
+
+    body = b""
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get("body", b"")
+        more_body = message.get("more_body", False)
+    request = Request(scope, body)
+    start = time.perf_counter()
+    status = []
+
+    async def send_and_record(message: Dict[str, Any]) -> None:
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+        await send(message)
+
+    try:
+        await dispatch(request, send_and_record)
+    finally:
+        metrics.REQUEST_SECONDS.observe(
+            time.perf_counter() - start,
+            request.route,
+            request.method,
+            str(status[0] if status else 500),
+        )
+
+
+async def dispatch(request: Request, send: Callable) -> str:
+    """
+    Routes a request to its handler, answering the errors of the client with the
+    status of api_routes.ERROR_STATUSES, as run.py does, and the others with 500.
+    An error raised once a streamed response has started is logged and raised
+    again, so that the server aborts the response rather than end a truncated body
+    as if complete.
+
+    Args:
+        request (Request): The request.
+        send (Callable): The ASGI send callable.
+
+    Returns:
+        str: The label of the matched route, or "unmatched".
+
+    Raises:
+        Exception: The error of a handler that had already started its response.
+    """
+    started = []
+
+    async def send_and_track(message: Dict[str, Any]) -> None:
+        if message["type"] == "http.response.start":
+            started.append(True)
+        await send(message)
+
+    path = request.path[len(PREFIX):] if request.path.startswith(PREFIX) else None
+    allowed = []
+    for method, pattern, handler in ROUTES:
+        match = pattern.fullmatch(path) if path is not None else None
+        if not match:
+            continue
+        if method != request.method:
+            allowed.append(method)
+            continue
+        request.route = route_label(pattern)
+        try:
+            await handler(request, send_and_track, **match.groupdict())
+        except Exception as error:
+            if started:
+                logger.exception(
+                    f"Exception on {request.path} [{request.method}] after the response started"
+                )
+                raise
+            response = api_routes.error_response(error)
+            if response is None:
+                logger.exception(f"Exception on {request.path} [{request.method}]")
+                response = {"message": "Internal Server Error"}, 500
+            await send_json(send, *response)
+        return request.route
+    if allowed:
+        await send_json(send, {"message": "Method Not Allowed"}, 405)
+    else:
+        await send_json(send, {"message": "Not Found"}, 404)
+    return "unmatched"
+
+
+async def lifespan(receive: Callable, send: Callable) -> None:
+    """
+    Handles the ASGI lifespan protocol, running the warm-up on startup unless
+    WARM_UP_ON_START is false, and flushing the write-behind queue and releasing the
+    I/O executor on shutdown.
+
+    Args:
+        receive (Callable): The ASGI receive callable.
+        send (Callable): The ASGI send callable.
+    """
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            if controller.WARM_UP_ON_START:
+                await run_blocking(controller.warm_up)
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await run_blocking(controller.write_queue.stop)
+            io_executor.shutdown(wait=False)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
@@ -0,0 +1,4 @@
+"""
+Offline performance benchmarks of the blockchain API. Run them from the project root,
+e.g. `python -m benchmarks.derivation_bench`.
+"""
@@ -0,0 +1,126 @@
+import json
+import time
+import random
+import asyncio
+import argparse
+from typing import Dict, List, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks.standins import use_standins
+
+Call = Tuple[str, str, Dict]
+
+
+def workload(requests: int, stored_ids: int) -> List[Call]:
+    """
+    Builds a mix of one address generation for every four lookups by ID.
+
+    Args:
+        requests (int): The number of requests.
+        stored_ids (int): The number of addresses stored before the run.
+
+    Returns:
+        List[Call]: The method, path and JSON body of each request.
+    """
+    calls = []
+    for i in range(requests):
+        if i % 5 == 0:
+            calls.append(("POST", "/api-blockchain/generate", {"crypto_currency": "BTC"}))
+        else:
+            address_id = random.randint(1, stored_ids)
+            calls.append(("GET", f"/api-blockchain/addresses/{address_id}", None))
+    return calls
+
+
+def run_flask(calls: List[Call], threads: int) -> float:
+    """
+    Serves the workload with the Flask app of run.py on a fixed pool of request
+    threads, as a threaded WSGI server does.
+
+    Args:
+        calls (List[Call]): The requests.
+        threads (int): The number of request threads.
+
+    Returns:
+        float: The elapsed seconds.
+    """
+    from run import app
+
+    def send(call: Call) -> int:
+        method, path, body = call
+        return app.test_client().open(path, method=method, json=body).status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        statuses = list(executor.map(send, calls))
+    assert all(status < 400 for status in statuses), statuses
+    return time.perf_counter() - start
+
+
+def run_asgi(calls: List[Call], concurrency: int) -> float:
+    """
+    Serves the workload with the ASGI app, with up to `concurrency` requests in
+    flight at once.
+
+    Args:
+        calls (List[Call]): The requests.
+        concurrency (int): The number of concurrent requests.
+
+    Returns:
+        float: The elapsed seconds.
+    """
+    import asgi
+
+    async def send(call: Call, limit: asyncio.Semaphore) -> int:
+        method, path, body = call
+        messages = []
+        scope = {"type": "http", "method": method, "path": path, "query_string": b"", "headers": []}
+
+        async def receive():
+            return {"type": "http.request", "body": json.dumps(body).encode() if body else b""}
+
+        async def collect(message):
+            messages.append(message)
+
+        async with limit:
+            await asgi.app(scope, receive, collect)
+        return messages[0]["status"]
+
+    async def main() -> List[int]:
+        limit = asyncio.Semaphore(concurrency)
+        return await asyncio.gather(*(send(call, limit) for call in calls))
+
+    start = time.perf_counter()
+    statuses = asyncio.run(main())
+    assert all(status < 400 for status in statuses), statuses
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare the concurrent throughput of the Flask and ASGI entry points."
+    )
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--flask-threads", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--db-latency", type=float, default=0.005)
+    parser.add_argument("--s3-latency", type=float, default=0.02)
+    args = parser.parse_args()
+
+    results = {}
+    with use_standins(args.s3_latency, args.db_latency) as standins:
+        standins["db"].persist_many_on_database([f"address_{i}" for i in range(100)], "BTC")
+        calls = workload(args.requests, 100)
+        for name, run, workers in (
+            ("flask", run_flask, args.flask_threads),
+            ("asgi", run_asgi, args.concurrency),
+        ):
+            seconds = run(calls, workers)
+            results[name] = {
+                "concurrency": workers,
+                "seconds": round(seconds, 3),
+                "requests_per_sec": round(args.requests / seconds, 1),
+            }
+    results["speedup"] = round(
+        results["asgi"]["requests_per_sec"] / results["flask"]["requests_per_sec"], 2
+    )
+    print(json.dumps(results, indent=2))
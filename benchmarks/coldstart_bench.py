@@ -0,0 +1,120 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import statistics
+import subprocess
+from typing import Dict, List
+
+ENTRY_POINTS = ("flask", "asgi")
+
+
+def first_request(entry_point: str) -> int:
+    """
+    Sends the first request of a fresh process, generating an Ethereum address, which
+    goes through the key vault, the derivation and the database.
+
+    Args:
+        entry_point (str): "flask" for run.py, or "asgi" for asgi.py.
+
+    Returns:
+        int: The status code of the response.
+    """
+    body = {"crypto_currency": "ETH"}
+    if entry_point == "flask":
+        import run
+
+        return run.app.test_client().post("/api-blockchain/generate", json=body).status_code
+
+    import asgi
+
+    messages = []
+    scope = {"type": "http", "method": "POST", "path": "/api-blockchain/generate",
+             "query_string": b"", "headers": []}
+
+    async def receive():
+        return {"type": "http.request", "body": json.dumps(body).encode()}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(asgi.app(scope, receive, send))
+    return messages[0]["status"]
+
+
+def child(entry_point: str) -> None:
+    """
+    Runs in the measured process: imports the entry point, serves the first request,
+    and prints the timings as JSON.
+
+    Args:
+        entry_point (str): "flask" for run.py, or "asgi" for asgi.py.
+    """
+    start = time.perf_counter()
+    __import__("run" if entry_point == "flask" else "asgi")
+    imported = time.perf_counter()
+    status = first_request(entry_point)
+    served = time.perf_counter()
+    print(json.dumps({
+        "import_ms": (imported - start) * 1e3,
+        "first_request_ms": (served - imported) * 1e3,
+        "status": status,
+    }))
+
+
+def measure(entry_point: str, runs: int) -> Dict[str, float]:
+    """
+    Starts `runs` fresh processes serving one request each, on an embedded database
+    and a local key vault created for every run, so nothing is cached across runs.
+
+    Args:
+        entry_point (str): "flask" for run.py, or "asgi" for asgi.py.
+        runs (int): The number of processes.
+
+    Returns:
+        dict: The median import, first request and total times in milliseconds, the
+            latter including the interpreter startup.
+    """
+    samples: Dict[str, List[float]] = {"import_ms": [], "first_request_ms": [], "total_ms": []}
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as directory:
+            env = dict(
+                os.environ,
+                DB_BACKEND="sqlite",
+                SQLITE_PATH=os.path.join(directory, "coldstart.db"),
+                KEY_VAULT_BACKEND="local",
+                KEY_VAULT_DIR=os.path.join(directory, "keys"),
+                ADDRESS_POOL_ENABLED="false",
+            )
+            start = time.perf_counter()
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.coldstart_bench", "--child", entry_point],
+                cwd=root, env=env, capture_output=True, text=True, check=True,
+            ).stdout
+            total = (time.perf_counter() - start) * 1e3
+        result = json.loads(output.strip().splitlines()[-1])
+        if result["status"] != 201:
+            raise RuntimeError(f"The first request failed with status {result['status']}")
+        samples["import_ms"].append(result["import_ms"])
+        samples["first_request_ms"].append(result["first_request_ms"])
+        samples["total_ms"].append(total)
+    return {name: round(statistics.median(values), 1) for name, values in samples.items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the cold start of the entry points, from import to the "
+                    "first served request."
+    )
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--child", choices=ENTRY_POINTS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child)
+    else:
+        print(json.dumps({name: measure(name, args.runs) for name in ENTRY_POINTS}, indent=2))
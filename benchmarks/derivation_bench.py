@@ -0,0 +1,55 @@
+import os
+import json
+import time
+import argparse
+from typing import Dict, List
+from secrets import token_hex
+from cryptography import DerivationEngine
+
+
+def run(crypto_symbol: str, batch_size: int, max_workers: int, chunk_size: int) -> List[Dict]:
+    """
+    Derives the same reference batch of private keys with 1 to `max_workers` worker
+    processes, and measures the throughput of each run. The single worker run derives
+    inline, as the engine does, and is the baseline of the speedups.
+
+    Args:
+        crypto_symbol (str): The cryptocurrency symbol, "ETH" or "TRO".
+        batch_size (int): The number of private keys of the reference batch.
+        max_workers (int): The largest number of workers to measure.
+        chunk_size (int): Maximum number of keys submitted per task.
+
+    Returns:
+        List[Dict]: The workers, elapsed seconds, throughput and speedup of each run.
+    """
+    private_keys = [token_hex(32) for _ in range(batch_size)]
+    results = []
+    for workers in range(1, max_workers + 1):
+        engine = DerivationEngine(workers=workers, chunk_size=chunk_size, parallel_threshold=0)
+        # Warm the workers up, so process start-up is not measured.
+        engine.derive(crypto_symbol, private_keys[: workers * 4])
+        start = time.perf_counter()
+        engine.derive(crypto_symbol, private_keys)
+        seconds = time.perf_counter() - start
+        engine.shutdown()
+        results.append(
+            {
+                "workers": workers,
+                "seconds": round(seconds, 4),
+                "addresses_per_sec": round(batch_size / seconds, 1),
+                "speedup": round(results[0]["seconds"] / seconds, 2) if results else 1.0,
+            }
+        )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark parallel ETH/TRO address derivation.")
+    parser.add_argument("--crypto", default="ETH", choices=["ETH", "TRO"])
+    parser.add_argument("--batch-size", type=int, default=20000)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    args = parser.parse_args()
+
+    results = run(args.crypto, args.batch_size, args.max_workers, args.chunk_size)
+    print(json.dumps({"crypto": args.crypto, "batch_size": args.batch_size, "runs": results}, indent=2))
@@ -0,0 +1,52 @@
+import json
+import time
+import argparse
+import tempfile
+from typing import Any, Dict
+from concurrent.futures import ThreadPoolExecutor
+from key_vault import LocalKeyStore, S3KeyStore
+from benchmarks.standins import FakeS3Client
+
+
+def run(store: Any, writers: int, currencies: int) -> Dict[str, float]:
+    """
+    Races `writers` threads persisting a key for each of `currencies` cryptocurrencies,
+    and checks that every writer ends up with the single stored key.
+
+    Args:
+        store (Any): The key store.
+        writers (int): The number of concurrent writers per cryptocurrency.
+        currencies (int): The number of cryptocurrencies.
+
+    Returns:
+        dict: The elapsed seconds, writes per second and lost updates.
+    """
+    jobs = [(f"C{c}", f"key_{c}_{w}") for c in range(currencies) for w in range(writers)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+        results = list(executor.map(lambda job: (job[0], store.create(*job)), jobs))
+    seconds = time.perf_counter() - start
+
+    stored = store.read_all()
+    lost_updates = sum(1 for crypto, key in results if stored[crypto] != key)
+    return {
+        "writes": len(jobs),
+        "seconds": round(seconds, 4),
+        "writes_per_sec": round(len(jobs) / seconds, 1),
+        "lost_updates": lost_updates,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the key vault write path offline.")
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--currencies", type=int, default=8)
+    parser.add_argument("--s3-latency", type=float, default=0.02)
+    args = parser.parse_args()
+
+    s3 = FakeS3Client(args.s3_latency)
+    results = {"s3": run(S3KeyStore("bucket", s3), args.writers, args.currencies)}
+    results["s3"]["round_trips"] = s3.calls
+    with tempfile.TemporaryDirectory() as directory:
+        results["local"] = run(LocalKeyStore(directory), args.writers, args.currencies)
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,393 @@
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from contextlib import ExitStack
+from typing import Callable, Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks.standins import use_standins
+
+PREFIX = "/api-blockchain"
+ROUTES = ("generate", "list", "addresses")
+DEFAULT_MIX = "generate=1,list=1,addresses=8"
+CURRENCIES = ("BTC", "ETH", "TRO")
+
+Call = Tuple[str, str, str, Optional[Dict]]
+Send = Callable[[str, str, Optional[Dict]], int]
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    """
+    Parses a traffic mix such as "generate=1,list=1,addresses=8", the weight of each
+    route.
+
+    Args:
+        text (str): The mix.
+
+    Returns:
+        dict: The weight of each route.
+
+    Raises:
+        ValueError: If a route is unknown, or a weight invalid.
+    """
+    mix = {}
+    for part in text.split(","):
+        route, _, weight = part.partition("=")
+        route = route.strip()
+        if route not in ROUTES:
+            raise ValueError(f"Unknown route {route!r}, expected one of {', '.join(ROUTES)}")
+        try:
+            mix[route] = float(weight)
+        except ValueError:
+            raise ValueError(f"Invalid weight for {route}: {weight!r}")
+        if mix[route] < 0:
+            raise ValueError(f"Invalid weight for {route}: {weight!r}")
+    if not any(mix.values()):
+        raise ValueError("The mix has no traffic")
+    return mix
+
+
+class Workload:
+    def __init__(self, mix: Dict[str, float], max_id: int, list_limit: int = 100,
+                 seed: Optional[int] = None) -> None:
+        """
+        Initializes a Workload object, drawing requests at random according to a mix.
+
+        Args:
+            mix (dict): The weight of each route.
+            max_id (int): The largest stored address ID; lookups draw IDs from 1 to it.
+            list_limit (int, optional): The page size of the list requests. Defaults
+                to 100.
+            seed (int, optional): The random seed. Defaults to None.
+        """
+        self.routes = list(mix)
+        self.weights = [mix[route] for route in self.routes]
+        self.max_id = max_id
+        self.list_limit = list_limit
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def next(self) -> Call:
+        """
+        Draws the next request.
+
+        Returns:
+            Call: The route name, method, path and JSON body.
+        """
+        with self._lock:
+            route = self._random.choices(self.routes, self.weights)[0]
+            if route == "generate":
+                body = {"crypto_currency": self._random.choice(CURRENCIES)}
+                return route, "POST", f"{PREFIX}/generate", body
+            if route == "list":
+                after_id = self._random.randint(0, max(self.max_id - self.list_limit, 0))
+                path = f"{PREFIX}/list?after_id={after_id}&limit={self.list_limit}"
+                return route, "GET", path, None
+            return route, "GET", f"{PREFIX}/addresses/{self._random.randint(1, self.max_id)}", None
+
+
+class Recorder:
+    def __init__(self) -> None:
+        """
+        Initializes a Recorder object, collecting the latency and outcome of every
+        request by route.
+        """
+        self._latencies: Dict[str, List[float]] = {}
+        self._errors: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, route: str, latency: float, ok: bool) -> None:
+        """
+        Records a request.
+
+        Args:
+            route (str): The route name.
+            latency (float): The latency in seconds.
+            ok (bool): False if the request failed.
+        """
+        with self._lock:
+            self._latencies.setdefault(route, []).append(latency)
+            self._errors[route] = self._errors.get(route, 0) + (not ok)
+
+    def report(self, elapsed: float) -> Dict[str, Dict[str, float]]:
+        """
+        Summarizes the requests of each route, and of all of them under "total".
+
+        Args:
+            elapsed (float): The duration of the run in seconds.
+
+        Returns:
+            dict: The number of requests and errors, the error rate, the throughput in
+                requests per second and the p50, p95, p99 and max latencies in
+                milliseconds of each route.
+        """
+        with self._lock:
+            groups = {route: (list(values), self._errors[route])
+                      for route, values in self._latencies.items()}
+        groups["total"] = (
+            [latency for values, _ in groups.values() for latency in values],
+            sum(errors for _, errors in groups.values()),
+        )
+        return {route: summarize(latencies, errors, elapsed)
+                for route, (latencies, errors) in groups.items()}
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict[str, float]:
+    """
+    Summarizes the latencies of a group of requests.
+
+    Args:
+        latencies (List[float]): The latencies in seconds.
+        errors (int): The number of failed requests.
+        elapsed (float): The duration of the run in seconds.
+
+    Returns:
+        dict: The requests, errors, error rate, throughput and latency percentiles.
+    """
+    latencies = sorted(latencies)
+    count = len(latencies)
+
+    def percentile(q: float) -> float:
+        return round(latencies[int(q * (count - 1))] * 1e3, 3) if count else 0.0
+
+    return {
+        "requests": count,
+        "errors": errors,
+        "error_rate": round(errors / count, 4) if count else 0.0,
+        "throughput_rps": round(count / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "max_ms": percentile(1.0),
+    }
+
+
+def app_sender() -> Send:
+    """
+    Sends requests to the Flask app of run.py in-process, through its test client.
+
+    Returns:
+        Send: Sends a request and returns the status code.
+    """
+    from run import app
+
+    local = threading.local()
+
+    def send(method: str, path: str, body: Optional[Dict]) -> int:
+        if not hasattr(local, "client"):
+            local.client = app.test_client()
+        return local.client.open(path, method=method, json=body).status_code
+
+    return send
+
+
+def http_sender(base_url: str, timeout: float = 30.0) -> Send:
+    """
+    Sends requests to a running server, over one keep-alive session per thread.
+
+    Args:
+        base_url (str): The server URL, e.g. http://localhost:5000.
+        timeout (float, optional): Seconds before a request fails. Defaults to 30.
+
+    Returns:
+        Send: Sends a request and returns the status code.
+    """
+    import requests
+
+    local = threading.local()
+
+    def send(method: str, path: str, body: Optional[Dict]) -> int:
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        return local.session.request(
+            method, base_url.rstrip("/") + path, json=body, timeout=timeout
+        ).status_code
+
+    return send
+
+
+def issue(send: Send, call: Call, recorder: Recorder, start: float) -> None:
+    """
+    Sends a request and records its latency since `start`, failing on an exception or
+    an error status.
+
+    Args:
+        send (Send): The sender.
+        call (Call): The request.
+        recorder (Recorder): The recorder.
+        start (float): The perf_counter time the request is timed from.
+    """
+    route, method, path, body = call
+    try:
+        ok = send(method, path, body) < 400
+    except Exception:
+        ok = False
+    recorder.record(route, time.perf_counter() - start, ok)
+
+
+def run_closed_loop(send: Send, workload: Workload, recorder: Recorder, concurrency: int,
+                    duration: float) -> float:
+    """
+    Runs `concurrency` clients, each sending its next request as soon as the previous
+    one completes, for `duration` seconds. The throughput adapts to the server.
+
+    Args:
+        send (Send): The sender.
+        workload (Workload): The request generator.
+        recorder (Recorder): The recorder.
+        concurrency (int): The number of clients.
+        duration (float): The seconds to send requests for.
+
+    Returns:
+        float: The elapsed seconds.
+    """
+    start = time.perf_counter()
+    deadline = start + duration
+
+    def client() -> None:
+        while time.perf_counter() < deadline:
+            issue(send, workload.next(), recorder, time.perf_counter())
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+
+def run_open_loop(send: Send, workload: Workload, recorder: Recorder, rate: float,
+                  concurrency: int, duration: float, seed: Optional[int] = None) -> float:
+    """
+    Sends requests at Poisson arrivals of `rate` per second for `duration` seconds,
+    whether or not the previous ones have completed, on up to `concurrency` threads.
+    Latencies are timed from the scheduled arrival, so the time a request waits for a
+    free thread when the server falls behind is counted.
+
+    Args:
+        send (Send): The sender.
+        workload (Workload): The request generator.
+        recorder (Recorder): The recorder.
+        rate (float): The arrival rate in requests per second.
+        concurrency (int): The maximum number of requests in flight.
+        duration (float): The seconds to send requests for.
+        seed (int, optional): The random seed of the arrivals. Defaults to None.
+
+    Returns:
+        float: The elapsed seconds, until the last request completed.
+    """
+    arrivals = random.Random(seed)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        arrival = start
+        while True:
+            arrival += arrivals.expovariate(rate)
+            if arrival >= start + duration:
+                break
+            delay = arrival - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(issue, send, workload.next(), recorder, arrival)
+    return time.perf_counter() - start
+
+
+def run(mix: Dict[str, float], duration: float, concurrency: int, rate: Optional[float] = None,
+        url: Optional[str] = None, max_id: int = 1000, seed: Optional[int] = None,
+        s3_latency: float = 0.0, db_latency: float = 0.0) -> Dict:
+    """
+    Runs a load test, against a server, or in-process against the Flask app on the
+    stand-ins of `use_standins`, where `max_id` addresses are stored first.
+
+    Args:
+        mix (dict): The weight of each route.
+        duration (float): The seconds to send requests for.
+        concurrency (int): The number of clients in closed loop, or the maximum number
+            of requests in flight in open loop.
+        rate (float, optional): The arrival rate of the open loop, in requests per
+            second. Defaults to None, for a closed loop.
+        url (str, optional): The server URL. Defaults to None, for in-process.
+        max_id (int, optional): The largest stored address ID. Defaults to 1000.
+        seed (int, optional): The random seed. Defaults to None.
+        s3_latency (float, optional): Seconds slept by every S3 call, in-process.
+            Defaults to 0.0.
+        db_latency (float, optional): Seconds slept by every database call,
+            in-process. Defaults to 0.0.
+
+    Returns:
+        dict: The settings of the run, and the summary of each route.
+    """
+    workload = Workload(mix, max_id, seed=seed)
+    recorder = Recorder()
+    with ExitStack() as stack:
+        if url:
+            send = http_sender(url)
+        else:
+            standins = stack.enter_context(use_standins(s3_latency, db_latency))
+            standins["db"].persist_many_on_database(
+                [f"address_{i}" for i in range(max_id)], "BTC"
+            )
+            send = app_sender()
+        if rate:
+            elapsed = run_open_loop(send, workload, recorder, rate, concurrency, duration, seed)
+        else:
+            elapsed = run_closed_loop(send, workload, recorder, concurrency, duration)
+    return {
+        "target": url or "in-process",
+        "mode": "open" if rate else "closed",
+        "rate": rate,
+        "concurrency": concurrency,
+        "duration_s": round(elapsed, 3),
+        "mix": mix,
+        "routes": recorder.report(elapsed),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Runs a load test from the command line, and prints or writes its JSON report.
+
+    Args:
+        argv (List[str], optional): The command line arguments.
+
+    Returns:
+        int: The exit status, 1 if a request failed.
+    """
+    parser = argparse.ArgumentParser(
+        description="Load test the API with a mix of generation, list and lookup requests."
+    )
+    parser.add_argument("--url", help="server to load, e.g. http://localhost:5000; "
+                                      "the in-process Flask app on stand-ins by default")
+    parser.add_argument("--mix", default=DEFAULT_MIX,
+                        help=f"weight of each route (default {DEFAULT_MIX})")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--concurrency", type=int, default=8,
+                        help="clients in closed loop, or requests in flight in open loop")
+    parser.add_argument("--rate", type=float,
+                        help="requests per second, for an open loop; a closed loop otherwise")
+    parser.add_argument("--max-id", type=int, default=1000,
+                        help="largest stored address ID to look up")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--s3-latency", type=float, default=0.0)
+    parser.add_argument("--db-latency", type=float, default=0.0)
+    parser.add_argument("--output", help="write the report to this file")
+    args = parser.parse_args(argv)
+
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as error:
+        parser.error(str(error))
+    report = run(mix, args.duration, args.concurrency, args.rate, args.url, args.max_id,
+                 args.seed, args.s3_latency, args.db_latency)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output)
+    else:
+        print(output)
+    return 1 if report["routes"]["total"]["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+import io
+import time
+import threading
+import controller
+import db_connector
+from unittest import mock
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator
+from botocore.exceptions import ClientError
+from db_sqlite import SqliteCursor
+from key_vault import S3KeyStore, key_cache
+
+
+class FakeS3Client:
+    def __init__(self, latency: float = 0.0) -> None:
+        """
+        Initializes an in-memory stand-in for the boto3 S3 client.
+
+        Args:
+            latency (float, optional): Seconds slept by every call, emulating the
+                network round trip. Defaults to 0.0.
+        """
+        self.latency = latency
+        self.objects: Dict[str, bytes] = {}
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def get_object(self, Bucket: str, Key: str, **kwargs) -> Dict[str, Any]:
+        """
+        Reads an object, raising the ClientError of S3 if it does not exist.
+
+        Args:
+            Bucket (str): The bucket name, ignored.
+            Key (str): The object key.
+
+        Returns:
+            dict: The response, with the object content in "Body".
+        """
+        self._round_trip()
+        with self._lock:
+            body = self.objects.get(Key)
+        if body is None:
+            raise ClientError({"Error": {"Code": "NoSuchKey"}}, "GetObject")
+        return {"ResponseMetadata": {"HTTPStatusCode": 200}, "Body": io.BytesIO(body)}
+
+    def put_object(self, Bucket: str, Key: str, Body: Any, IfNoneMatch: str = "",
+                   **kwargs) -> Dict[str, Any]:
+        """
+        Writes an object. With `IfNoneMatch="*"` the write is conditional and fails
+        with the ClientError of S3 if the object exists.
+
+        Args:
+            Bucket (str): The bucket name, ignored.
+            Key (str): The object key.
+            Body (Any): The object content.
+            IfNoneMatch (str, optional): "*" to write only if the object does not exist.
+
+        Returns:
+            dict: The response metadata.
+        """
+        self._round_trip()
+        with self._lock:
+            if IfNoneMatch == "*" and Key in self.objects:
+                raise ClientError({"Error": {"Code": "PreconditionFailed"}}, "PutObject")
+            self.objects[Key] = Body.encode() if isinstance(Body, str) else Body
+        return {"ResponseMetadata": {"HTTPStatusCode": 200}}
+
+    def list_objects_v2(self, Bucket: str, Prefix: str = "", **kwargs) -> Dict[str, Any]:
+        """
+        Lists the objects whose key starts with a prefix, in a single page.
+
+        Args:
+            Bucket (str): The bucket name, ignored.
+            Prefix (str, optional): The key prefix. Defaults to "".
+
+        Returns:
+            dict: The response, with the object keys in "Contents".
+        """
+        self._round_trip()
+        with self._lock:
+            keys = sorted(key for key in self.objects if key.startswith(Prefix))
+        return {"Contents": [{"Key": key} for key in keys], "IsTruncated": False}
+
+    def _round_trip(self) -> None:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+
+class LatencyProxy:
+    def __init__(self, target: Any, latency: float) -> None:
+        """
+        Wraps an object so every method call first sleeps, emulating a network
+        round trip to a remote database.
+
+        Args:
+            target (Any): The wrapped object.
+            latency (float): Seconds slept by every call.
+        """
+        self.target = target
+        self.latency = latency
+
+    def __getattr__(self, name: str) -> Any:
+        attribute = getattr(self.target, name)
+        if not callable(attribute):
+            return attribute
+
+        def delayed(*args, **kwargs):
+            time.sleep(self.latency)
+            return attribute(*args, **kwargs)
+
+        return delayed
+
+
+@contextmanager
+def use_standins(s3_latency: float = 0.0, db_latency: float = 0.0) -> Iterator[Dict[str, Any]]:
+    """
+    Points the service at local stand-ins: an in-memory fake S3 bucket and an
+    embedded SQLite database.
+
+    Args:
+        s3_latency (float, optional): Seconds slept by every S3 call. Defaults to 0.0.
+        db_latency (float, optional): Seconds slept by every database call.
+            Defaults to 0.0.
+
+    Yields:
+        dict: The fake S3 client ("s3") and the embedded database ("db").
+    """
+    s3 = FakeS3Client(s3_latency)
+    db = SqliteCursor()
+    cursor = LatencyProxy(db, db_latency) if db_latency else db
+    key_cache.invalidate()
+    controller.cache.clear()
+    controller.address_filter.clear()
+    controller.registry.clear()
+    controller.page_cache.invalidate()
+    controller.child_indexes.clear()
+    with mock.patch("key_vault._key_store", S3KeyStore("bucket", s3)), mock.patch.object(
+        db_connector, "cursor", cursor
+    ):
+        yield {"s3": s3, "db": db}
+    key_cache.invalidate()
+    controller.cache.clear()
+    controller.address_filter.clear()
+    controller.registry.clear()
+    controller.page_cache.invalidate()
+    controller.child_indexes.clear()
@@ -0,0 +1,237 @@
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+from typing import Callable, Dict, List, Optional, Tuple
+from benchmarks import coldstart_bench
+from benchmarks.standins import use_standins
+
+PRIVATE_KEY = "5f2b8c3e1f0a9d7c6b5a4e3d2c1b0a9f8e7d6c5b4a3f2e1d0c9b8a7f6e5d4c3b"
+
+Case = Tuple[str, Callable[[], object]]
+
+
+def generator_cases() -> List[Case]:
+    """
+    Builds the cases of the address generators of CurrenciesEncrypter.
+
+    Returns:
+        List[Case]: The name and operation of each case.
+    """
+    from cryptography import CurrenciesEncrypter
+
+    encrypter = CurrenciesEncrypter(seed=0)
+    return [
+        (f"generator.{crypto}", lambda crypto=crypto: encrypter.generate_address(crypto, PRIVATE_KEY))
+        for crypto in ("BTC", "ETH", "TRO")
+    ]
+
+
+def key_manager_cases(standins: Dict) -> List[Case]:
+    """
+    Builds the cases of KeyManager construction on the stubbed vault, with the key
+    cache warm and cold.
+
+    Args:
+        standins (dict): The stand-ins of `use_standins`.
+
+    Returns:
+        List[Case]: The name and operation of each case.
+    """
+    from key_vault import key_cache
+    from cryptography import KeyManager
+
+    KeyManager("BTC")
+
+    def cold() -> KeyManager:
+        key_cache.invalidate()
+        return KeyManager("BTC")
+
+    return [("key_manager.warm", lambda: KeyManager("BTC")), ("key_manager.cold", cold)]
+
+
+def db_cases(standins: Dict) -> List[Case]:
+    """
+    Builds the cases of the database layer on the embedded stand-in database.
+
+    Args:
+        standins (dict): The stand-ins of `use_standins`.
+
+    Returns:
+        List[Case]: The name and operation of each case.
+    """
+    db = standins["db"]
+    db.persist_many_on_database([f"address_{i}" for i in range(1000)], "BTC")
+    batch = [f"batch_{i}" for i in range(100)]
+    return [
+        ("db.persist", lambda: db.persist_on_database("address", "BTC")),
+        ("db.persist_many_100", lambda: db.persist_many_on_database(batch, "BTC")),
+        ("db.list_page_100", lambda: db.list_addresses_page(0, 100)),
+        ("db.retrieve", lambda: db.retrieve_address(500)),
+    ]
+
+
+def route_cases(standins: Dict) -> List[Case]:
+    """
+    Builds the cases of the run.py routes, served through the Flask test client.
+
+    Args:
+        standins (dict): The stand-ins of `use_standins`.
+
+    Returns:
+        List[Case]: The name and operation of each case.
+    """
+    from run import app
+
+    client = app.test_client()
+    prefix = "/api-blockchain"
+    batch = {"crypto_currency": "BTC", "count": 10}
+    return [
+        ("route.hello", lambda: client.get(f"{prefix}/")),
+        ("route.generate", lambda: client.post(f"{prefix}/generate", json={"crypto_currency": "BTC"})),
+        ("route.generate_batch_10", lambda: client.post(f"{prefix}/generate/batch", json=batch)),
+        ("route.list_100", lambda: client.get(f"{prefix}/list?limit=100")),
+        ("route.list_ndjson", lambda: client.get(f"{prefix}/list?format=ndjson")),
+        ("route.retrieve", lambda: client.get(f"{prefix}/addresses/500")),
+        ("route.stats", lambda: client.get(f"{prefix}/stats")),
+    ]
+
+
+def measure(operation: Callable[[], object], iterations: int, warmup: int) -> Dict[str, float]:
+    """
+    Times an operation.
+
+    Args:
+        operation (Callable): The operation.
+        iterations (int): The number of timed calls.
+        warmup (int): The number of untimed calls first.
+
+    Returns:
+        dict: The iterations, the mean, median and p95 latency in microseconds, and the
+            operations per second.
+    """
+    for _ in range(warmup):
+        operation()
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        operation()
+        timings.append((time.perf_counter() - start) * 1e6)
+    timings.sort()
+    mean = statistics.fmean(timings)
+    return {
+        "iterations": iterations,
+        "mean_us": round(mean, 2),
+        "median_us": round(statistics.median(timings), 2),
+        "p95_us": round(timings[int(0.95 * (len(timings) - 1))], 2),
+        "ops_per_sec": round(1e6 / mean, 1),
+    }
+
+
+def run(iterations: int = 200, warmup: int = 20, only: Optional[str] = None,
+        coldstart_runs: int = 5) -> Dict:
+    """
+    Runs every benchmark case offline, on a fake S3 bucket and an embedded database.
+    The cold start cases time fresh processes from import to the first served request,
+    and report the median total time as `median_us`.
+
+    Args:
+        iterations (int, optional): Timed calls per case. Defaults to 200.
+        warmup (int, optional): Untimed calls per case. Defaults to 20.
+        only (str, optional): Runs only the cases whose name starts with it.
+        coldstart_runs (int, optional): Processes started per cold start case, or 0
+            to skip them. Defaults to 5.
+
+    Returns:
+        dict: The environment and the measurements of each case.
+    """
+    results = {}
+    with use_standins() as standins:
+        cases = generator_cases() + key_manager_cases(standins)
+        cases += db_cases(standins) + route_cases(standins)
+        for name, operation in cases:
+            if only and not name.startswith(only):
+                continue
+            results[name] = measure(operation, iterations, warmup)
+    for entry_point in coldstart_bench.ENTRY_POINTS:
+        name = f"coldstart.{entry_point}"
+        if coldstart_runs and (not only or name.startswith(only)):
+            timings = coldstart_bench.measure(entry_point, coldstart_runs)
+            results[name] = {
+                "iterations": coldstart_runs,
+                "median_us": round(timings["total_ms"] * 1e3, 2),
+                **timings,
+            }
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+
+
+def compare(results: Dict, baseline: Dict, max_regression: float) -> List[str]:
+    """
+    Compares median latencies with a baseline run.
+
+    Args:
+        results (dict): The current run.
+        baseline (dict): The baseline run.
+        max_regression (float): Tolerated slowdown, e.g. 0.2 for 20%. A baseline case
+            may override it with its own "max_regression".
+
+    Returns:
+        List[str]: A description of each case slower than tolerated.
+    """
+    regressions = []
+    for name, reference in baseline["results"].items():
+        current = results["results"].get(name)
+        if current is None:
+            continue
+        tolerance = reference.get("max_regression", max_regression)
+        ratio = current["median_us"] / reference["median_us"]
+        if ratio > 1 + tolerance:
+            regressions.append(
+                f"{name}: {current['median_us']}us vs {reference['median_us']}us "
+                f"(+{(ratio - 1) * 100:.0f}%, tolerated +{tolerance * 100:.0f}%)"
+            )
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Runs the suite from the command line.
+
+    Args:
+        argv (List[str], optional): The command line arguments.
+
+    Returns:
+        int: The exit status, 1 when a regression exceeds the threshold.
+    """
+    parser = argparse.ArgumentParser(description="Run the offline benchmark suite.")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--only", help="run only the cases starting with this prefix")
+    parser.add_argument("--coldstart-runs", type=int, default=5,
+                        help="processes started per cold start case, 0 to skip them")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results of a previous run to compare with")
+    parser.add_argument("--max-regression", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    results = run(args.iterations, args.warmup, args.only, args.coldstart_runs)
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.max_regression)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
@@ -0,0 +1,156 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+from typing import Dict, List
+from benchmarks.asgi_bench import workload
+
+STORED_IDS = 100
+
+
+def serve(duration: float, db_latency: float) -> int:
+    """
+    Runs in a worker process: serves the workload of `asgi_bench` with the Flask app
+    of run.py, one request at a time, for `duration` seconds.
+
+    Args:
+        duration (float): The seconds to serve for.
+        db_latency (float): Seconds slept by every database call.
+
+    Returns:
+        int: The number of requests served.
+    """
+    import run
+    import db_connector
+    from benchmarks.standins import LatencyProxy
+
+    if db_latency:
+        db_connector.cursor = LatencyProxy(db_connector.get_cursor(), db_latency)
+    client = run.app.test_client()
+    calls = workload(1000, STORED_IDS)
+    served = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        method, path, body = calls[served % len(calls)]
+        status = client.open(path, method=method, json=body).status_code
+        if status >= 400:
+            raise RuntimeError(f"{method} {path} failed with status {status}")
+        served += 1
+    return served
+
+
+def child(workers: int, duration: float, db_latency: float) -> None:
+    """
+    Runs in the measured process, as a preforking server does: imports the app, uses
+    its database and key vault once, then forks the workers, which must each build
+    their own, and prints the number of requests they served as JSON.
+
+    Args:
+        workers (int): The number of worker processes.
+        duration (float): The seconds each worker serves for.
+        db_latency (float): Seconds slept by every database call.
+    """
+    import run
+
+    client = run.app.test_client()
+    body = {"crypto_currency": "BTC", "count": STORED_IDS}
+    assert client.post("/api-blockchain/generate/batch", json=body).status_code == 201
+
+    pipes = []
+    for _ in range(workers):
+        read, write = os.pipe()
+        if os.fork() == 0:
+            os.close(read)
+            status = 1
+            try:
+                os.write(write, str(serve(duration, db_latency)).encode())
+                status = 0
+            finally:
+                os._exit(status)
+        os.close(write)
+        pipes.append(read)
+
+    served = []
+    for read in pipes:
+        with os.fdopen(read) as pipe:
+            served.append(int(pipe.read() or 0))
+    statuses = [os.wait()[1] for _ in range(workers)]
+    if any(statuses):
+        raise RuntimeError("A worker failed")
+    print(json.dumps({"served": sum(served)}))
+
+
+def measure(workers: int, duration: float, db_latency: float) -> Dict[str, float]:
+    """
+    Measures the throughput of `workers` forked worker processes, on an embedded
+    database file and a local key vault created for the run.
+
+    Args:
+        workers (int): The number of worker processes.
+        duration (float): The seconds each worker serves for.
+        db_latency (float): Seconds slept by every database call.
+
+    Returns:
+        dict: The number of requests served, and the requests per second.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(
+            os.environ,
+            DB_BACKEND="sqlite",
+            SQLITE_PATH=os.path.join(directory, "workers.db"),
+            KEY_VAULT_BACKEND="local",
+            KEY_VAULT_DIR=os.path.join(directory, "keys"),
+            ADDRESS_POOL_ENABLED="false",
+            WARM_UP_ON_START="false",
+        )
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.workers_bench", "--child", str(workers),
+             "--duration", str(duration), "--db-latency", str(db_latency)],
+            cwd=root, env=env, capture_output=True, text=True, check=True,
+        ).stdout
+    served = json.loads(output.strip().splitlines()[-1])["served"]
+    return {"served": served, "requests_per_sec": round(served / duration, 1)}
+
+
+def scaling(worker_counts: List[int], duration: float, db_latency: float) -> Dict:
+    """
+    Measures the throughput for each number of workers, and its speedup over the
+    first.
+
+    Args:
+        worker_counts (List[int]): The numbers of worker processes.
+        duration (float): The seconds each worker serves for.
+        db_latency (float): Seconds slept by every database call.
+
+    Returns:
+        dict: The results of each number of workers.
+    """
+    results = {}
+    for workers in worker_counts:
+        results[workers] = measure(workers, duration, db_latency)
+    base = results[worker_counts[0]]["requests_per_sec"]
+    for result in results.values():
+        result["speedup"] = round(result["requests_per_sec"] / base, 2) if base else None
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the throughput of forked worker processes serving the "
+                    "Flask app, by number of workers."
+    )
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--duration", type=float, default=3.0)
+    parser.add_argument("--db-latency", type=float, default=0.002)
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.duration, args.db_latency)
+    else:
+        results = scaling(args.workers, args.duration, args.db_latency)
+        print(json.dumps({"cpus": os.cpu_count(), "workers": results}, indent=2))
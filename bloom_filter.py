@@ -0,0 +1,210 @@
+import os
+import math
+import time
+import hashlib
+import threading
+from typing import Callable, Dict, Iterator, Optional, Tuple
+from settings import load_settings
+
+load_settings()
+
+ADDRESS_FILTER_CAPACITY = int(os.environ.get("ADDRESS_FILTER_CAPACITY", 1000000))
+ADDRESS_FILTER_ERROR_RATE = float(os.environ.get("ADDRESS_FILTER_ERROR_RATE", 0.01))
+ADDRESS_FILTER_SYNC_INTERVAL = float(os.environ.get("ADDRESS_FILTER_SYNC_INTERVAL", 5))
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float = 0.01) -> None:
+        """
+        Initializes a BloomFilter object, sized so that the false positive rate stays
+        below `error_rate` for up to `capacity` items.
+
+        Args:
+            capacity (int): The expected number of items.
+            error_rate (float, optional): The false positive rate at capacity.
+                Defaults to 0.01.
+        """
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        self.size = math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.items = 0
+        self._bits = bytearray((self.size + 7) // 8)
+        self._lock = threading.Lock()
+
+    def add(self, item: str) -> None:
+        """
+        Adds an item to the filter.
+
+        Args:
+            item (str): The item.
+        """
+        positions = self._positions(item)
+        with self._lock:
+            for position in positions:
+                self._bits[position >> 3] |= 1 << (position & 7)
+            self.items += 1
+
+    def __contains__(self, item: str) -> bool:
+        """
+        Checks whether an item may have been added. False positives are possible,
+        false negatives are not.
+
+        Args:
+            item (str): The item.
+
+        Returns:
+            bool: False if the item was never added.
+        """
+        bits = self._bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    def _positions(self, item: str) -> list:
+        # Double hashing: the k positions are derived from the two halves of a single
+        # digest, instead of computing k digests.
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+
+class AddressFilter:
+    def __init__(self, capacity: int = ADDRESS_FILTER_CAPACITY,
+                 error_rate: float = ADDRESS_FILTER_ERROR_RATE,
+                 sync_interval: float = ADDRESS_FILTER_SYNC_INTERVAL) -> None:
+        """
+        Initializes an AddressFilter object, a Bloom filter of the stored addresses that
+        answers lookups of unknown addresses without querying the database.
+
+        The filter is built from the database on the first sync, and kept up to date by
+        adding the addresses inserted by this process. Addresses inserted by other
+        processes are caught up by syncing the rows stored since the last sync, at most
+        every `sync_interval` seconds. When the table outgrows the capacity, the filter
+        is rebuilt with twice the capacity.
+
+        Args:
+            capacity (int, optional): The initial capacity of the filter. Defaults to
+                ADDRESS_FILTER_CAPACITY.
+            error_rate (float, optional): The false positive rate at capacity. Defaults
+                to ADDRESS_FILTER_ERROR_RATE.
+            sync_interval (float, optional): Seconds between syncs done by lookups.
+                Defaults to ADDRESS_FILTER_SYNC_INTERVAL.
+        """
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.sync_interval = sync_interval
+        self.rejected = 0
+        self.passed = 0
+        self.false_positives = 0
+        self._rebuilding: Optional[BloomFilter] = None
+        self._sync_lock = threading.Lock()
+        self.clear()
+
+    @property
+    def ready(self) -> bool:
+        """
+        Whether the filter was built from the database.
+
+        Returns:
+            bool: True after the first sync.
+        """
+        return self.synced_at is not None
+
+    def add(self, address: str) -> None:
+        """
+        Adds an address inserted by this process.
+
+        Args:
+            address (str): The address.
+        """
+        self._bloom.add(address)
+        rebuilding = self._rebuilding
+        if rebuilding is not None:
+            rebuilding.add(address)
+
+    def sync(self, stream: Callable[[int], Iterator[Tuple[int, str]]]) -> int:
+        """
+        Adds the addresses stored since the last sync, rebuilding the filter first when
+        it outgrew its capacity.
+
+        Args:
+            stream (Callable): Streams the ID and address of the rows stored after the
+                given ID, ordered by ID.
+
+        Returns:
+            int: The number of addresses added.
+        """
+        with self._sync_lock:
+            if self.stored > self._bloom.capacity:
+                self._rebuild(stream, self.stored * 2)
+            added = 0
+            for id, address in stream(self.last_id):
+                self._bloom.add(address)
+                self.last_id = id
+                added += 1
+            self.stored += added
+            self.synced_at = time.monotonic()
+            return added
+
+    def lookup(self, address: str, finder: Callable[[str], Optional[tuple]],
+               stream: Callable[[int], Iterator[Tuple[int, str]]]) -> Optional[tuple]:
+        """
+        Looks an address up, rejecting it from the filter when possible and asking the
+        database otherwise.
+
+        Args:
+            address (str): The address.
+            finder (Callable): Reads the row of an address from the database, or None.
+            stream (Callable): Streams the rows stored after an ID, to sync the filter.
+
+        Returns:
+            tuple: The row found by `finder`, or None if the address is not stored.
+        """
+        if not self.ready or time.monotonic() - self.synced_at >= self.sync_interval:
+            self.sync(stream)
+        if address not in self._bloom:
+            self.rejected += 1
+            return None
+        self.passed += 1
+        row = finder(address)
+        if row is None:
+            self.false_positives += 1
+        return row
+
+    def clear(self) -> None:
+        """
+        Empties the filter, so the next lookup builds it again from the database.
+        """
+        self.last_id = 0
+        self.stored = 0
+        self.synced_at: Optional[float] = None
+        self._bloom = BloomFilter(self.capacity, self.error_rate)
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns the filter counters.
+
+        Returns:
+            dict: The number of stored addresses, the capacity and size in bytes of the
+                filter, and the number of lookups rejected, passed to the database, and
+                found missing there.
+        """
+        return {
+            "items": self.stored,
+            "capacity": self._bloom.capacity,
+            "bytes": len(self._bloom._bits),
+            "rejected": self.rejected,
+            "passed": self.passed,
+            "false_positives": self.false_positives,
+        }
+
+    def _rebuild(self, stream: Callable[[int], Iterator[Tuple[int, str]]], capacity: int) -> None:
+        # Addresses added while the new filter is filled go to both filters.
+        self._rebuilding = BloomFilter(capacity, self.error_rate)
+        last_id = stored = 0
+        for id, address in stream(0):
+            self._rebuilding.add(address)
+            last_id = id
+            stored += 1
+        self._bloom, self._rebuilding = self._rebuilding, None
+        self.last_id, self.stored = last_id, stored
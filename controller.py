@@ -1,26 +1,307 @@
+import os
+import json
+import logging
 import db_connector
-from cryptography import KeyManager, CurrenciesEncrypter
+import key_vault
+import metrics
+import address_pool
+import address_cache
+import bloom_filter
+import address_registry
+import list_cache
+import validation
+import hd_wallet
+import write_behind
+import export
+import api_routes
+from typing import Callable, Dict, Iterator, List, Mapping, Optional, Tuple
+from cryptography import (
+    DERIVERS,
+    KeyManager,
+    CurrenciesEncrypter,
+    derivation_engine,
+    derive_ethereum_address,
+)
+from settings import load_settings
+
+load_settings()
+
+logger = logging.getLogger()
+
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", 1000))
+LIST_PAGE_SIZE = int(os.environ.get("LIST_PAGE_SIZE", 1000))
+MAX_LIST_PAGE_SIZE = int(os.environ.get("MAX_LIST_PAGE_SIZE", 10000))
+MAX_VALIDATE_BATCH = int(os.environ.get("MAX_VALIDATE_BATCH", 10000))
+WARM_UP_ON_START = os.environ.get("WARM_UP_ON_START", "true").lower() == "true"
+WARM_UP_KEY = "1" * 64
+
+
+def create_child_indexes() -> hd_wallet.ChildIndexAllocator:
+    """
+    Creates the allocator of HD child indexes, reserved on the database.
+
+    Returns:
+        ChildIndexAllocator: The allocator.
+    """
+    return hd_wallet.ChildIndexAllocator(
+        lambda *args: db_connector.reserve_child_indexes_on_db(*args)
+    )
+
+
+def create_write_queue(
+    path: str = write_behind.WRITE_BEHIND_JOURNAL,
+) -> write_behind.WriteBehindQueue:
+    """
+    Creates the write-behind queue, persisting to the database. Journaled rows are
+    checked against the primary, since a lagging replica would have them inserted
+    twice on replay.
+
+    Args:
+        path (str, optional): The journal file. Defaults to WRITE_BEHIND_JOURNAL.
+
+    Returns:
+        WriteBehindQueue: The queue.
+    """
+    return write_behind.WriteBehindQueue(
+        lambda *args: persist_flushed_addresses(*args),
+        lambda address: db_connector.find_address_in_primary_db(address) is not None,
+        path,
+    )
+
+
+def create_pool() -> address_pool.AddressPool:
+    """
+    Creates the pool of pre-generated addresses. Without HD derivation, Ethereum and
+    Tron are not pooled, since their private key yields a single address.
+
+    Returns:
+        AddressPool: The pool.
+    """
+    currencies = [
+        crypto
+        for crypto in address_pool.ADDRESS_POOL_CURRENCIES
+        if hd_wallet.HD_DERIVATION_ENABLED or crypto not in DERIVERS
+    ]
+    skipped = len(currencies) < len(address_pool.ADDRESS_POOL_CURRENCIES)
+    if skipped and address_pool.ADDRESS_POOL_ENABLED:
+        logger.warning("Ethereum and Tron addresses are only pooled with HD_DERIVATION_ENABLED")
+    return address_pool.AddressPool(currencies, lambda *args: refill_addresses(*args))
+
+
+def create_registry() -> address_registry.AddressRegistry:
+    """
+    Creates the registry of known addresses. Without HD derivation, the private key
+    of Ethereum and Tron yields a single address, so the registry refuses every
+    request for them after the first, which is logged as a warning.
+
+    Returns:
+        AddressRegistry: The registry.
+    """
+    if address_registry.ADDRESS_REGISTRY_ENABLED and not hd_wallet.HD_DERIVATION_ENABLED:
+        logger.warning(
+            "ADDRESS_REGISTRY_ENABLED without HD_DERIVATION_ENABLED refuses Ethereum and "
+            "Tron addresses after the first one, with 409"
+        )
+    return address_registry.AddressRegistry()
+
+
+cache = address_cache.AddressCache()
+address_filter = bloom_filter.AddressFilter()
+registry = create_registry()
+page_cache = list_cache.ListCache(lambda: db_connector.table_state_from_db())
+keychain = hd_wallet.HDKeychain()
+child_indexes = create_child_indexes()
+write_queue = create_write_queue()
+pool = create_pool()
+warm_up_state = "idle"
+
+metrics.register(metrics.Gauge(
+    "blockchain_write_behind_depth",
+    "Journaled addresses waiting to be persisted.",
+    (),
+    lambda: {(): write_queue.stats()["depth"]},
+))
+metrics.register(metrics.Gauge(
+    "blockchain_write_behind_lag_seconds",
+    "Age of the oldest journaled address waiting to be persisted.",
+    (),
+    lambda: {(): write_queue.stats()["flush_lag"]},
+))
+
+
+def _reset_after_fork() -> None:
+    # The threads of the parent do not run in a forked process, and a lock they held
+    # at fork time would never be released, so the components owning threads or locks
+    # are created anew. The reserved child index blocks must not be shared, or two
+    # processes would derive the same addresses, and each process journals to its own
+    # file, since the journal is locked by its writer.
+    global cache, address_filter, registry, page_cache, keychain, child_indexes, write_queue, pool
+    cache = address_cache.AddressCache()
+    address_filter = bloom_filter.AddressFilter()
+    registry = address_registry.AddressRegistry()
+    page_cache = list_cache.ListCache(lambda: db_connector.table_state_from_db())
+    keychain = hd_wallet.HDKeychain()
+    child_indexes = create_child_indexes()
+    write_queue = create_write_queue(f"{write_behind.WRITE_BEHIND_JOURNAL}.{os.getpid()}")
+    pool = create_pool()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
 
 
 def generate_address_to_crypto(crypto_symbol: str) -> str:
     """
-    Generates an address for the given cryptocurrency symbol.
+    Generates an address for the given cryptocurrency symbol. With
+    HD_DERIVATION_ENABLED, the address is derived from the next child key of the
+    private key of the cryptocurrency, used as HD master secret. With
+    ADDRESS_REGISTRY_ENABLED, an address already known is generated again.
 
     Args:
         crypto_symbol (str): The cryptocurrency symbol.
 
     Returns:
         str: The generated address for the given cryptocurrency.
+
+    Raises:
+        BadRequestError: If the cryptocurrency is not supported.
+    """
+    crypto_symbol = check_currency(crypto_symbol)
+    with metrics.stage_timer("key_recovery", crypto_symbol):
+        key_parser = KeyManager(crypto_symbol)
+    encrypter = CurrenciesEncrypter()
+
+    def derive(count: int) -> List[str]:
+        with metrics.stage_timer("derivation", crypto_symbol):
+            if hd_wallet.HD_DERIVATION_ENABLED:
+                indexes = child_indexes.allocate(crypto_symbol, count)
+                child_keys = keychain.child_keys(crypto_symbol, key_parser.private_key, indexes)
+                return [encrypter.generate_address(crypto_symbol, key) for key in child_keys]
+            return [
+                encrypter.generate_address(crypto_symbol, key_parser.private_key)
+                for _ in range(count)
+            ]
+
+    return claim_addresses(crypto_symbol, derive(1), derive)[0]
+
+
+def generate_addresses_to_crypto(crypto_symbol: str, count: int) -> List[str]:
+    """
+    Generates a batch of addresses for the given cryptocurrency symbol, recovering
+    the private key once for the whole batch. With HD_DERIVATION_ENABLED, the
+    addresses are derived from consecutive child keys, and are all distinct. With
+    ADDRESS_REGISTRY_ENABLED, the addresses already known are generated again.
+
+    Args:
+        crypto_symbol (str): The cryptocurrency symbol.
+        count (int): The number of addresses to generate.
+
+    Returns:
+        List[str]: The generated addresses.
+
+    Raises:
+        BadRequestError: If the cryptocurrency is not supported.
     """
-    crypto_symbol = crypto_symbol.upper()
-    key_parser = KeyManager(crypto_symbol)
+    crypto_symbol = check_currency(crypto_symbol)
+    with metrics.stage_timer("key_recovery", crypto_symbol):
+        key_parser = KeyManager(crypto_symbol)
     encrypter = CurrenciesEncrypter()
-    return encrypter.generate_address(crypto_symbol, key_parser.private_key)
+
+    def derive(count: int) -> List[str]:
+        with metrics.stage_timer("derivation", crypto_symbol):
+            if hd_wallet.HD_DERIVATION_ENABLED:
+                indexes = child_indexes.allocate(crypto_symbol, count)
+                child_keys = keychain.child_keys(crypto_symbol, key_parser.private_key, indexes)
+                return encrypter.derive_addresses(crypto_symbol, child_keys)
+            return encrypter.generate_addresses(crypto_symbol, key_parser.private_key, count)
+
+    return claim_addresses(crypto_symbol, derive(count), derive)
+
+
+def claim_addresses(crypto_symbol: str, addresses: List[str],
+                    derive: Callable[[int], List[str]]) -> List[str]:
+    """
+    Records freshly generated addresses in the address registry, replacing those
+    already known, including repeats within the batch, by new ones, when
+    ADDRESS_REGISTRY_ENABLED.
+
+    Args:
+        crypto_symbol (str): The cryptocurrency symbol.
+        addresses (List[str]): The generated addresses.
+        derive (Callable): Generates a number of new addresses.
+
+    Returns:
+        List[str]: As many addresses, all unknown before.
+
+    Raises:
+        DuplicateAddressError: If duplicates are still generated after
+            ADDRESS_REGISTRY_RETRIES attempts, as when deriving the same Ethereum or
+            Tron address from the private key without HD derivation.
+    """
+    if not address_registry.ADDRESS_REGISTRY_ENABLED:
+        return addresses
+    registry.sync_if_due(db_connector.stream_address_rows_from_db)
+    count = len(addresses)
+    claimed: List[str] = []
+    for attempt in range(address_registry.ADDRESS_REGISTRY_RETRIES + 1):
+        if attempt:
+            addresses = derive(count - len(claimed))
+        claimed.extend(address for address in addresses if registry.claim(crypto_symbol, address))
+        if len(claimed) == count:
+            return claimed
+    raise address_registry.DuplicateAddressError(
+        f"Generated {count - len(claimed)} known {crypto_symbol} addresses "
+        f"{address_registry.ADDRESS_REGISTRY_RETRIES + 1} times"
+    )
+
+
+def refill_addresses(crypto_symbol: str, count: int) -> List[str]:
+    """
+    Generates and persists a batch of addresses of a cryptocurrency, ready to be
+    served from the address pool.
+
+    Args:
+        crypto_symbol (str): The cryptocurrency symbol.
+        count (int): The number of addresses.
+
+    Returns:
+        List[str]: The persisted addresses.
+    """
+    addresses = generate_addresses_to_crypto(crypto_symbol, count)
+    persist_addresses(addresses, crypto_symbol)
+    return addresses
+
+
+def issue_address(crypto_currency: str) -> str:
+    """
+    Returns a new persisted address of a cryptocurrency, taken from the pool of
+    pre-generated addresses when enabled and ready, otherwise generated inline.
+
+    Args:
+        crypto_currency (str): The cryptocurrency symbol.
+
+    Returns:
+        str: The address.
+
+    Raises:
+        BadRequestError: If the cryptocurrency is not supported.
+    """
+    symbol = check_currency(crypto_currency)
+    if address_pool.ADDRESS_POOL_ENABLED:
+        pool.start()
+        address = pool.pop(symbol)
+        if address:
+            return address
+    address = generate_address_to_crypto(symbol)
+    persist_address(address, symbol)
+    return address
 
 
 def persist_address(address: str, crypto_currency: str) -> None:
     """
-    Persists the address and corresponding cryptocurrency in the database.
+    Persists the address and corresponding cryptocurrency in the database, or with
+    WRITE_BEHIND_ENABLED, in the write-behind journal, from which it reaches the
+    database shortly after. The symbol is stored in upper case, under which the
+    address registry files the address.
 
     Args:
         address (str): The address to persist.
@@ -29,7 +310,57 @@ def persist_address(address: str, crypto_currency: str) -> None:
     Returns:
         None
     """
-    db_connector.persist_address_on_db(address, crypto_currency)
+    crypto_currency = crypto_currency.upper()
+    if write_behind.WRITE_BEHIND_ENABLED:
+        with metrics.stage_timer("journal_append", crypto_currency):
+            write_queue.append([(address, crypto_currency)])
+    else:
+        with metrics.stage_timer("db_insert", crypto_currency):
+            db_connector.persist_address_on_db(address, crypto_currency)
+        page_cache.invalidate()
+    cache.forget_missing()
+    address_filter.add(address)
+
+
+def persist_addresses(addresses: List[str], crypto_currency: str) -> None:
+    """
+    Persists a batch of addresses of a cryptocurrency in the database, in a single
+    round trip, or with WRITE_BEHIND_ENABLED, in the write-behind journal, with the
+    symbol in upper case, as `persist_address`.
+
+    Args:
+        addresses (List[str]): The addresses to persist.
+        crypto_currency (str): The cryptocurrency associated with the addresses.
+
+    Returns:
+        None
+    """
+    crypto_currency = crypto_currency.upper()
+    if write_behind.WRITE_BEHIND_ENABLED:
+        with metrics.stage_timer("journal_append", crypto_currency):
+            write_queue.append([(address, crypto_currency) for address in addresses])
+    else:
+        with metrics.stage_timer("db_insert", crypto_currency):
+            db_connector.persist_addresses_on_db(addresses, crypto_currency)
+        page_cache.invalidate()
+    cache.forget_missing()
+    for address in addresses:
+        address_filter.add(address)
+
+
+def persist_flushed_addresses(addresses: List[str], crypto_currency: str) -> None:
+    """
+    Persists a batch of addresses flushed by the write-behind queue in the database.
+
+    Args:
+        addresses (List[str]): The addresses to persist.
+        crypto_currency (str): The cryptocurrency associated with the addresses.
+
+    Returns:
+        None
+    """
+    db_connector.persist_addresses_on_db(addresses, crypto_currency)
+    page_cache.invalidate()
 
 
 def list_addresses() -> list:
@@ -42,15 +373,412 @@ def list_addresses() -> list:
     return db_connector.list_addresses_from_db()
 
 
+def list_addresses_page(after_id: int, limit: int) -> Tuple[List[str], Optional[int]]:
+    """
+    Retrieves a page of addresses stored in the database.
+
+    Args:
+        after_id (int): Only addresses with a greater ID are listed.
+        limit (int): The maximum number of addresses.
+
+    Returns:
+        tuple: The addresses, and the ID to pass as `after_id` to fetch the next page,
+            or None when this is the last page.
+    """
+    rows = db_connector.list_addresses_page_from_db(after_id, limit)
+    next_after_id = rows[-1][0] if len(rows) == limit else None
+    return [address for _, address in rows], next_after_id
+
+
+def list_addresses_page_response(
+    after_id: int, limit: int, if_none_match: Optional[str] = None
+) -> Tuple[Optional[bytes], str]:
+    """
+    Serializes a page of addresses as the JSON body of `/list`, tagged with an ETag of
+    the table state. The page is served from the list cache while the table is
+    unchanged, and not at all when the client copy is current.
+
+    Args:
+        after_id (int): Only addresses with a greater ID are listed.
+        limit (int): The maximum number of addresses.
+        if_none_match (str, optional): The If-None-Match header of the request.
+
+    Returns:
+        tuple: The JSON body, or None to answer 304 Not Modified, and the ETag.
+    """
+
+    def build() -> bytes:
+        addresses, next_after_id = list_addresses_page(after_id, limit)
+        page = {"addresses": addresses, "next_after_id": next_after_id}
+        return json.dumps(page).encode() + b"\n"
+
+    return page_cache.respond((after_id, limit), if_none_match, build)
+
+
+def stream_addresses(after_id: int = 0) -> Iterator[Tuple[int, str]]:
+    """
+    Streams the addresses stored in the database, ordered by ID.
+
+    Args:
+        after_id (int, optional): Only addresses with a greater ID are listed.
+            Defaults to 0.
+
+    Returns:
+        Iterator[Tuple[int, str]]: The ID and address of each row.
+    """
+    return db_connector.stream_addresses_from_db(after_id)
+
+
+def export_addresses(format: str, since_id: int = 0) -> Tuple[Iterator[bytes], str]:
+    """
+    Streams the stored addresses, with their ID and cryptocurrency, as an export file.
+    The rows are read and encoded one chunk at a time, so memory stays flat with
+    table size.
+
+    Args:
+        format (str): "csv", or "columnar" for the compact columnar format.
+        since_id (int, optional): Only rows with a greater ID are exported, for
+            incremental exports. Defaults to 0.
+
+    Returns:
+        tuple: The chunks of the file, and its content type.
+    """
+    encode, content_type = export.FORMATS[format]
+    rows = db_connector.stream_address_rows_from_db(since_id, export.EXPORT_CHUNK_SIZE)
+
+    def chunks() -> Iterator[bytes]:
+        try:
+            yield from encode(rows, export.EXPORT_CHUNK_SIZE)
+        finally:
+            rows.close()
+
+    return chunks(), content_type
+
+
 def retrieve_address(id: int) -> str:
     """
-    Retrieves the address from the database based on the given ID.
+    Retrieves the address based on the given ID, from the address cache or, on a
+    miss, from the database.
 
     Args:
         id (int): The ID of the address in the database.
 
     Returns:
-        str: The retrieved address.
+        str: The retrieved address, or None if the ID is not found.
+    """
+    try:
+        id = int(id)
+    except ValueError:
+        return None
+    return cache.get_or_load(id, db_connector.retrieve_address_from_id)
+
+
+def lookup_address(address: str) -> Optional[dict]:
+    """
+    Looks a stored address up by value. Addresses rejected by the address filter are
+    answered without querying the database.
+
+    Args:
+        address (str): The address.
+
+    Returns:
+        dict: The ID, address and cryptocurrency, or None if the address is not stored.
+    """
+    row = address_filter.lookup(
+        address, db_connector.find_address_in_db, db_connector.stream_addresses_from_db
+    )
+    if row is None:
+        return None
+    id, crypto_currency = row
+    return {"id": id, "address": address, "crypto_currency": crypto_currency}
+
+
+def validate_addresses(addresses: List[str], crypto_currency: Optional[str] = None) -> dict:
+    """
+    Validates a batch of addresses against the format of their cryptocurrency, and
+    checks which valid ones are stored, in a single query.
+
+    Args:
+        addresses (List[str]): The addresses.
+        crypto_currency (str, optional): The expected cryptocurrency symbol. Defaults
+            to None, to detect the cryptocurrency of each address.
+
+    Returns:
+        dict: The result of each address, in the same order, with its cryptocurrency,
+            validity, reason, whether it is stored and its ID, and the number of
+            valid, invalid and stored addresses.
+    """
+    results = validation.validate_addresses(addresses, crypto_currency)
+    forms = {
+        validation.storage_form(result["address"], result["crypto_currency"])
+        for result in results
+        if result["valid"]
+    }
+    stored = db_connector.find_addresses_in_db(sorted(forms)) if forms else {}
+    for result in results:
+        row = None
+        if result["valid"]:
+            row = stored.get(
+                validation.storage_form(result["address"], result["crypto_currency"])
+            )
+        result["stored"] = row is not None
+        result["id"] = row[0] if row else None
+    valid = sum(result["valid"] for result in results)
+    return {
+        "results": results,
+        "valid": valid,
+        "invalid": len(results) - valid,
+        "stored": sum(result["stored"] for result in results),
+    }
+
+
+def sync_address_filter() -> int:
+    """
+    Builds the address filter from the database on startup, or adds the addresses
+    stored since the last sync.
+
+    Returns:
+        int: The number of addresses added to the filter.
+    """
+    return address_filter.sync(db_connector.stream_addresses_from_db)
+
+
+def sync_address_registry() -> int:
+    """
+    Loads the address registry from the database on startup, or records the addresses
+    stored since the last sync.
+
+    Returns:
+        int: The number of addresses read.
+    """
+    return registry.sync(db_connector.stream_address_rows_from_db)
+
+
+def warm_address_cache(count: int = address_cache.ADDRESS_CACHE_WARM_SIZE) -> int:
+    """
+    Loads the most recently stored addresses into the address cache.
+
+    Args:
+        count (int, optional): The number of addresses. Defaults to
+            ADDRESS_CACHE_WARM_SIZE.
+
+    Returns:
+        int: The number of cached addresses.
+    """
+    if count <= 0:
+        return 0
+    return cache.warm(db_connector.recent_addresses_from_db(count))
+
+
+def start_write_behind() -> int:
+    """
+    Starts the write-behind queue, replaying its journal, and persists the rows left
+    in the journals of stopped worker processes.
+
+    Returns:
+        int: The number of rows recovered from other journals.
+    """
+    write_queue.start()
+    return write_behind.recover_orphaned_journals(write_queue)
+
+
+def warm_up() -> Dict[str, str]:
+    """
+    Opens the database connection, loads the private keys, the derivation library
+    and the address caches ahead of the first request, and loads the address
+    registry, replays the write-behind journal and starts the address pool when
+    enabled. A failing step is logged and skipped rather than raised, so the process
+    starts while a dependency is unavailable and does that work on first use.
+
+    Returns:
+        dict: "ok", or the error, of each step.
+    """
+    global warm_up_state
+    warm_up_state = "running"
+    steps = {
+        "database": lambda: db_connector.recent_addresses_from_db(1),
+        "key_vault": lambda: key_vault.key_cache.get("BTC"),
+        "derivation": lambda: derive_ethereum_address(WARM_UP_KEY),
+        "address_cache": warm_address_cache,
+        "address_filter": sync_address_filter,
+    }
+    if address_registry.ADDRESS_REGISTRY_ENABLED:
+        steps["address_registry"] = sync_address_registry
+    if write_behind.WRITE_BEHIND_ENABLED:
+        steps["write_behind"] = start_write_behind
+    if address_pool.ADDRESS_POOL_ENABLED:
+        steps["address_pool"] = pool.start
+    results = {}
+    for name, step in steps.items():
+        try:
+            step()
+            results[name] = "ok"
+        except Exception as error:
+            logger.warning(f"Warm-up step {name} failed: {error}")
+            results[name] = str(error)
+    warm_up_state = "done"
+    return results
+
+
+def check_readiness() -> Tuple[bool, Dict[str, str]]:
+    """
+    Checks whether the process is ready to serve: the warm-up, if started, has
+    finished, and the database answers.
+
+    Returns:
+        tuple: Whether the process is ready, and the state of each check.
+    """
+    checks = {"warm_up": warm_up_state}
+    try:
+        db_connector.recent_addresses_from_db(1)
+        checks["database"] = "ok"
+    except Exception as error:
+        checks["database"] = str(error)
+    return warm_up_state != "running" and checks["database"] == "ok", checks
+
+
+def get_stats() -> dict:
+    """
+    Collects the runtime counters of the service caches.
+
+    Returns:
+        dict: The counters, grouped by component.
+    """
+    return {
+        "key_cache": key_vault.key_cache.stats(),
+        "db_pool": db_connector.pool_stats(),
+        "derivation": derivation_engine.stats(),
+        "address_pool": pool.stats(),
+        "address_cache": cache.stats(),
+        "address_filter": address_filter.stats(),
+        "address_registry": registry.stats(),
+        "list_cache": page_cache.stats(),
+        "hd_keychain": keychain.stats(),
+        "write_behind": write_queue.stats(),
+    }
+
+
+def check_currency(crypto_currency: str) -> str:
+    """
+    Checks that a cryptocurrency symbol is supported, before any key is recovered or
+    metric recorded for it.
+
+    Args:
+        crypto_currency (str): The cryptocurrency symbol, in any case.
+
+    Returns:
+        str: The symbol in upper case.
+
+    Raises:
+        BadRequestError: If the cryptocurrency is not supported.
+    """
+    symbol = str(crypto_currency).upper()
+    if symbol not in validation.PATTERNS:
+        raise api_routes.BadRequestError(f"Unknown crypto_currency: {crypto_currency}")
+    return symbol
+
+
+def parse_batch_request(data: Mapping) -> Tuple[str, int]:
+    """
+    Validates the body of a batch generation request.
+
+    Args:
+        data (Mapping): The request body.
+
+    Returns:
+        tuple: The cryptocurrency symbol and the number of addresses to generate.
+
+    Raises:
+        ValueError: If the cryptocurrency is missing or not supported, the count is
+            not an integer from 1 to MAX_BATCH_SIZE, or several Ethereum or Tron addresses are
+            requested without HD derivation, which would all be the same.
+    """
+    crypto_currency = data.get("crypto_currency")
+    count = data.get("count")
+    if not crypto_currency:
+        raise ValueError("Missing crypto_currency parameter")
+    if type(count) is not int or not 0 < count <= MAX_BATCH_SIZE:
+        raise ValueError(f"count must be an integer from 1 to {MAX_BATCH_SIZE}")
+    symbol = check_currency(crypto_currency)
+    if count > 1 and symbol in DERIVERS and not hd_wallet.HD_DERIVATION_ENABLED:
+        raise ValueError(
+            f"A private key yields a single {symbol} address, "
+            "enable HD derivation to generate batches"
+        )
+    return crypto_currency, count
+
+
+def parse_validate_request(data: Mapping) -> Tuple[List[str], Optional[str]]:
+    """
+    Validates the body of a batch validation request.
+
+    Args:
+        data (Mapping): The request body.
+
+    Returns:
+        tuple: The addresses, and the cryptocurrency symbol or None.
+
+    Raises:
+        ValueError: If the addresses are not a list of 1 to MAX_VALIDATE_BATCH strings,
+            or the cryptocurrency is unknown.
+    """
+    addresses = data.get("addresses")
+    if (
+        not isinstance(addresses, list)
+        or not 0 < len(addresses) <= MAX_VALIDATE_BATCH
+        or not all(isinstance(address, str) for address in addresses)
+    ):
+        raise ValueError(f"addresses must be a list of 1 to {MAX_VALIDATE_BATCH} strings")
+    crypto_currency = data.get("crypto_currency")
+    if crypto_currency is not None:
+        crypto_currency = str(crypto_currency).upper()
+        if crypto_currency not in validation.PATTERNS:
+            raise ValueError(f"Unknown crypto_currency: {crypto_currency}")
+    return addresses, crypto_currency
+
+
+def parse_list_query(args: Mapping) -> Tuple[int, int]:
+    """
+    Validates the pagination parameters of a list request.
+
+    Args:
+        args (Mapping): The query parameters.
+
+    Returns:
+        tuple: The `after_id` and `limit` of the page.
+
+    Raises:
+        ValueError: If the parameters are not integers or the limit is not from 1 to
+            MAX_LIST_PAGE_SIZE.
+    """
+    try:
+        after_id = int(args.get("after_id", 0))
+        limit = int(args.get("limit", LIST_PAGE_SIZE))
+    except ValueError:
+        raise ValueError("after_id and limit must be integers")
+    if not 0 < limit <= MAX_LIST_PAGE_SIZE:
+        raise ValueError(f"limit must be from 1 to {MAX_LIST_PAGE_SIZE}")
+    return after_id, limit
+
+
+def parse_export_query(args: Mapping) -> Tuple[str, int]:
+    """
+    Validates the parameters of an export request.
+
+    Args:
+        args (Mapping): The query parameters.
+
+    Returns:
+        tuple: The export format and the `since_id`.
+
+    Raises:
+        ValueError: If the format is unknown or `since_id` is not an integer.
     """
-    address = db_connector.retrieve_address_from_id(id)
-    return address
\ No newline at end of file
+    format = args.get("format", "csv")
+    if format not in export.FORMATS:
+        raise ValueError(f"format must be one of {', '.join(export.FORMATS)}")
+    try:
+        since_id = int(args.get("since_id", 0))
+    except ValueError:
+        raise ValueError("since_id must be an integer")
+    return format, since_id
@@ -1,16 +1,28 @@
+import os
+import time
 import random
 import logging
 import hashlib
+import threading
 import key_vault
-from typing import Optional
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
 from sha3 import keccak_256
 from secrets import token_bytes
-from coincurve import PublicKey
 from string import ascii_letters
+from settings import load_settings
+
+load_settings()
 
 logger = logging.getLogger()
 logger.setLevel("INFO")
 
+DERIVATION_WORKERS = int(os.environ.get("DERIVATION_WORKERS", os.cpu_count() or 1))
+DERIVATION_CHUNK_SIZE = int(os.environ.get("DERIVATION_CHUNK_SIZE", 500))
+DERIVATION_PARALLEL_THRESHOLD = int(os.environ.get("DERIVATION_PARALLEL_THRESHOLD", 2000))
+DERIVATION_START_METHOD = os.environ.get("DERIVATION_START_METHOD", "spawn")
+
 
 class KeyManager:
     def __init__(self, crypto_symbol: str, seed: Optional[int] = None) -> None:
@@ -42,7 +54,8 @@ class KeyManager:
 
     def recover_private_key(self, crypto_currency: str) -> str:
         """
-        Recovers the private key from the S3 bucket.
+        Recovers the private key from the process-wide key cache, which reaches the
+        S3 bucket only when it is cold or expired.
 
         Args:
             crypto_currency (str): The symbol of the cryptocurrency.
@@ -50,9 +63,7 @@ class KeyManager:
         Returns:
             str: The recovered private key if it exists in the S3 bucket, otherwise an empty string.
         """
-        private_keys = key_vault.recover_from_s3()
-        private_key = private_keys.get(crypto_currency, "")
-        return private_key
+        return key_vault.key_cache.get(crypto_currency)
 
     def generate_private_key(self, crypto_currency: Optional[str] = None) -> str:
         """
@@ -75,19 +86,26 @@ class KeyManager:
             private_key = keccak_256(token_bytes(32)).digest().hex()
         else:
             raise ValueError("Invalid cryptocurrency")
-        self.persist_private_key(private_key, crypto_currency)
-        logger.warning("Fresh private key created.")
-        return private_key
+        stored = self.persist_private_key(private_key, crypto_currency) or private_key
+        if stored == private_key:
+            logger.warning("Fresh private key created.")
+        else:
+            logger.info("Private key of a concurrent writer adopted.")
+        return stored
 
-    def persist_private_key(self, private_key: str, crypto_currency: str) -> None:
+    def persist_private_key(self, private_key: str, crypto_currency: str) -> str:
         """
         Persists the private key in the S3 bucket.
 
         Args:
             private_key (str): The private key to persist.
             crypto_currency (str): The symbol of the cryptocurrency.
+
+        Returns:
+            str: The private key stored in the bucket, which is the one of a concurrent
+                writer if it persisted first.
         """
-        key_vault.persist_on_s3(private_key, crypto_currency)
+        return key_vault.persist_on_s3(private_key, crypto_currency)
 
 class CurrenciesEncrypter:
     def __init__(self, seed: Optional[int] = None) -> None:
@@ -119,6 +137,49 @@ class CurrenciesEncrypter:
         generate_address = crypto_mapping[crypto_symbol]
         return generate_address(private_key)
 
+    def derive_addresses(self, crypto_symbol: str, private_keys: List[str]) -> List[str]:
+        """
+        Derives the addresses of many private keys. Ethereum and Tron derivations run
+        on the process-wide DerivationEngine, which spreads large jobs across cores.
+
+        Args:
+            crypto_symbol (str): The cryptocurrency symbol.
+            private_keys (List[str]): The private keys.
+
+        Returns:
+            List[str]: The address of each private key, in the same order.
+        """
+        if crypto_symbol in DERIVERS:
+            return derivation_engine.derive(crypto_symbol, private_keys)
+        return [self.generate_address(crypto_symbol, key) for key in private_keys]
+
+    def generate_addresses(
+        self, crypto_symbol: str, private_key: str, count: int
+    ) -> List[str]:
+        """
+        Generates a batch of addresses for the given cryptocurrency symbol and private key.
+
+        Args:
+            crypto_symbol (str): The cryptocurrency symbol.
+            private_key (str): The private key.
+            count (int): The number of addresses to generate.
+
+        Returns:
+            List[str]: The generated addresses.
+
+        Raises:
+            ValueError: If more than one Ethereum or Tron address is requested, since
+                a private key yields a single one.
+        """
+        if crypto_symbol in DERIVERS:
+            if count > 1:
+                raise ValueError(
+                    f"A private key yields a single {crypto_symbol} address, "
+                    "enable HD derivation to generate batches"
+                )
+            return self.derive_addresses(crypto_symbol, [private_key]) * count
+        return [self.generate_address(crypto_symbol, private_key) for _ in range(count)]
+
     def bitcoin_generator(self, private_key: str) -> str:
         """
         Generates a Bitcoin address according to Bitcoin rules.
@@ -167,10 +228,7 @@ class CurrenciesEncrypter:
         Returns:
             str: The generated Ethereum address.
         """
-        public_key = PublicKey.from_valid_secret(private_key.encode()).format(
-            compressed=False)[1:]
-        address = keccak_256(public_key).digest()
-        address = "0x" + address[-20:].hex()
+        address = derive_ethereum_address(private_key)
         logger.info("Ethereum address generated.")
         return address
 
@@ -184,9 +242,176 @@ class CurrenciesEncrypter:
         Returns:
             str: The generated Tron address.
         """
-        public_key = PublicKey.from_valid_secret(private_key.encode()).format(
-            compressed=False)[1:]
-        address = keccak_256(public_key).digest()[-20:].hex()
-        address = "41" + address
+        address = derive_tron_address(private_key)
         logger.info("Tron address generated.")
-        return address
\ No newline at end of file
+        return address
+
+
+class DerivationEngine:
+    def __init__(
+        self,
+        workers: int = DERIVATION_WORKERS,
+        chunk_size: int = DERIVATION_CHUNK_SIZE,
+        parallel_threshold: int = DERIVATION_PARALLEL_THRESHOLD,
+        start_method: str = DERIVATION_START_METHOD,
+    ) -> None:
+        """
+        Initializes a DerivationEngine, which runs the CPU-bound EC derivations of
+        large jobs on a pool of worker processes, outside the GIL of the caller.
+
+        Args:
+            workers (int, optional): Number of worker processes. Defaults to
+                DERIVATION_WORKERS.
+            chunk_size (int, optional): Maximum number of keys submitted per task.
+                Defaults to DERIVATION_CHUNK_SIZE.
+            parallel_threshold (int, optional): Jobs with fewer keys are derived
+                inline, where the pool overhead would dominate. Defaults to
+                DERIVATION_PARALLEL_THRESHOLD.
+            start_method (str, optional): Multiprocessing start method of the workers.
+                Defaults to DERIVATION_START_METHOD.
+        """
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.parallel_threshold = parallel_threshold
+        self.start_method = start_method
+        self.jobs = 0
+        self.addresses = 0
+        self.seconds = 0.0
+        self.last_throughput = 0.0
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def derive(self, crypto_symbol: str, private_keys: List[str]) -> List[str]:
+        """
+        Derives the address of each private key, sharding large jobs in chunks across
+        the worker processes.
+
+        Args:
+            crypto_symbol (str): The cryptocurrency symbol, "ETH" or "TRO".
+            private_keys (List[str]): The private keys.
+
+        Returns:
+            List[str]: The address of each private key, in the same order.
+        """
+        start = time.perf_counter()
+        if self.workers > 1 and len(private_keys) >= self.parallel_threshold:
+            addresses = []
+            chunks = self._chunks(private_keys)
+            symbols = [crypto_symbol] * len(chunks)
+            for chunk in self._get_executor().map(derive_chunk, symbols, chunks):
+                addresses.extend(chunk)
+        else:
+            addresses = derive_chunk(crypto_symbol, private_keys)
+        self._record(len(addresses), time.perf_counter() - start)
+        return addresses
+
+    def shutdown(self) -> None:
+        """
+        Stops the worker processes, which are started again on the next parallel job.
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns the derivation counters and throughput.
+
+        Returns:
+            dict: The number of jobs and derived addresses, the overall and last job
+                throughput in addresses per second, and the number of workers.
+        """
+        return {
+            "workers": self.workers,
+            "jobs": self.jobs,
+            "addresses": self.addresses,
+            "addresses_per_sec": self.addresses / self.seconds if self.seconds else 0.0,
+            "last_addresses_per_sec": self.last_throughput,
+        }
+
+    def _chunks(self, private_keys: List[str]) -> List[List[str]]:
+        # Aim for a few chunks per worker so uneven chunks still balance.
+        size = max(1, min(self.chunk_size, -(-len(private_keys) // (self.workers * 4))))
+        return [private_keys[i:i + size] for i in range(0, len(private_keys), size)]
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context(self.start_method),
+                )
+            return self._executor
+
+    def _record(self, count: int, seconds: float) -> None:
+        with self._lock:
+            self.jobs += 1
+            self.addresses += count
+            self.seconds += seconds
+            self.last_throughput = count / seconds if seconds else 0.0
+
+
+def derive_public_key_hash(private_key: str) -> bytes:
+    """
+    Derives the uncompressed secp256k1 public key of a private key and hashes it with
+    Keccak-256, the common ground of the Ethereum and Tron addresses.
+
+    Args:
+        private_key (str): The private key.
+
+    Returns:
+        bytes: The Keccak-256 digest of the public key.
+    """
+    from coincurve import PublicKey
+
+    public_key = PublicKey.from_valid_secret(private_key.encode()).format(
+        compressed=False)[1:]
+    return keccak_256(public_key).digest()
+
+
+def derive_ethereum_address(private_key: str) -> str:
+    """
+    Derives the Ethereum address of a private key.
+
+    Args:
+        private_key (str): The private key.
+
+    Returns:
+        str: The Ethereum address.
+    """
+    return "0x" + derive_public_key_hash(private_key)[-20:].hex()
+
+
+def derive_tron_address(private_key: str) -> str:
+    """
+    Derives the Tron address of a private key.
+
+    Args:
+        private_key (str): The private key.
+
+    Returns:
+        str: The Tron address.
+    """
+    return "41" + derive_public_key_hash(private_key)[-20:].hex()
+
+
+def derive_chunk(crypto_symbol: str, private_keys: List[str]) -> List[str]:
+    """
+    Derives the addresses of a chunk of private keys. Runs in the worker processes of
+    the DerivationEngine.
+
+    Args:
+        crypto_symbol (str): The cryptocurrency symbol, "ETH" or "TRO".
+        private_keys (List[str]): The private keys.
+
+    Returns:
+        List[str]: The address of each private key, in the same order.
+    """
+    derive_address = DERIVERS[crypto_symbol]
+    return [derive_address(private_key) for private_key in private_keys]
+
+
+DERIVERS = {"ETH": derive_ethereum_address, "TRO": derive_tron_address}
+
+derivation_engine = DerivationEngine()
@@ -0,0 +1,211 @@
+from abc import ABC, abstractmethod
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+class StorageBackend(ABC):
+    """
+    Interface of the address stores that db_connector dispatches to.
+    """
+
+    @abstractmethod
+    def persist_on_database(self, address: str, crypto: str) -> None:
+        """
+        Persists an address and cryptocurrency.
+
+        Args:
+            address (str): The address to persist.
+            crypto (str): The cryptocurrency associated with the address.
+        """
+
+    @abstractmethod
+    def persist_many_on_database(
+        self, addresses: List[str], crypto: str, ids: Optional[List[int]] = None
+    ) -> None:
+        """
+        Persists a batch of addresses of a cryptocurrency in one transaction.
+
+        Args:
+            addresses (List[str]): The addresses to persist.
+            crypto (str): The cryptocurrency associated with the addresses.
+            ids (List[int], optional): The IDs of the rows, greater than any stored
+                one. Defaults to None, for IDs assigned by the table.
+        """
+
+    @abstractmethod
+    def list_all_addresses(self) -> List[str]:
+        """
+        Lists all addresses.
+
+        Returns:
+            List[str]: A list of addresses stored in the database.
+        """
+
+    @abstractmethod
+    def list_addresses_page(self, after_id: int = 0, limit: int = 1000) -> List[Tuple[int, str]]:
+        """
+        Lists a page of addresses using keyset pagination on the ID.
+
+        Args:
+            after_id (int, optional): Only addresses with a greater ID are listed.
+                Defaults to 0.
+            limit (int, optional): The maximum number of addresses. Defaults to 1000.
+
+        Returns:
+            List[Tuple[int, str]]: The ID and address of each row, ordered by ID.
+        """
+
+    @abstractmethod
+    def iter_addresses(self, after_id: int = 0, chunk_size: int = 1000) -> Iterator[Tuple[int, str]]:
+        """
+        Streams the addresses in chunks, so memory stays flat with table size.
+
+        Args:
+            after_id (int, optional): Only addresses with a greater ID are listed.
+                Defaults to 0.
+            chunk_size (int, optional): Rows read per chunk. Defaults to 1000.
+
+        Yields:
+            Tuple[int, str]: The ID and address of each row, ordered by ID.
+        """
+
+    @abstractmethod
+    def iter_address_rows(
+        self, after_id: int = 0, chunk_size: int = 1000
+    ) -> Iterator[Tuple[int, str, str]]:
+        """
+        Streams the full rows in chunks, so memory stays flat with table size.
+
+        Args:
+            after_id (int, optional): Only rows with a greater ID are listed.
+                Defaults to 0.
+            chunk_size (int, optional): Rows read per chunk. Defaults to 1000.
+
+        Yields:
+            Tuple[int, str, str]: The ID, address and cryptocurrency of each row,
+                ordered by ID.
+        """
+
+    @abstractmethod
+    def recent_addresses(self, limit: int) -> List[Tuple[int, str]]:
+        """
+        Lists the most recently stored addresses.
+
+        Args:
+            limit (int): The maximum number of addresses.
+
+        Returns:
+            List[Tuple[int, str]]: The ID and address of each row, newest first.
+        """
+
+    @abstractmethod
+    def retrieve_address(self, id: int) -> str:
+        """
+        Retrieves an address based on the given ID.
+
+        Args:
+            id (int): The ID of the address.
+
+        Returns:
+            str: The retrieved address.
+        """
+
+    @abstractmethod
+    def find_address(self, address: str) -> Optional[Tuple[int, str]]:
+        """
+        Finds a stored address through the index on the address column.
+
+        Args:
+            address (str): The address.
+
+        Returns:
+            Tuple[int, str]: The ID and cryptocurrency of the address, or None if it is
+                not stored.
+        """
+
+    def find_address_on_primary(self, address: str) -> Optional[Tuple[int, str]]:
+        """
+        Finds a stored address as `find_address`, on the database taking the writes,
+        for checks that must not trust a lagging copy.
+
+        Args:
+            address (str): The address.
+
+        Returns:
+            Tuple[int, str]: The ID and cryptocurrency of the address, or None if it is
+                not stored.
+        """
+        return self.find_address(address)
+
+    @abstractmethod
+    def find_addresses(self, addresses: List[str]) -> Dict[str, Tuple[int, str]]:
+        """
+        Finds many stored addresses in a single set-based query, through the index on
+        the address column.
+
+        Args:
+            addresses (List[str]): The addresses.
+
+        Returns:
+            Dict[str, Tuple[int, str]]: The ID and cryptocurrency of each stored
+                address.
+        """
+
+    @abstractmethod
+    def table_state(self) -> Tuple[int, int]:
+        """
+        Returns the largest ID and the number of rows of the address table, which
+        change on every insert.
+
+        Returns:
+            Tuple[int, int]: The largest ID, 0 when empty, and the row count.
+        """
+
+    def max_id(self) -> int:
+        """
+        Returns the largest ID of the address table, a cheaper probe than
+        `table_state` where counting the rows scans the table.
+
+        Returns:
+            int: The largest ID, 0 when empty.
+        """
+        return self.table_state()[0]
+
+    @abstractmethod
+    def reserve_child_indexes(self, crypto: str, count: int) -> int:
+        """
+        Atomically reserves consecutive HD child indexes of a cryptocurrency on the
+        shared counter of the hd_child_index table.
+
+        Args:
+            crypto (str): The cryptocurrency symbol.
+            count (int): The number of indexes.
+
+        Returns:
+            int: The first reserved index.
+        """
+
+    @abstractmethod
+    def pool_stats(self) -> Dict[str, int]:
+        """
+        Returns the connection gauges and counters of the backend.
+
+        Returns:
+            dict: The backend statistics.
+        """
+
+
+def flatten_list(original_list: List[List]) -> List:
+    """
+    Flatten a list of lists by extracting the first element from each sublist.
+
+    Args:
+        original_list (List[List]): The original list of lists.
+
+    Returns:
+        List: The flattened list containing the first element from each sublist.
+    """
+    flat_list = []
+    for element in original_list:
+        flat_list.append(element[0])
+
+    return flat_list
@@ -1,15 +1,140 @@
 import os
-from dotenv import load_dotenv
-from db_mysql import DbCursor
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+from db_backend import StorageBackend
+from settings import load_settings
 
-load_dotenv()
+load_settings()
 
-cursor = DbCursor(
-    host=os.environ.get("DB_HOST"),
-    user=os.environ.get("DB_USER"),
-    password=os.environ.get("DB_PASSWORD"),
-    database=os.environ.get("DB_NAME"),
-)
+LIST_CHUNK_SIZE = int(os.environ.get("LIST_CHUNK_SIZE", 1000))
+DB_BACKEND = os.environ.get("DB_BACKEND", "mysql")
+
+
+def create_backend(
+    backend: str = DB_BACKEND,
+    shards: Optional[List[str]] = None,
+    replicas: Optional[List[str]] = None,
+) -> StorageBackend:
+    """
+    Creates the storage backend selected by DB_BACKEND, sharded over the databases
+    listed in DB_SHARDS if any, or reading from the replicas listed in DB_REPLICAS
+    if any.
+
+    Args:
+        backend (str, optional): "mysql" for the MySQL server configured by the DB_*
+            variables, or "sqlite" for the embedded database at SQLITE_PATH.
+            Defaults to DB_BACKEND.
+        shards (List[str], optional): The database of each shard, a "host" or
+            "host/database" on MySQL and a file path on SQLite. Defaults to DB_SHARDS.
+        replicas (List[str], optional): The database of each read replica of the
+            primary, given as the shards. Defaults to DB_REPLICAS.
+
+    Returns:
+        StorageBackend: The storage backend.
+
+    Raises:
+        ValueError: If the backend is unknown, or both shards and replicas are given.
+    """
+    if shards is None:
+        shards = _locations("DB_SHARDS")
+    if replicas is None:
+        replicas = _locations("DB_REPLICAS")
+    if shards and replicas:
+        raise ValueError("Read replicas of sharded databases are not supported")
+    if shards:
+        from db_sharded import ShardedBackend
+
+        return ShardedBackend([create_single_backend(backend, shard) for shard in shards])
+    if replicas:
+        from db_replicated import ReplicatedBackend
+
+        return ReplicatedBackend(
+            create_single_backend(backend),
+            [create_single_backend(backend, replica) for replica in replicas],
+        )
+    return create_single_backend(backend)
+
+
+def _locations(name: str) -> List[str]:
+    # Comma-separated database locations of an environment variable.
+    locations = [location.strip() for location in os.environ.get(name, "").split(",")]
+    return [location for location in locations if location]
+
+
+def create_single_backend(
+    backend: str = DB_BACKEND, location: Optional[str] = None
+) -> StorageBackend:
+    """
+    Creates an unsharded storage backend.
+
+    Args:
+        backend (str, optional): "mysql" or "sqlite". Defaults to DB_BACKEND.
+        location (str, optional): The "host" or "host/database" on MySQL, and the file
+            path on SQLite. Defaults to DB_HOST and DB_NAME, or SQLITE_PATH.
+
+    Returns:
+        StorageBackend: The storage backend.
+
+    Raises:
+        ValueError: If the backend is unknown.
+    """
+    # Each backend module is imported only when selected.
+    if backend == "mysql":
+        from db_mysql import DbCursor
+
+        host, database = os.environ.get("DB_HOST"), os.environ.get("DB_NAME")
+        if location:
+            host, _, name = location.partition("/")
+            database = name or database
+        return DbCursor(
+            host=host,
+            user=os.environ.get("DB_USER"),
+            password=os.environ.get("DB_PASSWORD"),
+            database=database,
+            pool_size=int(os.environ.get("DB_POOL_SIZE", 5)),
+            pool_timeout=float(os.environ.get("DB_POOL_TIMEOUT", 10)),
+        )
+    if backend == "sqlite":
+        from db_sqlite import SqliteCursor
+
+        return SqliteCursor(location or os.environ.get("SQLITE_PATH", "blockchain.db"))
+    raise ValueError(f"Invalid storage backend: {backend}")
+
+
+cursor: Optional[StorageBackend] = None
+_cursor_lock = threading.Lock()
+# Backends inherited across a fork, kept referenced so that collecting them never
+# closes the connections, which the parent process still uses.
+_inherited: List[StorageBackend] = []
+
+
+def _reset_after_fork() -> None:
+    # A forked process must not share the sockets and SQLite handles of its parent,
+    # so it creates its own backend on first use.
+    global cursor, _cursor_lock
+    if cursor is not None:
+        _inherited.append(cursor)
+    cursor = None
+    _cursor_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_cursor() -> StorageBackend:
+    """
+    Returns the storage backend, created on first use so that importing this module
+    does no I/O and the process can start while the database is unavailable.
+
+    Returns:
+        StorageBackend: The storage backend.
+    """
+    global cursor
+    if cursor is None:
+        with _cursor_lock:
+            if cursor is None:
+                cursor = create_backend()
+    return cursor
 
 
 def persist_address_on_db(address: str, crypto_currency: str) -> str:
@@ -23,7 +148,18 @@ def persist_address_on_db(address: str, crypto_currency: str) -> str:
     Returns:
         str: The success message indicating if the address was successfully persisted or not.
     """
-    cursor.persist_on_database(address, crypto_currency)
+    get_cursor().persist_on_database(address, crypto_currency)
+
+
+def persist_addresses_on_db(addresses: List[str], crypto_currency: str) -> None:
+    """
+    Persists a batch of addresses on the database in a single transaction.
+
+    Args:
+        addresses (List[str]): The addresses to persist.
+        crypto_currency (str): The cryptocurrency associated with the addresses.
+    """
+    get_cursor().persist_many_on_database(addresses, crypto_currency)
 
 
 def list_addresses_from_db() -> list:
@@ -33,10 +169,67 @@ def list_addresses_from_db() -> list:
     Returns:
         list: A list of addresses stored in the database.
     """
-    addresses = cursor.list_all_addresses()
+    addresses = get_cursor().list_all_addresses()
     return addresses
 
 
+def list_addresses_page_from_db(after_id: int, limit: int) -> List[Tuple[int, str]]:
+    """
+    Lists a page of addresses from the database, ordered by ID.
+
+    Args:
+        after_id (int): Only addresses with a greater ID are listed.
+        limit (int): The maximum number of addresses.
+
+    Returns:
+        List[Tuple[int, str]]: The ID and address of each row.
+    """
+    return get_cursor().list_addresses_page(after_id, limit)
+
+
+def stream_addresses_from_db(after_id: int = 0) -> Iterator[Tuple[int, str]]:
+    """
+    Streams the addresses from the database in chunks, ordered by ID.
+
+    Args:
+        after_id (int, optional): Only addresses with a greater ID are listed.
+            Defaults to 0.
+
+    Returns:
+        Iterator[Tuple[int, str]]: The ID and address of each row.
+    """
+    return get_cursor().iter_addresses(after_id, LIST_CHUNK_SIZE)
+
+
+def stream_address_rows_from_db(
+    after_id: int = 0, chunk_size: int = LIST_CHUNK_SIZE
+) -> Iterator[Tuple[int, str, str]]:
+    """
+    Streams the full rows of the addresses from the database in chunks, ordered by ID.
+
+    Args:
+        after_id (int, optional): Only rows with a greater ID are listed. Defaults to 0.
+        chunk_size (int, optional): Rows read per chunk. Defaults to LIST_CHUNK_SIZE.
+
+    Returns:
+        Iterator[Tuple[int, str, str]]: The ID, address and cryptocurrency of each row.
+    """
+    return get_cursor().iter_address_rows(after_id, chunk_size)
+
+
+def recent_addresses_from_db(limit: int) -> List[Tuple[int, str]]:
+    """
+    Lists the most recently stored addresses.
+
+    Args:
+        limit (int): The maximum number of addresses.
+
+    Returns:
+        List[Tuple[int, str]]: The ID and address of each row, newest first.
+    """
+    return get_cursor().recent_addresses(limit)
+
+
 def retrieve_address_from_id(id: int) -> str:
     """
     Retrieves an address from the database based on the given ID.
@@ -47,5 +240,80 @@ def retrieve_address_from_id(id: int) -> str:
     Returns:
         str: The retrieved address.
     """
-    address = cursor.retrieve_address(id)
-    return address
\ No newline at end of file
+    address = get_cursor().retrieve_address(id)
+    return address
+
+
+def find_address_in_db(address: str) -> Optional[Tuple[int, str]]:
+    """
+    Finds a stored address by value.
+
+    Args:
+        address (str): The address.
+
+    Returns:
+        Tuple[int, str]: The ID and cryptocurrency of the address, or None if it is not
+            stored.
+    """
+    return get_cursor().find_address(address)
+
+
+def find_address_in_primary_db(address: str) -> Optional[Tuple[int, str]]:
+    """
+    Finds a stored address by value on the primary database, never on a replica.
+
+    Args:
+        address (str): The address.
+
+    Returns:
+        Tuple[int, str]: The ID and cryptocurrency of the address, or None if it is not
+            stored.
+    """
+    return get_cursor().find_address_on_primary(address)
+
+
+def find_addresses_in_db(addresses: List[str]) -> Dict[str, Tuple[int, str]]:
+    """
+    Finds many stored addresses by value, in a single query.
+
+    Args:
+        addresses (List[str]): The addresses.
+
+    Returns:
+        Dict[str, Tuple[int, str]]: The ID and cryptocurrency of each stored address.
+    """
+    return get_cursor().find_addresses(addresses)
+
+
+def table_state_from_db() -> Tuple[int, int]:
+    """
+    Returns the largest ID and the number of rows of the address table.
+
+    Returns:
+        Tuple[int, int]: The largest ID, 0 when empty, and the row count.
+    """
+    return get_cursor().table_state()
+
+
+def reserve_child_indexes_on_db(crypto_currency: str, count: int) -> int:
+    """
+    Reserves consecutive HD child indexes of a cryptocurrency.
+
+    Args:
+        crypto_currency (str): The cryptocurrency symbol.
+        count (int): The number of indexes.
+
+    Returns:
+        int: The first reserved index.
+    """
+    return get_cursor().reserve_child_indexes(crypto_currency, count)
+
+
+def pool_stats() -> dict:
+    """
+    Returns the gauges and counters of the database connection pool.
+
+    Returns:
+        dict: The pool statistics.
+    """
+    return get_cursor().pool_stats()
@@ -1,37 +1,229 @@
+import time
+import threading
 import mysql.connector
-from typing import List
-from dotenv import load_dotenv
+from contextlib import closing, contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from db_backend import StorageBackend, flatten_list
 
-load_dotenv()
 
+class PoolTimeoutError(Exception):
+    """
+    Raised when no connection becomes available within the pool wait timeout.
+    """
 
-class DbCursor:
-    def __init__(self, host: str, user: str, password: str, database: str) -> None:
+
+class ConnectionPool:
+    def __init__(
+        self,
+        factory: Callable[[], Any],
+        size: int = 5,
+        timeout: float = 10.0,
+        validate: Optional[Callable[[Any], bool]] = None,
+    ) -> None:
         """
-        Initializes a DbCursor object.
+        Initializes a bounded pool of database connections. Connections are opened on
+        demand, so creating the pool performs no I/O.
 
         Args:
-            host (str): The host of the database.
-            user (str): The username for database authentication.
-            password (str): The password for database authentication.
-            database (str): The name of the database.
+            factory (Callable): Function opening a new connection.
+            size (int, optional): Maximum number of open connections. Defaults to 5.
+            timeout (float, optional): Seconds to wait for a free connection before
+                raising PoolTimeoutError. Defaults to 10.0.
+            validate (Callable, optional): Health check run on every borrowed
+                connection. Defaults to the connection `is_connected` method.
         """
-        self.connect(host, user, password, database)
+        self.factory = factory
+        self.size = size
+        self.timeout = timeout
+        self.validate = validate or (lambda connection: connection.is_connected())
+        self.created = 0
+        self.in_use = 0
+        self.reconnects = 0
+        self.waits = 0
+        self.timeouts = 0
+        self._idle: List[Any] = []
+        self._condition = threading.Condition()
+
+    def acquire(self) -> Any:
+        """
+        Borrows a healthy connection from the pool, opening one if the pool is not
+        full and waiting for a release otherwise.
+
+        Returns:
+            Any: The borrowed connection.
+
+        Raises:
+            PoolTimeoutError: If no connection is released within the wait timeout.
+        """
+        deadline = time.monotonic() + self.timeout
+        with self._condition:
+            while not self._idle and self.created >= self.size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise PoolTimeoutError(
+                        f"No database connection available after {self.timeout}s"
+                    )
+                self.waits += 1
+                self._condition.wait(remaining)
+            connection = self._idle.pop() if self._idle else None
+            if connection is None:
+                self.created += 1
+            self.in_use += 1
+
+        try:
+            if connection is None:
+                connection = self.factory()
+            elif not self._is_healthy(connection):
+                self._close(connection)
+                connection = self.factory()
+                self.reconnects += 1
+        except Exception:
+            with self._condition:
+                self.created -= 1
+                self.in_use -= 1
+                self._condition.notify()
+            raise
+        return connection
 
-    def connect(self, host: str, user: str, password: str, database: str) -> None:
+    def release(self, connection: Any, discard: bool = False) -> None:
         """
-        Connects to the database.
+        Returns a borrowed connection to the pool.
+
+        Args:
+            connection (Any): The borrowed connection.
+            discard (bool, optional): Whether to close the connection instead of
+                keeping it idle. Defaults to False.
+        """
+        if discard:
+            self._close(connection)
+        with self._condition:
+            self.in_use -= 1
+            if discard:
+                self.created -= 1
+            else:
+                self._idle.append(connection)
+            self._condition.notify()
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        """
+        Borrows a connection for the duration of a `with` block. A block raising an
+        error rolls back, and the connection is discarded if the rollback fails.
+
+        Yields:
+            Any: The borrowed connection.
+        """
+        connection = self.acquire()
+        discard = False
+        try:
+            yield connection
+        except Exception:
+            try:
+                connection.rollback()
+            except Exception:
+                discard = True
+            raise
+        finally:
+            self.release(connection, discard)
+
+    def close(self) -> None:
+        """
+        Closes every idle connection.
+        """
+        with self._condition:
+            idle, self._idle = self._idle, []
+            self.created -= len(idle)
+        for connection in idle:
+            self._close(connection)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the pool gauges and counters.
+
+        Returns:
+            dict: The pool size, the in-use, idle and open connection gauges, and the
+                reconnect, wait and timeout counters.
+        """
+        with self._condition:
+            return {
+                "size": self.size,
+                "in_use": self.in_use,
+                "idle": len(self._idle),
+                "open": self.created,
+                "reconnects": self.reconnects,
+                "waits": self.waits,
+                "timeouts": self.timeouts,
+            }
+
+    def _is_healthy(self, connection: Any) -> bool:
+        try:
+            return bool(self.validate(connection))
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close(connection: Any) -> None:
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
+class DbCursor(StorageBackend):
+    def __init__(
+        self,
+        host: str,
+        user: str,
+        password: str,
+        database: str,
+        pool_size: int = 5,
+        pool_timeout: float = 10.0,
+    ) -> None:
+        """
+        Initializes a DbCursor object.
 
         Args:
             host (str): The host of the database.
             user (str): The username for database authentication.
             password (str): The password for database authentication.
             database (str): The name of the database.
+            pool_size (int, optional): Maximum number of open connections. Defaults to 5.
+            pool_timeout (float, optional): Seconds to wait for a free connection.
+                Defaults to 10.0.
         """
-        self.mydb = mysql.connector.connect(
-            host=host, user=user, password=password, database=database
+        self.host = host
+        self.user = user
+        self.password = password
+        self.database = database
+        self.pool = ConnectionPool(self.connect, size=pool_size, timeout=pool_timeout)
+
+    def connect(self) -> Any:
+        """
+        Opens a new connection to the database, in autocommit mode. Pooled connections
+        outlive the requests, so a read left in an open REPEATABLE READ transaction
+        would keep its snapshot and never see the rows committed since. Every write is
+        a single statement, atomic on its own.
+
+        Returns:
+            Any: The database connection.
+        """
+        return mysql.connector.connect(
+            host=self.host,
+            user=self.user,
+            password=self.password,
+            database=self.database,
+            autocommit=True,
         )
-        self.cursor = self.mydb.cursor()
+
+    def connection(self):
+        """
+        Borrows a pooled connection for the duration of a `with` block.
+
+        Returns:
+            ContextManager: Context manager yielding the borrowed connection.
+        """
+        return self.pool.connection()
 
     def persist_on_database(self, address: str, crypto: str) -> None:
         """
@@ -43,8 +235,39 @@ class DbCursor:
         """
         query = "INSERT INTO crypto_address (address, crypto_currency) "
         query += f"VALUES ('{address}','{crypto}')"
-        self.cursor.execute(query)
-        self.mydb.commit()
+        with self.connection() as mydb, closing(mydb.cursor()) as cursor:
+            cursor.execute(query)
+            mydb.commit()
+
+    def persist_many_on_database(
+        self, addresses: List[str], crypto: str, ids: Optional[List[int]] = None
+    ) -> None:
+        """
+        Persists a batch of addresses of a cryptocurrency with a single multi-row
+        insert, committed in one transaction.
+
+        Args:
+            addresses (List[str]): The addresses to persist.
+            crypto (str): The cryptocurrency associated with the addresses.
+            ids (List[int], optional): The IDs of the rows. Defaults to None, for
+                AUTO_INCREMENT IDs.
+        """
+        if not addresses:
+            return
+        params = []
+        if ids is None:
+            query = "INSERT INTO crypto_address (address, crypto_currency) VALUES "
+            query += ", ".join(["(%s, %s)"] * len(addresses))
+            for address in addresses:
+                params.extend((address, crypto))
+        else:
+            query = "INSERT INTO crypto_address (id, address, crypto_currency) VALUES "
+            query += ", ".join(["(%s, %s, %s)"] * len(addresses))
+            for id, address in zip(ids, addresses):
+                params.extend((id, address, crypto))
+        with self.connection() as mydb, closing(mydb.cursor()) as cursor:
+            cursor.execute(query, params)
+            mydb.commit()
 
     def list_all_addresses(self) -> List[str]:
         """
@@ -54,11 +277,102 @@ class DbCursor:
             List[str]: A list of addresses stored in the database.
         """
         query = "SELECT address FROM crypto_address "
-        self.cursor.execute(query)
-        response = self.cursor.fetchall()
+        with self.connection() as mydb, closing(mydb.cursor()) as cursor:
+            cursor.execute(query)
+            response = cursor.fetchall()
         if response:
             return flatten_list(response)
 
+    def list_addresses_page(self, after_id: int = 0, limit: int = 1000) -> List[Tuple[int, str]]:
+        """
+        Lists a page of addresses using keyset pagination on the ID, so every page
+        costs an index range scan regardless of its position in the table.
+
+        Args:
+            after_id (int, optional): Only addresses with a greater ID are listed.
+                Defaults to 0.
+            limit (int, optional): The maximum number of addresses. Defaults to 1000.
+
+        Returns:
+            List[Tuple[int, str]]: The ID and address of each row, ordered by ID.
+        """
+        query = "SELECT id, address FROM crypto_address "
+        query += "WHERE id > %s ORDER BY id LIMIT %s"
+        with self.connection() as mydb, closing(mydb.cursor()) as cursor:
+            cursor.execute(query, (after_id, limit))
+            return [tuple(row) for row in cursor.fetchall()]
+
+    def iter_addresses(self, after_id: int = 0, chunk_size: int = 1000) -> Iterator[Tuple[int, str]]:
+        """
+        Streams the addresses through an unbuffered cursor, reading the rows from the
+        server in chunks as they are consumed, so memory stays flat with table size.
+
+        The connection is held until the iterator is exhausted. An iterator closed
+        before that leaves unread rows on the connection, which is then discarded.
+
+        Args:
+            after_id (int, optional): Only addresses with a greater ID are listed.
+                Defaults to 0.
+            chunk_size (int, optional): Rows fetched per read. Defaults to 1000.
+
+        Yields:
+            Tuple[int, str]: The ID and address of each row, ordered by ID.
+        """
+        query = "SELECT id, address FROM crypto_address "
+        query += "WHERE id > %s ORDER BY id"
+        return self._stream(query, (after_id,), chunk_size)
+
+    def iter_address_rows(
+        self, after_id: int = 0, chunk_size: int = 1000
+    ) -> Iterator[Tuple[int, str, str]]:
+        """
+        Streams the full rows through an unbuffered cursor, as `iter_addresses`.
+
+        Args:
+            after_id (int, optional): Only rows with a greater ID are listed.
+                Defaults to 0.
+            chunk_size (int, optional): Rows fetched per read. Defaults to 1000.
+
+        Yields:
+            Tuple[int, str, str]: The ID, address and cryptocurrency of each row,
+                ordered by ID.
+        """
+        query = "SELECT id, address, crypto_currency FROM crypto_address "
+        query += "WHERE id > %s ORDER BY id"
+        return self._stream(query, (after_id,), chunk_size)
+
+    def _stream(self, query: str, params: tuple, chunk_size: int) -> Iterator[tuple]:
+        mydb = self.pool.acquire()
+        discard = True
+        try:
+            cursor = mydb.cursor()
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield tuple(row)
+            cursor.close()
+            discard = False
+        finally:
+            self.pool.release(mydb, discard)
+
+    def recent_addresses(self, limit: int) -> List[Tuple[int, str]]:
+        """
+        Lists the most recently stored addresses.
+
+        Args:
+            limit (int): The maximum number of addresses.
+
+        Returns:
+            List[Tuple[int, str]]: The ID and address of each row, newest first.
+        """
+        query = "SELECT id, address FROM crypto_address ORDER BY id DESC LIMIT %s"
+        with self.connection() as mydb, closing(mydb.cursor()) as cursor:
+            cursor.execute(query, (limit,))
+            return [tuple(row) for row in cursor.fetchall()]
+
     def retrieve_address(self, id: int) -> str:
         """
         Retrieves an address from the database based on the given ID.
@@ -71,24 +385,110 @@ class DbCursor:
         """
         query = "SELECT address FROM crypto_address "
         query += f"WHERE id = {id}"
-        self.cursor.execute(query)
-        response = self.cursor.fetchall()
+        with self.connection() as mydb, closing(mydb.cursor()) as cursor:
+            cursor.execute(query)
+            response = cursor.fetchall()
         if response:
             return response[0][0]
 
+    def find_address(self, address: str) -> Optional[Tuple[int, str]]:
+        """
+        Finds a stored address through the `idx_crypto_address_address` index on the
+        address column.
 
-def flatten_list(original_list: List[List]) -> List:
-    """
-    Flatten a list of lists by extracting the first element from each sublist.
+        Args:
+            address (str): The address.
 
-    Args:
-        original_list (List[List]): The original list of lists.
+        Returns:
+            Tuple[int, str]: The ID and cryptocurrency of the address, or None if it is
+                not stored.
+        """
+        query = "SELECT id, crypto_currency FROM crypto_address WHERE address = %s LIMIT 1"
+        with self.connection() as mydb, closing(mydb.cursor()) as cursor:
+            cursor.execute(query, (address,))
+            response = cursor.fetchall()
+        if response:
+            return tuple(response[0])
 
-    Returns:
-        List: The flattened list containing the first element from each sublist.
-    """
-    flat_list = []
-    for element in original_list:
-        flat_list.append(element[0])
+    def find_addresses(self, addresses: List[str]) -> Dict[str, Tuple[int, str]]:
+        """
+        Finds many stored addresses in a single set-based query, through the index on
+        the address column.
+
+        Args:
+            addresses (List[str]): The addresses.
+
+        Returns:
+            Dict[str, Tuple[int, str]]: The ID and cryptocurrency of each stored
+                address.
+        """
+        if not addresses:
+            return {}
+        placeholders = ", ".join(["%s"] * len(addresses))
+        query = (
+            "SELECT id, address, crypto_currency FROM crypto_address "
+            f"WHERE address IN ({placeholders})"
+        )
+        with self.connection() as mydb, closing(mydb.cursor()) as cursor:
+            cursor.execute(query, tuple(addresses))
+            response = cursor.fetchall()
+        return {address: (id, crypto) for id, address, crypto in response}
+
+    def table_state(self) -> Tuple[int, int]:
+        """
+        Returns the largest ID and the number of rows of the address table, which
+        change on every insert.
+
+        Returns:
+            Tuple[int, int]: The largest ID, 0 when empty, and the row count.
+        """
+        query = "SELECT COALESCE(MAX(id), 0), COUNT(*) FROM crypto_address"
+        with self.connection() as mydb, closing(mydb.cursor()) as cursor:
+            cursor.execute(query)
+            response = cursor.fetchall()
+        return int(response[0][0]), int(response[0][1])
+
+    def max_id(self) -> int:
+        """
+        Returns the largest ID of the address table, read from the end of the primary
+        key index.
 
-    return flat_list
+        Returns:
+            int: The largest ID, 0 when empty.
+        """
+        query = "SELECT COALESCE(MAX(id), 0) FROM crypto_address"
+        with self.connection() as mydb, closing(mydb.cursor()) as cursor:
+            cursor.execute(query)
+            response = cursor.fetchall()
+        return int(response[0][0])
+
+    def reserve_child_indexes(self, crypto: str, count: int) -> int:
+        """
+        Atomically reserves consecutive HD child indexes of a cryptocurrency, with a
+        single upsert which leaves the new counter value in LAST_INSERT_ID().
+
+        Args:
+            crypto (str): The cryptocurrency symbol.
+            count (int): The number of indexes.
+
+        Returns:
+            int: The first reserved index.
+        """
+        query = "INSERT INTO hd_child_index (crypto_currency, next_index) "
+        query += "VALUES (%s, LAST_INSERT_ID(%s)) "
+        query += "ON DUPLICATE KEY UPDATE next_index = LAST_INSERT_ID(next_index + %s)"
+        with self.connection() as mydb, closing(mydb.cursor()) as cursor:
+            cursor.execute(query, (crypto, count, count))
+            cursor.execute("SELECT LAST_INSERT_ID()")
+            next_index = cursor.fetchone()[0]
+            mydb.commit()
+        return next_index - count
+
+    def pool_stats(self) -> Dict[str, int]:
+        """
+        Returns the connection pool gauges and counters.
+
+        Returns:
+            dict: The pool statistics.
+        """
+        return self.pool.stats()
@@ -0,0 +1,425 @@
+import os
+import time
+import logging
+import itertools
+import threading
+from collections import deque
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Tuple, TypeVar
+import metrics
+from db_backend import StorageBackend
+from settings import load_settings
+
+load_settings()
+
+logger = logging.getLogger()
+
+DB_REPLICA_MAX_LAG = float(os.environ.get("DB_REPLICA_MAX_LAG", 5))
+DB_REPLICA_CHECK_INTERVAL = float(os.environ.get("DB_REPLICA_CHECK_INTERVAL", 1))
+
+T = TypeVar("T")
+
+
+class ReplicatedBackend(StorageBackend):
+    def __init__(
+        self,
+        primary: StorageBackend,
+        replicas: List[StorageBackend],
+        max_lag: float = DB_REPLICA_MAX_LAG,
+        check_interval: float = DB_REPLICA_CHECK_INTERVAL,
+    ) -> None:
+        """
+        Initializes a ReplicatedBackend object, which sends the writes to a primary
+        database and spreads the reads over its read replicas, so that heavy read
+        traffic does not slow the inserts down.
+
+        The progress of each replica is checked at most every `check_interval` seconds,
+        from the read path, by comparing its largest ID with those the primary had at
+        the previous checks. Reads skip the replicas lagging more than `max_lag`
+        seconds or failing, and fall back to the primary when none is left. An ID the
+        replica has not reached yet, such as the one just created, is read from the
+        primary, and so are the addresses a replica misses, the table state and the
+        list pages shortly after a write of the process. The latency of every query
+        is recorded per target.
+
+        Args:
+            primary (StorageBackend): The primary database.
+            replicas (List[StorageBackend]): The read replicas of the primary, which
+                replicate its IDs.
+            max_lag (float, optional): Seconds a replica may lag before reads skip it.
+                Defaults to DB_REPLICA_MAX_LAG.
+            check_interval (float, optional): Seconds between checks of the replicas.
+                Defaults to DB_REPLICA_CHECK_INTERVAL.
+        """
+        self.primary = primary
+        self.replicas = replicas
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.fallbacks = 0
+        self.primary_reads = 0
+        self.names = [f"replica_{index}" for index in range(len(replicas))]
+        self.replica_max_ids = [0] * len(replicas)
+        self.replica_lags = [float("inf")] * len(replicas)
+        self.replica_healthy = [False] * len(replicas)
+        self.checked_at: Optional[float] = None
+        self.last_write: Optional[float] = None
+        self._history: Deque[Tuple[float, int]] = deque()
+        self._latencies: Dict[str, List[float]] = {
+            name: [0, 0, 0.0, 0.0] for name in ["primary"] + self.names
+        }
+        self._next = itertools.count()
+        self._lock = threading.Lock()
+        self._check_lock = threading.Lock()
+
+    def check_replicas(self) -> None:
+        """
+        Measures the lag of each replica: the time since the primary first held a row
+        the replica does not have yet, or 0 if it has them all. A replica that fails
+        the check is skipped until the next one. If the primary fails, the previous
+        lags are kept until the next check, so that reads carry on. Only the largest
+        ID of each database is read.
+        """
+        try:
+            primary_max = self._timed("primary", "max_id", self.primary.max_id)
+        except Exception as error:
+            logger.warning(f"Replica check failed on the primary: {error}")
+            self.checked_at = time.monotonic()
+            return
+        now = time.monotonic()
+        self._history.append((now, primary_max))
+        # One state at least `max_lag` seconds old is kept, enough to tell a replica
+        # lagging more than that.
+        while len(self._history) > 1 and self._history[1][0] <= now - self.max_lag:
+            self._history.popleft()
+        for index, replica in enumerate(self.replicas):
+            try:
+                replica_max = self._timed(self.names[index], "max_id", replica.max_id)
+            except Exception:
+                self.replica_healthy[index] = False
+                continue
+            lag = 0.0
+            for checked_at, state in self._history:
+                if state > replica_max:
+                    lag = now - checked_at
+                    break
+            self.replica_max_ids[index] = replica_max
+            self.replica_lags[index] = lag
+            self.replica_healthy[index] = True
+        self.checked_at = now
+
+    def check_if_due(self) -> None:
+        """
+        Checks the replicas if never checked, or not for `check_interval` seconds. A
+        single thread checks, the others carry on with the previous results.
+        """
+        if self.checked_at is not None and time.monotonic() - self.checked_at < self.check_interval:
+            return
+        if not self._check_lock.acquire(blocking=False):
+            return
+        try:
+            self.check_replicas()
+        finally:
+            self._check_lock.release()
+
+    def persist_on_database(self, address: str, crypto: str) -> None:
+        """
+        Persists an address and cryptocurrency on the primary.
+
+        Args:
+            address (str): The address to persist.
+            crypto (str): The cryptocurrency associated with the address.
+        """
+        self._write("persist", lambda: self.primary.persist_on_database(address, crypto))
+
+    def persist_many_on_database(
+        self, addresses: List[str], crypto: str, ids: Optional[List[int]] = None
+    ) -> None:
+        """
+        Persists a batch of addresses of a cryptocurrency on the primary, in one
+        transaction.
+
+        Args:
+            addresses (List[str]): The addresses to persist.
+            crypto (str): The cryptocurrency associated with the addresses.
+            ids (List[int], optional): The IDs of the rows. Defaults to None, for IDs
+                assigned by the table.
+        """
+        self._write(
+            "persist_many", lambda: self.primary.persist_many_on_database(addresses, crypto, ids)
+        )
+
+    def list_all_addresses(self) -> List[str]:
+        """
+        Lists all addresses from a replica.
+
+        Returns:
+            List[str]: A list of addresses stored in the database.
+        """
+        return self._read("list_all", lambda backend: backend.list_all_addresses())
+
+    def list_addresses_page(self, after_id: int = 0, limit: int = 1000) -> List[Tuple[int, str]]:
+        """
+        Lists a page of addresses from a replica, using keyset pagination on the ID,
+        or from the primary shortly after a write of the process, as `table_state`.
+
+        Args:
+            after_id (int, optional): Only addresses with a greater ID are listed.
+                Defaults to 0.
+            limit (int, optional): The maximum number of addresses. Defaults to 1000.
+
+        Returns:
+            List[Tuple[int, str]]: The ID and address of each row, ordered by ID.
+        """
+        return self._read(
+            "list_page",
+            lambda backend: backend.list_addresses_page(after_id, limit),
+            self._pick_after_write(),
+        )
+
+    def iter_addresses(self, after_id: int = 0, chunk_size: int = 1000) -> Iterator[Tuple[int, str]]:
+        """
+        Streams the addresses from a replica in chunks. Streams are routed, but not
+        timed.
+
+        Args:
+            after_id (int, optional): Only addresses with a greater ID are listed.
+                Defaults to 0.
+            chunk_size (int, optional): Rows read per chunk. Defaults to 1000.
+
+        Yields:
+            Tuple[int, str]: The ID and address of each row, ordered by ID.
+        """
+        return self._target()[1].iter_addresses(after_id, chunk_size)
+
+    def iter_address_rows(
+        self, after_id: int = 0, chunk_size: int = 1000
+    ) -> Iterator[Tuple[int, str, str]]:
+        """
+        Streams the full rows from a replica in chunks, as `iter_addresses`.
+
+        Args:
+            after_id (int, optional): Only rows with a greater ID are listed.
+                Defaults to 0.
+            chunk_size (int, optional): Rows read per chunk. Defaults to 1000.
+
+        Yields:
+            Tuple[int, str, str]: The ID, address and cryptocurrency of each row,
+                ordered by ID.
+        """
+        return self._target()[1].iter_address_rows(after_id, chunk_size)
+
+    def recent_addresses(self, limit: int) -> List[Tuple[int, str]]:
+        """
+        Lists the most recently stored addresses from a replica.
+
+        Args:
+            limit (int): The maximum number of addresses.
+
+        Returns:
+            List[Tuple[int, str]]: The ID and address of each row, newest first.
+        """
+        return self._read("recent", lambda backend: backend.recent_addresses(limit))
+
+    def retrieve_address(self, id: int) -> str:
+        """
+        Retrieves an address by ID, from a replica that is known to have reached the
+        ID, and from the primary otherwise.
+
+        Args:
+            id (int): The ID of the address.
+
+        Returns:
+            str: The retrieved address.
+        """
+        index = self._pick()
+        if index is not None and id > self.replica_max_ids[index]:
+            index = None
+            with self._lock:
+                self.primary_reads += 1
+        return self._read("retrieve", lambda backend: backend.retrieve_address(id), index)
+
+    def find_address(self, address: str) -> Optional[Tuple[int, str]]:
+        """
+        Finds a stored address on a replica, and on the primary if the replica misses
+        it shortly after a write of the process.
+
+        Args:
+            address (str): The address.
+
+        Returns:
+            Tuple[int, str]: The ID and cryptocurrency of the address, or None if it is
+                not stored.
+        """
+        return self.find_addresses([address]).get(address)
+
+    def find_address_on_primary(self, address: str) -> Optional[Tuple[int, str]]:
+        """
+        Finds a stored address on the primary, which holds every committed row.
+
+        Args:
+            address (str): The address.
+
+        Returns:
+            Tuple[int, str]: The ID and cryptocurrency of the address, or None if it is
+                not stored.
+        """
+        return self._read("find", lambda backend: backend.find_address(address), None)
+
+    def find_addresses(self, addresses: List[str]) -> Dict[str, Tuple[int, str]]:
+        """
+        Finds many stored addresses on a replica in a single query. Shortly after a
+        write of the process, the addresses the replica misses are looked up on the
+        primary.
+
+        Args:
+            addresses (List[str]): The addresses.
+
+        Returns:
+            Dict[str, Tuple[int, str]]: The ID and cryptocurrency of each stored
+                address.
+        """
+        index = self._pick()
+        found = self._read("find", lambda backend: backend.find_addresses(addresses), index)
+        missing = [address for address in addresses if address not in found]
+        if index is not None and missing and self._wrote_recently():
+            with self._lock:
+                self.primary_reads += 1
+            found.update(self._read("find", lambda backend: backend.find_addresses(missing), None))
+        return found
+
+    def table_state(self) -> Tuple[int, int]:
+        """
+        Returns the largest ID and the number of rows of the address table, from a
+        replica, or from the primary shortly after a write of the process. The list
+        cache reloads the state after each insert, which a lagging replica would
+        not show yet, and would keep serving the pages of before.
+
+        Returns:
+            Tuple[int, int]: The largest ID, 0 when empty, and the row count.
+        """
+        return self._read(
+            "table_state", lambda backend: backend.table_state(), self._pick_after_write()
+        )
+
+    def reserve_child_indexes(self, crypto: str, count: int) -> int:
+        """
+        Reserves consecutive HD child indexes of a cryptocurrency on the primary.
+
+        Args:
+            crypto (str): The cryptocurrency symbol.
+            count (int): The number of indexes.
+
+        Returns:
+            int: The first reserved index.
+        """
+        return self._write(
+            "reserve_child_indexes", lambda: self.primary.reserve_child_indexes(crypto, count)
+        )
+
+    def pool_stats(self) -> Dict[str, int]:
+        """
+        Returns the statistics of the primary, the state of the replicas, and the
+        query latency of each target.
+
+        Returns:
+            dict: The primary backend statistics, the number of reads that fell back
+                to the primary and of those sent there for read-your-writes, and the
+                number of queries, failures and mean and maximum latency in
+                milliseconds of each target, with the largest ID, lag in seconds and
+                health of each replica.
+        """
+        with self._lock:
+            targets = {
+                name: {
+                    "queries": int(count),
+                    "errors": int(errors),
+                    "mean_ms": round(total / count * 1000, 3) if count else 0.0,
+                    "max_ms": round(slowest * 1000, 3),
+                }
+                for name, (count, errors, total, slowest) in self._latencies.items()
+            }
+            for index, name in enumerate(self.names):
+                targets[name].update({
+                    "max_id": self.replica_max_ids[index],
+                    "lag": round(self.replica_lags[index], 3),
+                    "healthy": self.replica_healthy[index],
+                })
+            return {
+                "backend": "replicated",
+                "primary": self.primary.pool_stats(),
+                "fallbacks": self.fallbacks,
+                "primary_reads": self.primary_reads,
+                "targets": targets,
+            }
+
+    def _pick(self) -> Optional[int]:
+        # Round robin over the healthy replicas within the lag bound.
+        self.check_if_due()
+        fresh = [
+            index
+            for index in range(len(self.replicas))
+            if self.replica_healthy[index] and self.replica_lags[index] <= self.max_lag
+        ]
+        if not fresh:
+            with self._lock:
+                self.fallbacks += 1
+            return None
+        return fresh[next(self._next) % len(fresh)]
+
+    def _pick_after_write(self) -> Optional[int]:
+        # The primary while replicas may still miss a write of the process, so that
+        # the process reads its own writes, a replica otherwise.
+        if self._wrote_recently():
+            with self._lock:
+                self.primary_reads += 1
+            return None
+        return self._pick()
+
+    def _target(self, index: Optional[int] = -1) -> Tuple[str, StorageBackend]:
+        if index == -1:
+            index = self._pick()
+        if index is None:
+            return "primary", self.primary
+        return self.names[index], self.replicas[index]
+
+    def _read(
+        self, operation: str, call: Callable[[StorageBackend], T], index: Optional[int] = -1
+    ) -> T:
+        # `index` is a replica picked by the caller, None for the primary, or -1 to
+        # pick one. A failing replica is skipped until the next check.
+        name, backend = self._target(index)
+        try:
+            return self._timed(name, operation, lambda: call(backend))
+        except Exception:
+            if backend is self.primary:
+                raise
+            self.replica_healthy[self.names.index(name)] = False
+            with self._lock:
+                self.fallbacks += 1
+        return self._timed("primary", operation, lambda: call(self.primary))
+
+    def _write(self, operation: str, call: Callable[[], T]) -> T:
+        try:
+            return self._timed("primary", operation, call)
+        finally:
+            self.last_write = time.monotonic()
+
+    def _wrote_recently(self) -> bool:
+        return self.last_write is not None and time.monotonic() - self.last_write <= self.max_lag
+
+    def _timed(self, target: str, operation: str, call: Callable[[], T]) -> T:
+        start = time.perf_counter()
+        failed = False
+        try:
+            return call()
+        except Exception:
+            failed = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            metrics.DB_QUERY_SECONDS.observe(elapsed, target, operation)
+            with self._lock:
+                latency = self._latencies[target]
+                latency[0] += 1
+                latency[1] += failed
+                latency[2] += elapsed
+                latency[3] = max(latency[3], elapsed)
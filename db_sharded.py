@@ -0,0 +1,450 @@
+import os
+import heapq
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+from db_backend import StorageBackend
+from settings import load_settings
+
+load_settings()
+
+# "currency" keeps each cryptocurrency on one shard, "hash" spreads the addresses of
+# every cryptocurrency over all shards.
+DB_SHARD_KEY = os.environ.get("DB_SHARD_KEY", "currency")
+# Optional fixed placement of cryptocurrencies, e.g. "BTC:0,ETH:1,TRO:1". The others
+# are placed by a hash of their symbol.
+DB_SHARD_CURRENCIES = os.environ.get("DB_SHARD_CURRENCIES", "")
+# Low bits of the global IDs holding the shard number, so at most 2**bits shards. It
+# must never change once IDs are handed out.
+DB_SHARD_BITS = int(os.environ.get("DB_SHARD_BITS", 4))
+
+# Number of row IDs each process reserves at once from the shared counter. 1 orders
+# the IDs of all processes by insert, at a round trip to the first shard per insert.
+DB_SHARD_ID_BLOCK = int(os.environ.get("DB_SHARD_ID_BLOCK", 1000))
+
+# Key of the counter, in the hd_child_index table of the first shard, which the row
+# IDs of every shard are drawn from. No cryptocurrency symbol starts with "#".
+ROW_ID_COUNTER = "#row_id"
+
+T = TypeVar("T")
+
+
+class ShardedBackend(StorageBackend):
+    def __init__(
+        self,
+        shards: List[StorageBackend],
+        key: str = DB_SHARD_KEY,
+        currencies: str = DB_SHARD_CURRENCIES,
+        bits: int = DB_SHARD_BITS,
+        id_block: int = DB_SHARD_ID_BLOCK,
+    ) -> None:
+        """
+        Initializes a ShardedBackend object, which partitions the crypto_address table
+        over several storage backends, each with a table of its own.
+
+        Writes go to the shard of their cryptocurrency or of the hash of their address,
+        and the global ID of a row is its local ID shifted left by `bits`, ORed with
+        the shard number, so an ID lookup reads a single shard. Local IDs are drawn
+        in blocks from a single counter, so the global IDs of a process follow the
+        order of its inserts across shards, as keyset cursors expect. Reads spanning
+        the table query the shards in parallel and merge the rows by global ID.
+
+        Args:
+            shards (List[StorageBackend]): The backend of each shard, in a fixed order.
+            key (str, optional): "currency" or "hash". Defaults to DB_SHARD_KEY.
+            currencies (str, optional): Fixed shards of cryptocurrencies, as
+                "BTC:0,ETH:1". Defaults to DB_SHARD_CURRENCIES.
+            bits (int, optional): Bits of the global IDs holding the shard number.
+                Defaults to DB_SHARD_BITS.
+            id_block (int, optional): Row IDs reserved at once. Defaults to
+                DB_SHARD_ID_BLOCK.
+
+        Raises:
+            ValueError: If the key is unknown, or a shard number is out of range.
+        """
+        if key not in ("currency", "hash"):
+            raise ValueError(f"Invalid shard key: {key}")
+        if not 0 < len(shards) <= 1 << bits:
+            raise ValueError(f"Between 1 and {1 << bits} shards are supported")
+        self.shards = shards
+        self.key = key
+        self.bits = bits
+        self.mask = (1 << bits) - 1
+        self.currencies: Dict[str, int] = {}
+        for entry in filter(None, currencies.split(",")):
+            crypto, shard = entry.split(":")
+            if not 0 <= int(shard) < len(shards):
+                raise ValueError(f"Invalid shard for {crypto}: {shard}")
+            self.currencies[crypto.strip()] = int(shard)
+        self._executor = ThreadPoolExecutor(
+            max_workers=4 * len(shards), thread_name_prefix="shard"
+        )
+        self.id_block = id_block
+        self._ids_lock = threading.Lock()
+        self._ids_aligned = False
+        # The next reserved ID and the last one of the current block.
+        self._next_id = 1
+        self._last_id = 0
+
+    def shard_of_currency(self, crypto: str) -> int:
+        """
+        Returns the shard of a cryptocurrency, which holds its addresses when keyed by
+        currency, and its HD child index counter in any case.
+
+        Args:
+            crypto (str): The cryptocurrency symbol.
+
+        Returns:
+            int: The shard number.
+        """
+        if crypto in self.currencies:
+            return self.currencies[crypto]
+        return _stable_hash(crypto) % len(self.shards)
+
+    def shard_of(self, address: str, crypto: str) -> int:
+        """
+        Returns the shard an address is written to.
+
+        Args:
+            address (str): The address.
+            crypto (str): Its cryptocurrency symbol.
+
+        Returns:
+            int: The shard number.
+        """
+        if self.key == "hash":
+            return _stable_hash(address) % len(self.shards)
+        return self.shard_of_currency(crypto)
+
+    def to_global(self, local_id: int, shard: int) -> int:
+        """
+        Returns the global ID of a row of a shard.
+
+        Args:
+            local_id (int): The ID of the row in its shard.
+            shard (int): The shard number.
+
+        Returns:
+            int: The global ID.
+        """
+        return (local_id << self.bits) | shard
+
+    def to_local(self, global_id: int) -> Tuple[int, int]:
+        """
+        Splits a global ID into the shard number and the local ID.
+
+        Args:
+            global_id (int): The global ID.
+
+        Returns:
+            Tuple[int, int]: The shard number and the ID of the row in that shard.
+        """
+        return global_id & self.mask, global_id >> self.bits
+
+    def local_after(self, after_id: int, shard: int) -> int:
+        """
+        Translates a global keyset cursor into the cursor of a shard: the largest local
+        ID whose global ID is not greater than `after_id`.
+
+        Args:
+            after_id (int): Only rows with a greater global ID are wanted.
+            shard (int): The shard number.
+
+        Returns:
+            int: Only rows of the shard with a greater local ID are wanted.
+        """
+        return max(0, (after_id - shard) >> self.bits)
+
+    def reserve_ids(self, count: int) -> List[int]:
+        """
+        Hands out the local IDs of new rows from blocks of `id_block` IDs reserved on
+        the counter of the first shard, so that the IDs of the process follow the
+        order of its inserts, whatever the shard of the rows, at one round trip per
+        block. The first reservation of the process moves the counter past the
+        largest local ID of every shard, for rows stored before it was used.
+
+        Args:
+            count (int): The number of IDs.
+
+        Returns:
+            List[int]: The reserved local IDs, in increasing order.
+        """
+        with self._ids_lock:
+            if not self._ids_aligned:
+                largest = max(self._scatter(lambda shard, backend: backend.max_id()))
+                current = self.shards[0].reserve_child_indexes(ROW_ID_COUNTER, 0)
+                if current < largest:
+                    self.shards[0].reserve_child_indexes(ROW_ID_COUNTER, largest - current)
+                self._ids_aligned = True
+            ids: List[int] = []
+            while len(ids) < count:
+                if self._next_id > self._last_id:
+                    size = max(self.id_block, count - len(ids))
+                    first = self.shards[0].reserve_child_indexes(ROW_ID_COUNTER, size)
+                    self._next_id, self._last_id = first + 1, first + size
+                take = min(count - len(ids), self._last_id - self._next_id + 1)
+                ids.extend(range(self._next_id, self._next_id + take))
+                self._next_id += take
+            return ids
+
+    def persist_on_database(self, address: str, crypto: str) -> None:
+        """
+        Persists an address and cryptocurrency on its shard.
+
+        Args:
+            address (str): The address to persist.
+            crypto (str): The cryptocurrency associated with the address.
+        """
+        self.persist_many_on_database([address], crypto)
+
+    def persist_many_on_database(
+        self, addresses: List[str], crypto: str, ids: Optional[List[int]] = None
+    ) -> None:
+        """
+        Persists a batch of addresses of a cryptocurrency, in one transaction per shard
+        involved. Keyed by currency, that is a single transaction.
+
+        Args:
+            addresses (List[str]): The addresses to persist.
+            crypto (str): The cryptocurrency associated with the addresses.
+            ids (List[int], optional): The local IDs of the rows. Defaults to None, to
+                reserve them with `reserve_ids`.
+        """
+        if not addresses:
+            return
+        ids = ids or self.reserve_ids(len(addresses))
+        groups: Dict[int, Tuple[List[str], List[int]]] = {}
+        for address, id in zip(addresses, ids):
+            group = groups.setdefault(self.shard_of(address, crypto), ([], []))
+            group[0].append(address)
+            group[1].append(id)
+        self._gather([
+            (lambda shard=shard, group=group: self.shards[shard].persist_many_on_database(
+                group[0], crypto, group[1]
+            ))
+            for shard, group in groups.items()
+        ])
+
+    def list_all_addresses(self) -> List[str]:
+        """
+        Lists all addresses of all shards.
+
+        Returns:
+            List[str]: A list of addresses stored in the database.
+        """
+        results = self._scatter(lambda shard, backend: backend.list_all_addresses())
+        return [address for addresses in results for address in addresses]
+
+    def list_addresses_page(self, after_id: int = 0, limit: int = 1000) -> List[Tuple[int, str]]:
+        """
+        Lists a page of addresses by global ID. Every shard is asked in parallel for
+        its first `limit` rows past the cursor, and the pages are merged.
+
+        Args:
+            after_id (int, optional): Only addresses with a greater global ID are
+                listed. Defaults to 0.
+            limit (int, optional): The maximum number of addresses. Defaults to 1000.
+
+        Returns:
+            List[Tuple[int, str]]: The global ID and address of each row, ordered by ID.
+        """
+        pages = self._scatter(
+            lambda shard, backend: self._globalize(
+                backend.list_addresses_page(self.local_after(after_id, shard), limit), shard
+            )
+        )
+        return list(heapq.merge(*pages))[:limit]
+
+    def iter_addresses(self, after_id: int = 0, chunk_size: int = 1000) -> Iterator[Tuple[int, str]]:
+        """
+        Streams the addresses of all shards in chunks, merged by global ID.
+
+        Args:
+            after_id (int, optional): Only addresses with a greater global ID are
+                listed. Defaults to 0.
+            chunk_size (int, optional): Rows read per chunk and shard. Defaults to 1000.
+
+        Yields:
+            Tuple[int, str]: The global ID and address of each row, ordered by ID.
+        """
+        return heapq.merge(*(
+            self._globalize(
+                backend.iter_addresses(self.local_after(after_id, shard), chunk_size), shard
+            )
+            for shard, backend in enumerate(self.shards)
+        ))
+
+    def iter_address_rows(
+        self, after_id: int = 0, chunk_size: int = 1000
+    ) -> Iterator[Tuple[int, str, str]]:
+        """
+        Streams the full rows of all shards in chunks, merged by global ID.
+
+        Args:
+            after_id (int, optional): Only rows with a greater global ID are listed.
+                Defaults to 0.
+            chunk_size (int, optional): Rows read per chunk and shard. Defaults to 1000.
+
+        Yields:
+            Tuple[int, str, str]: The global ID, address and cryptocurrency of each row,
+                ordered by ID.
+        """
+        return heapq.merge(*(
+            self._globalize(
+                backend.iter_address_rows(self.local_after(after_id, shard), chunk_size), shard
+            )
+            for shard, backend in enumerate(self.shards)
+        ))
+
+    def recent_addresses(self, limit: int) -> List[Tuple[int, str]]:
+        """
+        Lists the addresses with the largest global IDs, querying the shards in
+        parallel.
+
+        Args:
+            limit (int): The maximum number of addresses.
+
+        Returns:
+            List[Tuple[int, str]]: The global ID and address of each row, newest first.
+        """
+        pages = self._scatter(
+            lambda shard, backend: self._globalize(backend.recent_addresses(limit), shard)
+        )
+        return list(heapq.merge(*pages, reverse=True))[:limit]
+
+    def retrieve_address(self, id: int) -> str:
+        """
+        Retrieves an address from the shard encoded in its global ID.
+
+        Args:
+            id (int): The global ID of the address.
+
+        Returns:
+            str: The retrieved address.
+        """
+        shard, local_id = self.to_local(id)
+        if shard < len(self.shards):
+            return self.shards[shard].retrieve_address(local_id)
+
+    def find_address(self, address: str) -> Optional[Tuple[int, str]]:
+        """
+        Finds a stored address, on its shard when keyed by hash, on all shards in
+        parallel otherwise.
+
+        Args:
+            address (str): The address.
+
+        Returns:
+            Tuple[int, str]: The global ID and cryptocurrency of the address, or None
+                if it is not stored.
+        """
+        found = self.find_addresses([address])
+        return found.get(address)
+
+    def find_addresses(self, addresses: List[str]) -> Dict[str, Tuple[int, str]]:
+        """
+        Finds many stored addresses with one query per shard, run in parallel. Keyed
+        by hash, each shard is only asked for its own addresses.
+
+        Args:
+            addresses (List[str]): The addresses.
+
+        Returns:
+            Dict[str, Tuple[int, str]]: The global ID and cryptocurrency of each stored
+                address.
+        """
+        if not addresses:
+            return {}
+        groups: Dict[int, List[str]] = {}
+        if self.key == "hash":
+            for address in addresses:
+                groups.setdefault(self.shard_of(address, ""), []).append(address)
+        else:
+            groups = {shard: addresses for shard in range(len(self.shards))}
+        results = self._gather([
+            (lambda shard=shard, group=group: (shard, self.shards[shard].find_addresses(group)))
+            for shard, group in groups.items()
+        ])
+        found: Dict[str, Tuple[int, str]] = {}
+        for shard, rows in results:
+            for address, (local_id, crypto) in rows.items():
+                global_id = self.to_global(local_id, shard)
+                # The same address stored twice keeps its oldest row, as on one table.
+                if address not in found or global_id < found[address][0]:
+                    found[address] = (global_id, crypto)
+        return found
+
+    def table_state(self) -> Tuple[int, int]:
+        """
+        Returns the largest global ID and the total number of rows, which change on
+        every insert into any shard.
+
+        Returns:
+            Tuple[int, int]: The largest global ID, 0 when empty, and the row count.
+        """
+        states = self._scatter(lambda shard, backend: backend.table_state())
+        max_id = max(
+            (
+                self.to_global(local_id, shard)
+                for shard, (local_id, _) in enumerate(states)
+                if local_id
+            ),
+            default=0,
+        )
+        return max_id, sum(count for _, count in states)
+
+    def reserve_child_indexes(self, crypto: str, count: int) -> int:
+        """
+        Reserves consecutive HD child indexes of a cryptocurrency, on the counter of
+        its shard.
+
+        Args:
+            crypto (str): The cryptocurrency symbol.
+            count (int): The number of indexes.
+
+        Returns:
+            int: The first reserved index.
+        """
+        return self.shards[self.shard_of_currency(crypto)].reserve_child_indexes(crypto, count)
+
+    def pool_stats(self) -> Dict[str, int]:
+        """
+        Returns the statistics of every shard.
+
+        Returns:
+            dict: The shard key and the statistics of each shard backend.
+        """
+        return {
+            "backend": "sharded",
+            "key": self.key,
+            "shards": [backend.pool_stats() for backend in self.shards],
+        }
+
+    def _globalize(self, rows, shard: int):
+        # Rows start with their local ID, replaced by the global one.
+        for row in rows:
+            yield (self.to_global(row[0], shard),) + tuple(row[1:])
+
+    def _scatter(self, call: Callable[[int, StorageBackend], T]) -> List[T]:
+        # Materializes each result in the worker, so generators do not escape to the
+        # caller thread half-consumed.
+        return self._gather([
+            (lambda shard=shard, backend=backend: _materialize(call(shard, backend)))
+            for shard, backend in enumerate(self.shards)
+        ])
+
+    def _gather(self, calls: List[Callable[[], T]]) -> List[T]:
+        if len(calls) == 1:
+            return [calls[0]()]
+        futures = [self._executor.submit(call) for call in calls]
+        return [future.result() for future in futures]
+
+
+def _materialize(result):
+    return list(result) if hasattr(result, "__next__") else result
+
+
+def _stable_hash(value: str) -> int:
+    # The built-in hash of strings is salted per process, so it cannot place rows.
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
@@ -0,0 +1,369 @@
+import os
+import json
+import sqlite3
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+from db_backend import StorageBackend, flatten_list
+from settings import load_settings
+
+load_settings()
+
+SQLITE_COMMIT_BATCH = int(os.environ.get("SQLITE_COMMIT_BATCH", 1000))
+SQLITE_CACHED_STATEMENTS = int(os.environ.get("SQLITE_CACHED_STATEMENTS", 256))
+
+# A NULL ID is assigned by the table.
+INSERT_ADDRESS = "INSERT INTO crypto_address (id, address, crypto_currency) VALUES (?, ?, ?)"
+SELECT_ALL = "SELECT address FROM crypto_address"
+SELECT_PAGE = "SELECT id, address FROM crypto_address WHERE id > ? ORDER BY id LIMIT ?"
+SELECT_ROWS_PAGE = (
+    "SELECT id, address, crypto_currency FROM crypto_address WHERE id > ? ORDER BY id LIMIT ?"
+)
+SELECT_RECENT = "SELECT id, address FROM crypto_address ORDER BY id DESC LIMIT ?"
+SELECT_BY_ID = "SELECT address FROM crypto_address WHERE id = ?"
+SELECT_BY_ADDRESS = "SELECT id, crypto_currency FROM crypto_address WHERE address = ?"
+# One parameter, the JSON array of the addresses, whatever their number.
+SELECT_BY_ADDRESSES = (
+    "SELECT id, address, crypto_currency FROM crypto_address "
+    "WHERE address IN (SELECT value FROM json_each(?))"
+)
+SELECT_TABLE_STATE = "SELECT COALESCE(MAX(id), 0), COUNT(*) FROM crypto_address"
+SELECT_MAX_ID = "SELECT COALESCE(MAX(id), 0) FROM crypto_address"
+INSERT_CHILD_INDEX = (
+    "INSERT OR IGNORE INTO hd_child_index (crypto_currency, next_index) VALUES (?, 0)"
+)
+UPDATE_CHILD_INDEX = (
+    "UPDATE hd_child_index SET next_index = next_index + ? WHERE crypto_currency = ?"
+)
+SELECT_CHILD_INDEX = "SELECT next_index FROM hd_child_index WHERE crypto_currency = ?"
+
+
+class SqliteCursor(StorageBackend):
+    def __init__(self, database: str = ":memory:", commit_batch: int = SQLITE_COMMIT_BATCH) -> None:
+        """
+        Initializes a SqliteCursor object, an embedded storage backend tuned for
+        throughput, which creates the crypto_address table if needed.
+
+        File databases run in WAL mode, so readers never block the writer. Reads use one
+        connection per thread, and writes go through a single writer connection that
+        group-commits the rows of concurrent writers in one transaction. Statements are
+        constant, so each connection compiles them once and reuses them from its
+        statement cache.
+
+        Args:
+            database (str, optional): Path of the database file. Defaults to an
+                in-memory database, which is served by the writer connection only.
+            commit_batch (int, optional): Maximum number of rows per group commit.
+                Defaults to SQLITE_COMMIT_BATCH.
+        """
+        self.database = database
+        self.commit_batch = commit_batch
+        self.in_memory = database == ":memory:"
+        self.commits = 0
+        self.writes = 0
+        self._writer = self._connect()
+        self._writer_lock = threading.Lock()
+        self._readers = threading.local()
+        self._condition = threading.Condition()
+        self._buffer: List[Tuple[int, Tuple[Optional[int], str, str]]] = []
+        self._enqueued = 0
+        self._committed = 0
+        self._flushing = False
+        self._errors: Dict[int, Exception] = {}
+        with self._writer_lock:
+            self._writer.execute(
+                "CREATE TABLE IF NOT EXISTS crypto_address ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "address TEXT NOT NULL, "
+                "crypto_currency TEXT NOT NULL)"
+            )
+            self._writer.execute(
+                "CREATE INDEX IF NOT EXISTS idx_crypto_address_address "
+                "ON crypto_address (address)"
+            )
+            self._writer.execute(
+                "CREATE TABLE IF NOT EXISTS hd_child_index ("
+                "crypto_currency TEXT PRIMARY KEY, "
+                "next_index INTEGER NOT NULL)"
+            )
+            self._writer.commit()
+
+    def persist_on_database(self, address: str, crypto: str) -> None:
+        """
+        Persists an address and cryptocurrency in the database.
+
+        Args:
+            address (str): The address to persist.
+            crypto (str): The cryptocurrency associated with the address.
+        """
+        self._write([(None, address, crypto)])
+
+    def persist_many_on_database(
+        self, addresses: List[str], crypto: str, ids: Optional[List[int]] = None
+    ) -> None:
+        """
+        Persists a batch of addresses of a cryptocurrency in one transaction.
+
+        Args:
+            addresses (List[str]): The addresses to persist.
+            crypto (str): The cryptocurrency associated with the addresses.
+            ids (List[int], optional): The IDs of the rows. Defaults to None, for
+                AUTOINCREMENT IDs.
+        """
+        if addresses:
+            ids = ids or [None] * len(addresses)
+            self._write([(id, address, crypto) for id, address in zip(ids, addresses)])
+
+    def list_all_addresses(self) -> List[str]:
+        """
+        Lists all addresses from the database.
+
+        Returns:
+            List[str]: A list of addresses stored in the database.
+        """
+        response = self._read(SELECT_ALL, ())
+        if response:
+            return flatten_list(response)
+
+    def list_addresses_page(self, after_id: int = 0, limit: int = 1000) -> List[Tuple[int, str]]:
+        """
+        Lists a page of addresses using keyset pagination on the ID.
+
+        Args:
+            after_id (int, optional): Only addresses with a greater ID are listed.
+                Defaults to 0.
+            limit (int, optional): The maximum number of addresses. Defaults to 1000.
+
+        Returns:
+            List[Tuple[int, str]]: The ID and address of each row, ordered by ID.
+        """
+        return self._read(SELECT_PAGE, (after_id, limit))
+
+    def iter_addresses(self, after_id: int = 0, chunk_size: int = 1000) -> Iterator[Tuple[int, str]]:
+        """
+        Streams the addresses one page at a time, so no connection or read transaction
+        is held between chunks and the iterator may be consumed from any thread.
+
+        Args:
+            after_id (int, optional): Only addresses with a greater ID are listed.
+                Defaults to 0.
+            chunk_size (int, optional): Rows read per page. Defaults to 1000.
+
+        Yields:
+            Tuple[int, str]: The ID and address of each row, ordered by ID.
+        """
+        return self._iter_pages(SELECT_PAGE, after_id, chunk_size)
+
+    def iter_address_rows(
+        self, after_id: int = 0, chunk_size: int = 1000
+    ) -> Iterator[Tuple[int, str, str]]:
+        """
+        Streams the full rows one page at a time, as `iter_addresses`.
+
+        Args:
+            after_id (int, optional): Only rows with a greater ID are listed.
+                Defaults to 0.
+            chunk_size (int, optional): Rows read per page. Defaults to 1000.
+
+        Yields:
+            Tuple[int, str, str]: The ID, address and cryptocurrency of each row,
+                ordered by ID.
+        """
+        return self._iter_pages(SELECT_ROWS_PAGE, after_id, chunk_size)
+
+    def recent_addresses(self, limit: int) -> List[Tuple[int, str]]:
+        """
+        Lists the most recently stored addresses.
+
+        Args:
+            limit (int): The maximum number of addresses.
+
+        Returns:
+            List[Tuple[int, str]]: The ID and address of each row, newest first.
+        """
+        return self._read(SELECT_RECENT, (limit,))
+
+    def retrieve_address(self, id: int) -> str:
+        """
+        Retrieves an address from the database based on the given ID.
+
+        Args:
+            id (int): The ID of the address.
+
+        Returns:
+            str: The retrieved address.
+        """
+        response = self._read(SELECT_BY_ID, (id,))
+        if response:
+            return response[0][0]
+
+    def find_address(self, address: str) -> Optional[Tuple[int, str]]:
+        """
+        Finds a stored address through the index on the address column.
+
+        Args:
+            address (str): The address.
+
+        Returns:
+            Tuple[int, str]: The ID and cryptocurrency of the address, or None if it is
+                not stored.
+        """
+        response = self._read(SELECT_BY_ADDRESS, (address,))
+        if response:
+            return tuple(response[0])
+
+    def find_addresses(self, addresses: List[str]) -> Dict[str, Tuple[int, str]]:
+        """
+        Finds many stored addresses in a single set-based query, through the index on
+        the address column.
+
+        Args:
+            addresses (List[str]): The addresses.
+
+        Returns:
+            Dict[str, Tuple[int, str]]: The ID and cryptocurrency of each stored
+                address.
+        """
+        if not addresses:
+            return {}
+        response = self._read(SELECT_BY_ADDRESSES, (json.dumps(addresses),))
+        return {address: (id, crypto) for id, address, crypto in response}
+
+    def table_state(self) -> Tuple[int, int]:
+        """
+        Returns the largest ID and the number of rows of the address table, which
+        change on every insert.
+
+        Returns:
+            Tuple[int, int]: The largest ID, 0 when empty, and the row count.
+        """
+        response = self._read(SELECT_TABLE_STATE, ())
+        return response[0][0], response[0][1]
+
+    def max_id(self) -> int:
+        """
+        Returns the largest ID of the address table, read from the end of the primary
+        key.
+
+        Returns:
+            int: The largest ID, 0 when empty.
+        """
+        return self._read(SELECT_MAX_ID, ())[0][0]
+
+    def reserve_child_indexes(self, crypto: str, count: int) -> int:
+        """
+        Atomically reserves consecutive HD child indexes of a cryptocurrency, in a write
+        transaction of its own.
+
+        Args:
+            crypto (str): The cryptocurrency symbol.
+            count (int): The number of indexes.
+
+        Returns:
+            int: The first reserved index.
+        """
+        with self._writer_lock:
+            try:
+                self._writer.execute(INSERT_CHILD_INDEX, (crypto,))
+                self._writer.execute(UPDATE_CHILD_INDEX, (count, crypto))
+                next_index = self._writer.execute(SELECT_CHILD_INDEX, (crypto,)).fetchone()[0]
+                self._writer.commit()
+            except Exception:
+                self._writer.rollback()
+                raise
+        return next_index - count
+
+    def pool_stats(self) -> Dict[str, int]:
+        """
+        Returns the write batching counters.
+
+        Returns:
+            dict: The number of persisted rows, of commits, and of writes waiting for
+                the next group commit.
+        """
+        with self._condition:
+            return {
+                "backend": "sqlite",
+                "writes": self.writes,
+                "commits": self.commits,
+                "pending": len(self._buffer),
+            }
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(
+            self.database,
+            check_same_thread=False,
+            cached_statements=SQLITE_CACHED_STATEMENTS,
+        )
+        if not self.in_memory:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("PRAGMA busy_timeout=5000")
+        connection.execute("PRAGMA temp_store=MEMORY")
+        return connection
+
+    def _iter_pages(self, query: str, after_id: int, chunk_size: int) -> Iterator[tuple]:
+        while True:
+            rows = self._read(query, (after_id, chunk_size))
+            yield from rows
+            if len(rows) < chunk_size:
+                return
+            after_id = rows[-1][0]
+
+    def _read(self, query: str, params: tuple) -> List[tuple]:
+        if self.in_memory:
+            with self._writer_lock:
+                return self._writer.execute(query, params).fetchall()
+        connection = getattr(self._readers, "connection", None)
+        if connection is None:
+            connection = self._readers.connection = self._connect()
+        return connection.execute(query, params).fetchall()
+
+    def _write(self, rows: List[Tuple[Optional[int], str, str]]) -> None:
+        # Group commit: the first writer to find no flush in progress becomes the
+        # leader and commits every buffered row, including those queued by other
+        # writers while it was committing, which just wait for their rows to land.
+        with self._condition:
+            self._enqueued += 1
+            ticket = self._enqueued
+            self._buffer.extend((ticket, row) for row in rows)
+            while self._committed < ticket:
+                if self._flushing:
+                    self._condition.wait()
+                    continue
+                self._flushing = True
+                try:
+                    self._flush_batch()
+                finally:
+                    self._flushing = False
+                    self._condition.notify_all()
+            error = self._errors.pop(ticket, None)
+        if error is not None:
+            raise error
+
+    def _flush_batch(self) -> None:
+        # Called by the leader with the condition held, released during the commit.
+        # Whole tickets are kept together, so every write lands in a single transaction.
+        end = min(self.commit_batch, len(self._buffer))
+        while end < len(self._buffer) and self._buffer[end][0] == self._buffer[end - 1][0]:
+            end += 1
+        batch, self._buffer = self._buffer[:end], self._buffer[end:]
+        tickets = {ticket for ticket, _ in batch}
+        self._condition.release()
+        error = None
+        try:
+            with self._writer_lock:
+                try:
+                    self._writer.executemany(INSERT_ADDRESS, [row for _, row in batch])
+                    self._writer.commit()
+                except Exception as exception:
+                    self._writer.rollback()
+                    error = exception
+        finally:
+            self._condition.acquire()
+        if error is None:
+            self.commits += 1
+            self.writes += len(batch)
+        else:
+            for ticket in tickets:
+                self._errors[ticket] = error
+        self._committed = max(self._committed, max(tickets))
@@ -0,0 +1,262 @@
+import io
+import os
+import csv
+import sys
+import zlib
+import struct
+import argparse
+from itertools import islice
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from settings import load_settings
+
+load_settings()
+
+EXPORT_CHUNK_SIZE = int(os.environ.get("EXPORT_CHUNK_SIZE", 10000))
+COLUMNAR_MAGIC = b"BCACOL1\n"
+
+Row = Tuple[int, str, str]
+
+
+def chunked(rows: Iterable[Row], chunk_size: int) -> Iterator[List[Row]]:
+    """
+    Groups rows in chunks.
+
+    Args:
+        rows (Iterable[Row]): The rows.
+        chunk_size (int): The number of rows per chunk.
+
+    Yields:
+        List[Row]: The rows of each chunk, the last one possibly shorter.
+    """
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def export_csv(rows: Iterable[Row], chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Encodes rows as CSV, with an `id,address,crypto_currency` header, one chunk of rows
+    at a time.
+
+    Args:
+        rows (Iterable[Row]): The ID, address and cryptocurrency of each row.
+        chunk_size (int, optional): The number of rows per encoded chunk. Defaults to
+            EXPORT_CHUNK_SIZE.
+
+    Yields:
+        bytes: The header, then the encoded chunks.
+    """
+    yield b"id,address,crypto_currency\r\n"
+    for chunk in chunked(rows, chunk_size):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(chunk)
+        yield buffer.getvalue().encode()
+
+
+def export_columnar(rows: Iterable[Row], chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Encodes rows in the compact columnar format, one row group per chunk of rows.
+
+    The stream starts with COLUMNAR_MAGIC. Each row group is its row count as a 32-bit
+    little-endian integer, followed by three zlib-compressed columns, each prefixed by
+    its compressed size as a 32-bit little-endian integer:
+    - the IDs, as the varint of the first ID and of the delta to each next one;
+    - the cryptocurrencies, as a dictionary of varint-prefixed symbols followed by one
+      byte per row indexing it;
+    - the addresses, as varint-prefixed UTF-8 strings.
+    A row group of zero rows ends the stream.
+
+    Args:
+        rows (Iterable[Row]): The ID, address and cryptocurrency of each row, ordered by
+            ID.
+        chunk_size (int, optional): The number of rows per row group. Defaults to
+            EXPORT_CHUNK_SIZE.
+
+    Yields:
+        bytes: The magic, then the encoded row groups, then the end marker.
+    """
+    yield COLUMNAR_MAGIC
+    for chunk in chunked(rows, chunk_size):
+        ids = bytearray()
+        previous = 0
+        for id, _, _ in chunk:
+            ids += encode_varint(id - previous)
+            previous = id
+        dictionary: Dict[str, int] = {}
+        codes = bytes(dictionary.setdefault(crypto, len(dictionary)) for _, _, crypto in chunk)
+        currencies = bytearray(encode_varint(len(dictionary)))
+        for crypto in dictionary:
+            currencies += encode_string(crypto)
+        currencies += codes
+        addresses = bytearray()
+        for _, address, _ in chunk:
+            addresses += encode_string(address)
+        group = [struct.pack("<I", len(chunk))]
+        for column in (ids, currencies, addresses):
+            compressed = zlib.compress(bytes(column))
+            group.append(struct.pack("<I", len(compressed)) + compressed)
+        yield b"".join(group)
+    yield struct.pack("<I", 0)
+
+
+def read_columnar(file: BinaryIO) -> Iterator[Row]:
+    """
+    Decodes a file written in the compact columnar format, one row group at a time.
+
+    Args:
+        file (BinaryIO): The file.
+
+    Yields:
+        Row: The ID, address and cryptocurrency of each row.
+
+    Raises:
+        ValueError: If the file is not in the columnar format.
+    """
+    if file.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+        raise ValueError("Not a columnar export")
+    while True:
+        (count,) = struct.unpack("<I", file.read(4))
+        if not count:
+            return
+        columns = []
+        for _ in range(3):
+            (size,) = struct.unpack("<I", file.read(4))
+            columns.append(zlib.decompress(file.read(size)))
+        ids_column, currencies_column, addresses_column = columns
+        ids, offset, previous = [], 0, 0
+        for _ in range(count):
+            delta, offset = decode_varint(ids_column, offset)
+            previous += delta
+            ids.append(previous)
+        size, offset = decode_varint(currencies_column, 0)
+        dictionary = []
+        for _ in range(size):
+            crypto, offset = decode_string(currencies_column, offset)
+            dictionary.append(crypto)
+        codes = currencies_column[offset:]
+        offset = 0
+        for index in range(count):
+            address, offset = decode_string(addresses_column, offset)
+            yield ids[index], address, dictionary[codes[index]]
+
+
+def encode_varint(value: int) -> bytes:
+    """
+    Encodes a non-negative integer as a LEB128 varint.
+
+    Args:
+        value (int): The integer.
+
+    Returns:
+        bytes: The varint.
+    """
+    data = bytearray()
+    while value > 0x7F:
+        data.append(value & 0x7F | 0x80)
+        value >>= 7
+    data.append(value)
+    return bytes(data)
+
+
+def decode_varint(data: bytes, offset: int) -> Tuple[int, int]:
+    """
+    Decodes a LEB128 varint.
+
+    Args:
+        data (bytes): The encoded data.
+        offset (int): The offset of the varint.
+
+    Returns:
+        tuple: The integer, and the offset following the varint.
+    """
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def encode_string(value: str) -> bytes:
+    """
+    Encodes a string as its varint-prefixed UTF-8 bytes.
+
+    Args:
+        value (str): The string.
+
+    Returns:
+        bytes: The encoded string.
+    """
+    data = value.encode()
+    return encode_varint(len(data)) + data
+
+
+def decode_string(data: bytes, offset: int) -> Tuple[str, int]:
+    """
+    Decodes a varint-prefixed UTF-8 string.
+
+    Args:
+        data (bytes): The encoded data.
+        offset (int): The offset of the string.
+
+    Returns:
+        tuple: The string, and the offset following it.
+    """
+    size, offset = decode_varint(data, offset)
+    return data[offset:offset + size].decode(), offset + size
+
+
+FORMATS: Dict[str, Tuple[Callable[..., Iterator[bytes]], str]] = {
+    "csv": (export_csv, "text/csv"),
+    "columnar": (export_columnar, "application/octet-stream"),
+}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Exports the stored addresses from the command line.
+
+    Args:
+        argv (List[str], optional): The command line arguments.
+
+    Returns:
+        int: The exit status.
+    """
+    import db_connector
+
+    parser = argparse.ArgumentParser(description="Export the stored addresses.")
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("--since-id", type=int, default=0,
+                        help="export only the rows with a greater ID")
+    parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE)
+    parser.add_argument("--output", help="write to this file instead of the standard output")
+    args = parser.parse_args(argv)
+
+    progress = {"rows": 0, "last_id": args.since_id}
+
+    def tracked(rows: Iterable[Row]) -> Iterator[Row]:
+        for row in rows:
+            progress["rows"] += 1
+            progress["last_id"] = row[0]
+            yield row
+
+    encode, _ = FORMATS[args.format]
+    rows = db_connector.stream_address_rows_from_db(args.since_id, args.chunk_size)
+    output = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        for data in encode(tracked(rows), args.chunk_size):
+            output.write(data)
+    finally:
+        if args.output:
+            output.close()
+    print(f"Exported {progress['rows']} rows, last id {progress['last_id']}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
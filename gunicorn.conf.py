@@ -0,0 +1,51 @@
+import os
+from settings import load_settings
+
+load_settings()
+
+# Multi-process serving: gunicorn -c gunicorn.conf.py
+# The app is imported once by the master, which does no I/O at import, then forked.
+# Each worker builds its own database backend, key store client and caches after the
+# fork (see the os.register_at_fork hooks), and warms them up before serving.
+wsgi_app = "run:app"
+bind = os.environ.get("GUNICORN_BIND", f"0.0.0.0:{os.environ.get('API_PORT', 5000)}")
+workers = int(os.environ.get("GUNICORN_WORKERS", os.cpu_count() or 1))
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+preload_app = True
+
+# Graceful recycling: a worker is replaced after serving about max_requests requests,
+# finishing its requests in flight for up to graceful_timeout seconds. The jitter
+# keeps the workers from restarting all at once.
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 10000))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", 1000))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 60))
+
+
+def post_worker_init(worker) -> None:
+    """
+    Warms the worker up before it accepts requests, unless WARM_UP_ON_START=false.
+    ASGI workers warm up in the lifespan of asgi.py instead.
+
+    Args:
+        worker: The gunicorn worker.
+    """
+    import controller
+
+    if controller.WARM_UP_ON_START and "uvicorn" not in worker.cfg.worker_class_str.lower():
+        controller.warm_up()
+
+
+def worker_exit(server, worker) -> None:
+    """
+    Flushes the write-behind queue and stops the address pool of an exiting worker.
+
+    Args:
+        server: The gunicorn arbiter.
+        worker: The gunicorn worker.
+    """
+    import controller
+
+    controller.write_queue.stop()
+    controller.pool.stop()
@@ -0,0 +1,216 @@
+import os
+import hmac
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+from settings import load_settings
+
+load_settings()
+
+HD_DERIVATION_ENABLED = os.environ.get("HD_DERIVATION_ENABLED", "false").lower() == "true"
+HD_INDEX_BLOCK_SIZE = int(os.environ.get("HD_INDEX_BLOCK_SIZE", 100))
+HD_NODE_CACHE_SIZE = int(os.environ.get("HD_NODE_CACHE_SIZE", 1024))
+
+HARDENED = 2 ** 31
+CURVE_ORDER = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
+# BIP44 coin types: m / 44' / coin' / 0' / 0 / index
+COIN_TYPES = {"BTC": 0, "ETH": 60, "TRO": 195}
+
+
+class HDNode(NamedTuple):
+    private_key: int
+    chain_code: bytes
+
+
+def master_node(seed: bytes) -> HDNode:
+    """
+    Derives the master node of a seed, as specified by BIP32.
+
+    Args:
+        seed (bytes): The seed.
+
+    Returns:
+        HDNode: The master node.
+    """
+    digest = hmac.new(b"Bitcoin seed", seed, hashlib.sha512).digest()
+    return HDNode(int.from_bytes(digest[:32], "big"), digest[32:])
+
+
+def public_key(node: HDNode) -> bytes:
+    """
+    Computes the compressed secp256k1 public key of a node.
+
+    Args:
+        node (HDNode): The node.
+
+    Returns:
+        bytes: The 33-byte compressed public key.
+    """
+    from coincurve import PublicKey
+
+    return PublicKey.from_valid_secret(node.private_key.to_bytes(32, "big")).format()
+
+
+def derive_child(node: HDNode, index: int, parent_public_key: Optional[bytes] = None) -> HDNode:
+    """
+    Derives a child node, as specified by BIP32. Indexes from HARDENED on are hardened
+    children, derived from the parent private key. Normal children are derived from
+    the parent public key, which costs an EC multiplication unless given.
+
+    Args:
+        node (HDNode): The parent node.
+        index (int): The child index.
+        parent_public_key (bytes, optional): The compressed public key of the parent.
+            Defaults to None, to compute it.
+
+    Returns:
+        HDNode: The child node.
+
+    Raises:
+        ValueError: If the index yields an invalid key, which BIP32 skips.
+    """
+    if index >= HARDENED:
+        data = b"\x00" + node.private_key.to_bytes(32, "big")
+    else:
+        data = parent_public_key or public_key(node)
+    digest = hmac.new(node.chain_code, data + index.to_bytes(4, "big"), hashlib.sha512).digest()
+    tweak = int.from_bytes(digest[:32], "big")
+    private_key = (tweak + node.private_key) % CURVE_ORDER
+    if tweak >= CURVE_ORDER or private_key == 0:
+        raise ValueError(f"Invalid child key at index {index}")
+    return HDNode(private_key, digest[32:])
+
+
+class HDKeychain:
+    def __init__(self, cache_size: int = HD_NODE_CACHE_SIZE) -> None:
+        """
+        Initializes an HDKeychain object, which derives the child keys of the master
+        secret of each cryptocurrency along its BIP44 path,
+        m / 44' / coin' / 0' / 0 / index.
+
+        The intermediate nodes down to the parent of the children, with its public key,
+        are kept in an LRU cache, so each child key costs one HMAC and an addition.
+
+        Args:
+            cache_size (int, optional): The maximum number of cached parent nodes.
+                Defaults to HD_NODE_CACHE_SIZE.
+        """
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._parents: "OrderedDict[Tuple[str, str], Tuple[HDNode, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def child_key(self, crypto: str, master_secret: str, index: int) -> str:
+        """
+        Derives a child private key.
+
+        Args:
+            crypto (str): The cryptocurrency symbol.
+            master_secret (str): The master secret of the cryptocurrency, in hex.
+            index (int): The child index.
+
+        Returns:
+            str: The child private key, in hex.
+        """
+        return self.child_keys(crypto, master_secret, [index])[0]
+
+    def child_keys(self, crypto: str, master_secret: str, indexes: List[int]) -> List[str]:
+        """
+        Derives the child private keys of many indexes.
+
+        Args:
+            crypto (str): The cryptocurrency symbol.
+            master_secret (str): The master secret of the cryptocurrency, in hex.
+            indexes (List[int]): The child indexes.
+
+        Returns:
+            List[str]: The child private key of each index, in hex.
+        """
+        parent, parent_public_key = self._parent(crypto, master_secret)
+        return [
+            format(derive_child(parent, index, parent_public_key).private_key, "064x")
+            for index in indexes
+        ]
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the parent node cache counters.
+
+        Returns:
+            dict: The number of cached parent nodes, hits and misses.
+        """
+        with self._lock:
+            return {"size": len(self._parents), "hits": self.hits, "misses": self.misses}
+
+    def _parent(self, crypto: str, master_secret: str) -> Tuple[HDNode, bytes]:
+        cache_key = (crypto, master_secret)
+        with self._lock:
+            parent = self._parents.get(cache_key)
+            if parent is not None:
+                self._parents.move_to_end(cache_key)
+                self.hits += 1
+                return parent
+            self.misses += 1
+        node = master_node(bytes.fromhex(master_secret))
+        for index in (44 + HARDENED, COIN_TYPES[crypto] + HARDENED, HARDENED, 0):
+            node = derive_child(node, index)
+        parent = (node, public_key(node))
+        with self._lock:
+            self._parents[cache_key] = parent
+            while len(self._parents) > self.cache_size:
+                self._parents.popitem(last=False)
+        return parent
+
+
+class ChildIndexAllocator:
+    def __init__(self, reserve: Callable[[str, int], int],
+                 block_size: int = HD_INDEX_BLOCK_SIZE) -> None:
+        """
+        Initializes a ChildIndexAllocator object, which hands out the child indexes of
+        each cryptocurrency from blocks reserved on the shared counter, so the counter
+        is updated once per block rather than once per address. The indexes left in a
+        block when the process stops are never used.
+
+        Args:
+            reserve (Callable): Reserves a number of indexes of a cryptocurrency on the
+                shared counter, and returns the first one.
+            block_size (int, optional): The number of indexes reserved at once.
+                Defaults to HD_INDEX_BLOCK_SIZE.
+        """
+        self.reserve = reserve
+        self.block_size = block_size
+        self._blocks: Dict[str, Tuple[int, int]] = {}
+        self._lock = threading.Lock()
+
+    def allocate(self, crypto: str, count: int = 1) -> List[int]:
+        """
+        Allocates unused child indexes.
+
+        Args:
+            crypto (str): The cryptocurrency symbol.
+            count (int, optional): The number of indexes. Defaults to 1.
+
+        Returns:
+            List[int]: The allocated indexes.
+        """
+        with self._lock:
+            start, end = self._blocks.get(crypto, (0, 0))
+            indexes = list(range(start, min(end, start + count)))
+            missing = count - len(indexes)
+            if missing:
+                first = self.reserve(crypto, max(missing, self.block_size))
+                indexes.extend(range(first, first + missing))
+                start, end = first + missing, first + max(missing, self.block_size)
+            else:
+                start += count
+            self._blocks[crypto] = (start, end)
+            return indexes
+
+    def clear(self) -> None:
+        """
+        Forgets the reserved blocks.
+        """
+        with self._lock:
+            self._blocks.clear()
@@ -1,12 +1,14 @@
 import os
-import boto3
+import time
 import json
 import logging
-from dotenv import load_dotenv
-from datetime import datetime, timedelta
+import tempfile
+import threading
+from typing import Any, Callable, Dict, Optional
 from botocore.exceptions import ClientError
+from settings import load_settings
 
-load_dotenv()
+load_settings()
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -14,74 +16,453 @@ logger.setLevel(logging.INFO)
 ACCESS_KEY_ID = os.environ.get("ACCESS_KEY_ID")
 SECRET_ACCESS_KEY = os.environ.get("SECRET_ACCESS_KEY")
 BUCKET_NAME = os.environ.get("BUCKET_NAME")
+KEY_VAULT_BACKEND = os.environ.get("KEY_VAULT_BACKEND", "s3")
+KEY_VAULT_DIR = os.environ.get("KEY_VAULT_DIR", ".key_vault")
+KEY_PREFIX = "keys/"
+LEGACY_OBJECT_KEY = "keys/private_key.json"
+KEY_CACHE_TTL = float(os.environ.get("KEY_CACHE_TTL", 300))
+KEY_CACHE_REFRESH_INTERVAL = float(
+    os.environ.get("KEY_CACHE_REFRESH_INTERVAL", KEY_CACHE_TTL / 2)
+)
 
 
-def recover_from_s3() -> str:
+class KeyCache:
+    def __init__(
+        self,
+        loader: Callable[[], Dict[str, str]],
+        ttl: float = KEY_CACHE_TTL,
+        refresh_interval: Optional[float] = KEY_CACHE_REFRESH_INTERVAL,
+    ) -> None:
+        """
+        Initializes a process-wide cache of the private keys kept in the vault.
+
+        Args:
+            loader (Callable): Function returning the mapping of keys stored in the vault.
+            ttl (float, optional): Seconds a loaded mapping stays valid. Defaults to
+                KEY_CACHE_TTL.
+            refresh_interval (float, optional): Seconds between background refreshes.
+                A falsy value disables the background refresh. Defaults to
+                KEY_CACHE_REFRESH_INTERVAL.
+        """
+        self.loader = loader
+        self.ttl = ttl
+        self.refresh_interval = refresh_interval
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self._keys: Optional[Dict[str, str]] = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._refresher: Optional[threading.Thread] = None
+
+    def get(self, crypto_currency: str) -> str:
+        """
+        Returns the cached private key of a cryptocurrency, loading it from the vault
+        when the cache is empty or expired.
+
+        Args:
+            crypto_currency (str): The cryptocurrency associated with the key.
+
+        Returns:
+            str: The private key if it exists in the vault, otherwise an empty string.
+
+        Raises:
+            Exception: The error of the vault if it cannot be read and no keys were
+                loaded before. Expired keys are served meanwhile, as stored keys never
+                change.
+        """
+        with self._lock:
+            if self._keys is not None and not self._expired():
+                self.hits += 1
+                return self._keys.get(crypto_currency, "")
+            self.misses += 1
+            try:
+                self._load()
+            except Exception as error:
+                if self._keys is None:
+                    raise
+                self.refresh_errors += 1
+                logger.warning(f"Key cache reload failed, serving expired keys: {error}")
+            keys = self._keys
+        self.start_background_refresh()
+        return keys.get(crypto_currency, "")
+
+    def put(self, crypto_currency: str, key: str) -> None:
+        """
+        Stores a key just persisted in the vault, so it is served without a reload.
+
+        Args:
+            crypto_currency (str): The cryptocurrency associated with the key.
+            key (str): The private key.
+        """
+        with self._lock:
+            if self._keys is not None:
+                self._keys[crypto_currency] = key
+
+    def peek(self, crypto_currency: str) -> str:
+        """
+        Returns the cached private key of a cryptocurrency without loading the keys or
+        counting a lookup.
+
+        Args:
+            crypto_currency (str): The cryptocurrency associated with the key.
+
+        Returns:
+            str: The cached private key, or an empty string if it is not cached.
+        """
+        with self._lock:
+            return (self._keys or {}).get(crypto_currency, "")
+
+    def refresh(self) -> None:
+        """
+        Reloads the keys from the vault, keeping the current ones if the load fails.
+        """
+        try:
+            keys = self.loader() or {}
+        except Exception as error:
+            with self._lock:
+                self.refresh_errors += 1
+            logger.warning(f"Key cache refresh failed: {error}")
+            return
+        with self._lock:
+            self._keys = dict(keys)
+            self._loaded_at = time.monotonic()
+            self.refreshes += 1
+
+    def invalidate(self) -> None:
+        """
+        Drops the cached keys, forcing the next lookup to reach the vault.
+        """
+        with self._lock:
+            self._keys = None
+            self._loaded_at = 0.0
+
+    def start_background_refresh(self) -> None:
+        """
+        Starts the daemon thread refreshing the keys before they expire, if enabled
+        and not running yet.
+        """
+        if not self.refresh_interval or (
+            self._refresher is not None and self._refresher.is_alive()
+        ):
+            return
+        self._stop.clear()
+        self._refresher = threading.Thread(
+            target=self._refresh_loop, name="key-cache-refresh", daemon=True
+        )
+        self._refresher.start()
+
+    def stop_background_refresh(self) -> None:
+        """
+        Stops the background refresh thread.
+        """
+        self._stop.set()
+        if self._refresher is not None:
+            self._refresher.join()
+            self._refresher = None
+
+    def reset_after_fork(self) -> None:
+        """
+        Renews the lock of the cache in a forked process, where the refresh thread of
+        the parent does not run, and restarts the refresh if it was running. The keys
+        loaded by the parent are kept.
+        """
+        running = self._refresher is not None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._refresher = None
+        if running:
+            self.start_background_refresh()
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns the cache counters.
+
+        Returns:
+            dict: The hit, miss, refresh and refresh error counters, and the age in
+                seconds of the cached keys.
+        """
+        age = time.monotonic() - self._loaded_at if self._keys is not None else None
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+            "age": age,
+        }
+
+    def _expired(self) -> bool:
+        return time.monotonic() - self._loaded_at >= self.ttl
+
+    def _load(self) -> None:
+        self._keys = dict(self.loader() or {})
+        self._loaded_at = time.monotonic()
+
+    def _refresh_loop(self) -> None:
+        while not self._stop.wait(self.refresh_interval):
+            self.refresh()
+
+
+class S3KeyStore:
+    def __init__(self, bucket: Optional[str] = None, client: Optional[Any] = None) -> None:
+        """
+        Initializes a key store keeping one object per cryptocurrency in an S3 bucket,
+        under `keys/<crypto_currency>.json`.
+
+        Args:
+            bucket (str, optional): The bucket name. Defaults to BUCKET_NAME.
+            client (Any, optional): The S3 client. Defaults to a client shared by every
+                call, created on first use.
+        """
+        self.bucket = bucket or BUCKET_NAME
+        self._client = client
+        self._lock = threading.Lock()
+
+    @property
+    def client(self) -> Any:
+        """
+        The S3 client, created on first use and reused, as boto3 clients are
+        thread-safe.
+        """
+        with self._lock:
+            if self._client is None:
+                # Imported on first use, as it weighs most of the import time of the
+                # service.
+                import boto3
+
+                session = boto3.Session(
+                    aws_access_key_id=ACCESS_KEY_ID, aws_secret_access_key=SECRET_ACCESS_KEY
+                )
+                self._client = session.client("s3")
+            return self._client
+
+    def read_all(self) -> Dict[str, str]:
+        """
+        Reads the private key of every cryptocurrency. Keys still kept in the legacy
+        shared document are read as well, and the per-currency objects win over them.
+
+        Returns:
+            dict: The private keys, by cryptocurrency.
+
+        Raises:
+            ClientError: If the legacy document or the listing cannot be read, rather
+                than returning a partial mapping.
+        """
+        keys = self._read_legacy()
+        for object_key in self._list_object_keys():
+            crypto_currency = object_key[len(KEY_PREFIX):-len(".json")]
+            keys[crypto_currency] = self._read(object_key)
+        return keys
+
+    def create(self, crypto_currency: str, key: str) -> str:
+        """
+        Writes the private key of a cryptocurrency with a conditional PUT, which only
+        succeeds if no key was stored yet. Concurrent writers therefore cannot
+        overwrite each other, and the loser adopts the stored key. Nothing is written
+        unless the legacy shared document can be read, since the key it may hold
+        could not be recovered otherwise.
+
+        Args:
+            crypto_currency (str): The cryptocurrency associated with the key.
+            key (str): The private key to persist.
+
+        Returns:
+            str: The private key stored in the vault.
+
+        Raises:
+            ClientError: If the legacy document cannot be read, so that no object is
+                written while the legacy key may exist.
+        """
+        self._read_legacy()
+        object_key = f"{KEY_PREFIX}{crypto_currency}.json"
+        try:
+            self.client.put_object(
+                Bucket=self.bucket,
+                Key=object_key,
+                Body=json.dumps({"key": key}),
+                ContentType="application/json",
+                IfNoneMatch="*",
+            )
+        except ClientError as error:
+            code = error.response.get("Error", {}).get("Code")
+            if code not in ("PreconditionFailed", "ConditionalRequestConflict"):
+                raise
+            return self._read(object_key)
+        return key
+
+    def _list_object_keys(self) -> list:
+        object_keys = []
+        kwargs = {"Bucket": self.bucket, "Prefix": KEY_PREFIX}
+        while True:
+            response = self.client.list_objects_v2(**kwargs)
+            for content in response.get("Contents", []):
+                object_key = content["Key"]
+                if object_key.endswith(".json") and object_key != LEGACY_OBJECT_KEY:
+                    object_keys.append(object_key)
+            if not response.get("IsTruncated"):
+                return object_keys
+            kwargs["ContinuationToken"] = response["NextContinuationToken"]
+
+    def _read(self, object_key: str) -> str:
+        response = self.client.get_object(Bucket=self.bucket, Key=object_key)
+        return json.loads(response["Body"].read().decode("utf-8"))["key"]
+
+    def _read_legacy(self) -> Dict[str, str]:
+        # Only a missing document means there is no legacy key. Denied, throttled or
+        # failed reads raise, or the keys they hide would be replaced by new ones.
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=LEGACY_OBJECT_KEY)
+        except ClientError as error:
+            if error.response.get("Error", {}).get("Code") not in ("NoSuchKey", "404"):
+                raise
+            return {}
+        return json.loads(response["Body"].read().decode("utf-8"))
+
+
+class LocalKeyStore:
+    def __init__(self, directory: str = KEY_VAULT_DIR) -> None:
+        """
+        Initializes a key store keeping one file per cryptocurrency in a local
+        directory, a stand-in for the S3 bucket in offline tests and benchmarks.
+
+        Args:
+            directory (str, optional): The directory of the key files. Defaults to
+                KEY_VAULT_DIR.
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def read_all(self) -> Dict[str, str]:
+        """
+        Reads the private key of every cryptocurrency.
+
+        Returns:
+            dict: The private keys, by cryptocurrency.
+        """
+        keys = {}
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                keys[name[:-len(".json")]] = self._read(os.path.join(self.directory, name))
+        return keys
+
+    def create(self, crypto_currency: str, key: str) -> str:
+        """
+        Writes the private key of a cryptocurrency only if none was stored yet. The
+        file is written aside and hard-linked into place, which fails atomically if
+        another writer won.
+
+        Args:
+            crypto_currency (str): The cryptocurrency associated with the key.
+            key (str): The private key to persist.
+
+        Returns:
+            str: The private key stored in the vault.
+        """
+        path = os.path.join(self.directory, f"{crypto_currency}.json")
+        descriptor, temporary_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "w") as file:
+                json.dump({"key": key}, file)
+                file.flush()
+                os.fsync(file.fileno())
+            os.link(temporary_path, path)
+        except FileExistsError:
+            return self._read(path)
+        finally:
+            os.unlink(temporary_path)
+        return key
+
+    @staticmethod
+    def _read(path: str) -> str:
+        with open(path) as file:
+            return json.load(file)["key"]
+
+
+_key_store = None
+_key_store_lock = threading.Lock()
+_write_locks: Dict[str, threading.Lock] = {}
+
+
+def get_key_store():
     """
-    Recovers the private key from the S3 bucket.
+    Returns the key store selected by KEY_VAULT_BACKEND, "s3" or "local", created on
+    first use and shared by every call.
 
     Returns:
-        str: The recovered private key if successful, otherwise None.
+        S3KeyStore | LocalKeyStore: The key store.
     """
-    session = boto3.Session(
-        aws_access_key_id=ACCESS_KEY_ID, aws_secret_access_key=SECRET_ACCESS_KEY
-    )
+    global _key_store
+    with _key_store_lock:
+        if _key_store is None:
+            if KEY_VAULT_BACKEND == "local":
+                _key_store = LocalKeyStore(KEY_VAULT_DIR)
+            else:
+                _key_store = S3KeyStore()
+        return _key_store
+
 
-    object_key = "keys/private_key.json"
+def recover_from_s3() -> Dict[str, str]:
+    """
+    Recovers the private keys from the vault.
 
+    Returns:
+        dict: The recovered private keys by cryptocurrency.
+
+    Raises:
+        ClientError: If the vault could not be read. Returning no keys instead would
+            have them cached, and new keys generated in place of the unread ones.
+    """
     try:
-        response = session.client("s3").get_object(Bucket=BUCKET_NAME, Key=object_key)
+        keys = get_key_store().read_all()
     except ClientError as error:
-        logger.warning(error)
-        return {}
-
-    metadata = response["ResponseMetadata"]
-    if metadata["HTTPStatusCode"] == 200:
-        keys = response["Body"].read().decode("utf-8")
-        logger.warning("Private key recovered.")
-        return json.loads(keys)
-    else:
-        return None
+        logger.warning(f"Private keys could not be recovered: {error}")
+        raise
+    logger.info("Private keys recovered.")
+    return keys
 
 
-def persist_on_s3(key: str, crypto_currency: str) -> None:
+def persist_on_s3(key: str, crypto_currency: str) -> str:
     """
-    Persists the private key on the S3 bucket.
+    Persists the private key in the vault, unless a key of the cryptocurrency is
+    already stored. Concurrent calls of a process for the same cryptocurrency are
+    coalesced into a single write.
 
     Args:
         key (str): The private key to persist.
         crypto_currency (str): The cryptocurrency associated with the key.
-    """
-    session = boto3.Session(
-        aws_access_key_id=ACCESS_KEY_ID, aws_secret_access_key=SECRET_ACCESS_KEY
-    )
-    object_key = "keys/private_key.json"
 
-    try:
-        response = session.client("s3").get_object(Bucket=BUCKET_NAME, Key=object_key)
-        keys = (
-            json.loads(response["Body"].read().decode("utf-8"))
-            if response["ResponseMetadata"]["HTTPStatusCode"] == 200
-            else {}
-        )
-    except:
-        keys = {}
-
-    if keys.get(crypto_currency):
-        return None
-    else:
-        keys[crypto_currency] = key
-
-    response = session.client("s3").put_object(
-        Bucket=BUCKET_NAME,
-        Key=object_key,
-        Body=json.dumps(keys),
-        ContentType="application/json",
-        Expires=datetime.now() + timedelta(days=1),
-    )
-
-    metadata = response["ResponseMetadata"]
-    if metadata["HTTPStatusCode"] == 200:
+    Returns:
+        str: The private key stored in the vault, which is the one of a concurrent
+            writer if it persisted first.
+    """
+    with _key_store_lock:
+        write_lock = _write_locks.setdefault(crypto_currency, threading.Lock())
+    with write_lock:
+        stored = key_cache.peek(crypto_currency)
+        if stored:
+            return stored
+        stored = get_key_store().create(crypto_currency, key)
+        key_cache.put(crypto_currency, stored)
+    if stored == key:
         logger.info("Key saved successfully.")
     else:
-        logger.warning("There was an error while persisting.")
\ No newline at end of file
+        logger.info("Key already persisted by another writer.")
+    return stored
+
+
+key_cache = KeyCache(lambda: recover_from_s3())
+
+
+def _reset_after_fork() -> None:
+    # boto3 clients are not fork-safe, so a forked process creates its own key store.
+    # A lock held by another thread of the parent at fork time would never be released.
+    global _key_store, _key_store_lock, _write_locks
+    _key_store = None
+    _key_store_lock = threading.Lock()
+    _write_locks = {}
+    key_cache.reset_after_fork()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
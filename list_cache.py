@@ -0,0 +1,153 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+from settings import load_settings
+
+load_settings()
+
+LIST_CACHE_SIZE = int(os.environ.get("LIST_CACHE_SIZE", 256))
+LIST_STATE_TTL = float(os.environ.get("LIST_STATE_TTL", 1))
+
+
+class ListCache:
+    def __init__(
+        self,
+        load_state: Callable[[], Tuple[int, int]],
+        max_size: int = LIST_CACHE_SIZE,
+        state_ttl: float = LIST_STATE_TTL,
+    ) -> None:
+        """
+        Initializes a ListCache object, which tags the pages of `/list` with an ETag
+        derived from the largest ID and the row count of the address table, and keeps
+        the serialized pages of the current ETag in a bounded LRU cache.
+
+        The table state is loaded at most every `state_ttl` seconds, so conditional
+        requests are answered without touching the table in between. Inserts made by
+        the process invalidate the state and the pages at once. Those made by other
+        processes are seen within `state_ttl` seconds.
+
+        Args:
+            load_state (Callable): Returns the largest ID and the row count.
+            max_size (int, optional): Maximum number of cached pages. Defaults to
+                LIST_CACHE_SIZE.
+            state_ttl (float, optional): Seconds the loaded state stays valid. Defaults
+                to LIST_STATE_TTL.
+        """
+        self.load_state = load_state
+        self.max_size = max_size
+        self.state_ttl = state_ttl
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.state_loads = 0
+        self._etag: Optional[str] = None
+        self._loaded_at = 0.0
+        self._generation = 0
+        self._pages: "OrderedDict[Tuple[int, int], Tuple[str, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def etag(self) -> str:
+        """
+        Returns the ETag of the current table state, loading the state if expired or
+        invalidated.
+
+        Returns:
+            str: The quoted ETag.
+        """
+        with self._lock:
+            if self._etag is not None and time.monotonic() - self._loaded_at < self.state_ttl:
+                return self._etag
+            generation = self._generation
+        max_id, count = self.load_state()
+        etag = f'"{max_id}-{count}"'
+        with self._lock:
+            self.state_loads += 1
+            # A state loaded across an invalidation may predate the insert, so it is
+            # used for this request only.
+            if generation == self._generation:
+                self._etag, self._loaded_at = etag, time.monotonic()
+        return etag
+
+    def respond(
+        self, key: Tuple[int, int], if_none_match: Optional[str], build: Callable[[], bytes]
+    ) -> Tuple[Optional[bytes], str]:
+        """
+        Answers a page request, conditional or not.
+
+        Args:
+            key (Tuple[int, int]): The `after_id` and `limit` of the page.
+            if_none_match (str, optional): The If-None-Match header of the request.
+            build (Callable): Queries and serializes the page.
+
+        Returns:
+            tuple: The serialized page, or None if the client copy is current, and the
+                ETag.
+        """
+        etag = self.etag()
+        if if_none_match and etag_matches(if_none_match, etag):
+            with self._lock:
+                self.not_modified += 1
+            return None, etag
+        with self._lock:
+            entry = self._pages.get(key)
+            if entry is not None and entry[0] == etag:
+                self._pages.move_to_end(key)
+                self.hits += 1
+                return entry[1], etag
+            self.misses += 1
+        body = build()
+        with self._lock:
+            self._pages[key] = (etag, body)
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.max_size:
+                self._pages.popitem(last=False)
+        return body, etag
+
+    def invalidate(self) -> None:
+        """
+        Forgets the table state and the cached pages, after an insert.
+        """
+        with self._lock:
+            self._generation += 1
+            self._etag = None
+            self._pages.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the cache counters.
+
+        Returns:
+            dict: The number of cached pages, of hits, misses, 304 answers and table
+                state loads.
+        """
+        with self._lock:
+            return {
+                "size": len(self._pages),
+                "hits": self.hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+                "state_loads": self.state_loads,
+            }
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    Checks an If-None-Match header against an ETag, with the weak comparison that
+    RFC 9110 specifies for it.
+
+    Args:
+        if_none_match (str): The header, "*" or a list of ETags.
+        etag (str): The quoted ETag.
+
+    Returns:
+        bool: True if the header matches the ETag.
+    """
+    if if_none_match.strip() == "*":
+        return True
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if (tag[2:] if tag.startswith("W/") else tag) == etag:
+            return True
+    return False
@@ -0,0 +1,252 @@
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, label_names: Sequence[str]) -> None:
+        """
+        Initializes a Prometheus counter.
+
+        Args:
+            name (str): The metric name.
+            help (str): The metric description.
+            label_names (Sequence[str]): The names of the metric labels.
+        """
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        """
+        Increments the counter of a label set.
+
+        Args:
+            *labels (str): The label values, in the order of `label_names`.
+            amount (float, optional): The increment. Defaults to 1.0.
+        """
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        """
+        Renders the counter in the Prometheus text format.
+
+        Returns:
+            List[str]: The lines of the metric.
+        """
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{format_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, label_names: Sequence[str],
+                 buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        """
+        Initializes a Prometheus histogram. An observation costs a binary search and an
+        increment under a lock, cheap enough to stay on in production.
+
+        Args:
+            name (str): The metric name.
+            help (str): The metric description.
+            label_names (Sequence[str]): The names of the metric labels.
+            buckets (Sequence[float], optional): The sorted upper bounds of the buckets.
+                Defaults to DEFAULT_BUCKETS.
+        """
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        """
+        Records an observation for a label set.
+
+        Args:
+            value (float): The observed value.
+            *labels (str): The label values, in the order of `label_names`.
+        """
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # One count per bucket, then +Inf, then the sum of the observations.
+                series = self._series[labels] = [0.0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        """
+        Renders the histogram in the Prometheus text format.
+
+        Returns:
+            List[str]: The lines of the metric.
+        """
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        bounds = [str(bucket) for bucket in self.buckets] + ["+Inf"]
+        with self._lock:
+            series = sorted((labels, list(values)) for labels, values in self._series.items())
+        for labels, values in series:
+            cumulative = 0.0
+            for bound, count in zip(bounds, values[:-1]):
+                cumulative += count
+                bucket_labels = format_labels(self.label_names + ("le",), labels + (bound,))
+                lines.append(f"{self.name}_bucket{bucket_labels} {int(cumulative)}")
+            label_text = format_labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{label_text} {values[-1]}")
+            lines.append(f"{self.name}_count{label_text} {int(cumulative)}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name: str, help: str, label_names: Sequence[str],
+                 collect: Callable[[], Dict[Tuple[str, ...], float]]) -> None:
+        """
+        Initializes a Prometheus gauge, whose values are collected when rendered.
+
+        Args:
+            name (str): The metric name.
+            help (str): The metric description.
+            label_names (Sequence[str]): The names of the metric labels.
+            collect (Callable): Returns the value of each label set.
+        """
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        """
+        Renders the gauge in the Prometheus text format.
+
+        Returns:
+            List[str]: The lines of the metric.
+        """
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for labels, value in sorted(self.collect().items()):
+            lines.append(f"{self.name}{format_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+def format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    """
+    Formats a label set in the Prometheus text format.
+
+    Args:
+        names (Sequence[str]): The label names.
+        values (Sequence[str]): The label values.
+
+    Returns:
+        str: The label set, e.g. `{stage="derivation",currency="BTC"}`.
+    """
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+# The currency label values of the stage metrics. Any other symbol is recorded as
+# "other", so that arbitrary request input cannot grow the number of series.
+CURRENCIES = ("BTC", "ETH", "TRO")
+
+
+def currency_label(currency: str) -> str:
+    """
+    Returns the label value a cryptocurrency symbol is recorded under.
+
+    Args:
+        currency (str): The cryptocurrency symbol.
+
+    Returns:
+        str: The symbol if known, otherwise "other".
+    """
+    return currency if currency in CURRENCIES else "other"
+
+
+STAGE_SECONDS = Histogram(
+    "blockchain_stage_duration_seconds",
+    "Latency of the address generation stages.",
+    ("stage", "currency"),
+)
+STAGE_ERRORS = Counter(
+    "blockchain_stage_errors_total",
+    "Failures of the address generation stages.",
+    ("stage", "currency"),
+)
+REQUEST_SECONDS = Histogram(
+    "blockchain_http_request_duration_seconds",
+    "Latency of the HTTP requests.",
+    ("route", "method", "status"),
+)
+DB_QUERY_SECONDS = Histogram(
+    "blockchain_db_query_duration_seconds",
+    "Latency of the database queries, by primary or replica target.",
+    ("target", "operation"),
+)
+
+REGISTRY = [STAGE_SECONDS, STAGE_ERRORS, REQUEST_SECONDS, DB_QUERY_SECONDS]
+
+
+def register(metric: Gauge) -> Gauge:
+    """
+    Adds a metric to those rendered by `render`.
+
+    Args:
+        metric (Gauge): The metric.
+
+    Returns:
+        Gauge: The same metric.
+    """
+    REGISTRY.append(metric)
+    return metric
+
+
+@contextmanager
+def stage_timer(stage: str, currency: str) -> Iterator[None]:
+    """
+    Records the latency of a generation stage, and counts its failures.
+
+    Args:
+        stage (str): The stage, e.g. "key_recovery", "derivation" or "db_insert".
+        currency (str): The cryptocurrency symbol, recorded through `currency_label`.
+    """
+    currency = currency_label(currency)
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage, currency)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage, currency)
+
+
+def render() -> str:
+    """
+    Renders every metric in the Prometheus text exposition format.
+
+    Returns:
+        str: The metrics.
+    """
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
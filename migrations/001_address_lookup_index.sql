@@ -0,0 +1,4 @@
+-- Index on the address column of crypto_address, queried by the address lookup,
+-- the batch validation and the write-behind replay (DbCursor.find_address and
+-- find_addresses). SqliteCursor creates it itself.
+CREATE INDEX idx_crypto_address_address ON crypto_address (address);
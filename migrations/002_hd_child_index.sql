@@ -0,0 +1,7 @@
+-- Counter of the next HD child index of each cryptocurrency, from which processes
+-- reserve blocks of HD_INDEX_BLOCK_SIZE indexes (DbCursor.reserve_child_indexes).
+-- SqliteCursor creates it itself.
+CREATE TABLE hd_child_index (
+    crypto_currency VARCHAR(8) PRIMARY KEY,
+    next_index BIGINT NOT NULL
+);
@@ -0,0 +1,181 @@
+import os
+import re
+import hmac
+import time
+import random
+import cProfile
+import threading
+from typing import Dict, List, Optional, Tuple
+from settings import load_settings
+
+load_settings()
+
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0.0))
+PROFILE_ADMIN_TOKEN = os.environ.get("PROFILE_ADMIN_TOKEN", "")
+PROFILE_HEADER = "X-Profile-Token"
+PROFILE_KEEP = int(os.environ.get("PROFILE_KEEP", 100))
+
+PROFILE_NAME = re.compile(r"^[0-9]+-[A-Z]+-[A-Za-z0-9_.-]*\.prof$")
+
+
+class RequestProfiler:
+    def __init__(
+        self,
+        directory: str = PROFILE_DIR,
+        sample_rate: float = PROFILE_SAMPLE_RATE,
+        admin_token: str = PROFILE_ADMIN_TOKEN,
+        keep: int = PROFILE_KEEP,
+    ) -> None:
+        """
+        Initializes a RequestProfiler object, which profiles the requests carrying the
+        admin token in the PROFILE_HEADER header, and a sampled fraction of the others,
+        with cProfile. Each profile is saved in `directory` in the pstats format, read
+        by flameprof, snakeviz or `python -m pstats`, and only the `keep` most recent
+        ones are kept. Profiling is off while the token is empty and the rate is 0.
+
+        Args:
+            directory (str, optional): The profile directory. Defaults to PROFILE_DIR.
+            sample_rate (float, optional): The fraction of requests profiled without
+                the header. Defaults to PROFILE_SAMPLE_RATE.
+            admin_token (str, optional): The token that requests a profile. Defaults
+                to PROFILE_ADMIN_TOKEN.
+            keep (int, optional): The number of profiles kept. Defaults to
+                PROFILE_KEEP.
+        """
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.admin_token = admin_token
+        self.keep = keep
+        self.saved = 0
+        self.skipped = 0
+        self._lock = threading.Lock()
+
+    def is_admin(self, token: Optional[str]) -> bool:
+        """
+        Checks a token against the admin token, in constant time.
+
+        Args:
+            token (str, optional): The token sent by the client.
+
+        Returns:
+            bool: True if an admin token is set and matches.
+        """
+        return bool(self.admin_token and token) and hmac.compare_digest(
+            token.encode(), self.admin_token.encode()
+        )
+
+    def check_access(self, token: Optional[str]) -> Optional[Tuple[Dict[str, str], int]]:
+        """
+        Decides whether a client may list and download the saved profiles, which
+        requires the admin token. Without an admin token, the profiles are not served
+        at all, as if the routes did not exist.
+
+        Args:
+            token (str, optional): The value of the PROFILE_HEADER header.
+
+        Returns:
+            tuple: The JSON error body and status code, or None if access is granted.
+        """
+        if not self.admin_token:
+            return {"error": "Not found"}, 404
+        if not self.is_admin(token):
+            return {"error": "Invalid profile token"}, 403
+        return None
+
+    def should_profile(self, token: Optional[str]) -> bool:
+        """
+        Decides whether to profile a request.
+
+        Args:
+            token (str, optional): The value of the PROFILE_HEADER header.
+
+        Returns:
+            bool: True if the token matches, or if the request is sampled.
+        """
+        return self.is_admin(token) or (
+            self.sample_rate > 0 and random.random() < self.sample_rate
+        )
+
+    def start(self) -> Optional[cProfile.Profile]:
+        """
+        Starts profiling the current thread.
+
+        Returns:
+            cProfile.Profile: The running profiler, or None if another profiler is
+                already active, as on Python 3.12+ where only one can run at a time.
+        """
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            self.skipped += 1
+            return None
+        return profile
+
+    def finish(self, profile: cProfile.Profile, method: str, route: str, elapsed: float) -> str:
+        """
+        Stops a profiler and saves its profile, then removes the oldest profiles
+        beyond `keep`.
+
+        Args:
+            profile (cProfile.Profile): The running profiler.
+            method (str): The HTTP method of the request.
+            route (str): The route template of the request.
+            elapsed (float): The duration of the request in seconds.
+
+        Returns:
+            str: The name of the saved profile.
+        """
+        profile.disable()
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_")
+        name = f"{time.time_ns()}-{method.upper()}-{slug}-{elapsed * 1e3:.1f}ms.prof"
+        os.makedirs(self.directory, exist_ok=True)
+        profile.dump_stats(os.path.join(self.directory, name))
+        with self._lock:
+            self.saved += 1
+            for old in self.list()[self.keep:]:
+                try:
+                    os.remove(os.path.join(self.directory, old["name"]))
+                except FileNotFoundError:
+                    pass
+        return name
+
+    def list(self) -> List[Dict[str, object]]:
+        """
+        Lists the saved profiles, most recent first.
+
+        Returns:
+            List[dict]: The name, size in bytes and creation time of each profile.
+        """
+        if not os.path.isdir(self.directory):
+            return []
+        profiles = []
+        for name in os.listdir(self.directory):
+            if not PROFILE_NAME.match(name):
+                continue
+            try:
+                size = os.path.getsize(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            profiles.append({
+                "name": name,
+                "bytes": size,
+                "created": int(name.split("-", 1)[0]) / 1e9,
+            })
+        return sorted(profiles, key=lambda profile: profile["created"], reverse=True)
+
+    def path(self, name: str) -> Optional[str]:
+        """
+        Returns the path of a saved profile.
+
+        Args:
+            name (str): The profile name, as listed.
+
+        Returns:
+            str: The path, or None if no such profile is saved.
+        """
+        if not PROFILE_NAME.match(name):
+            return None
+        path = os.path.join(self.directory, name)
+        return path if os.path.isfile(path) else None
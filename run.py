@@ -1,17 +1,96 @@
 import os
-from flask import Flask, jsonify, request
-from dotenv import load_dotenv
+import json
+import time
+import metrics
+import profiling
+import api_routes
+from flask import Flask, Response, g, request, send_file
 from controller import (
-    generate_address_to_crypto,
-    list_addresses,
+    generate_addresses_to_crypto,
+    issue_address,
+    list_addresses_page_response,
+    export_addresses,
+    parse_export_query,
+    stream_addresses,
     retrieve_address,
-    persist_address,
+    lookup_address,
+    persist_addresses,
+    get_stats,
+    parse_batch_request,
+    parse_validate_request,
+    validate_addresses,
+    parse_list_query,
+    check_readiness,
+    warm_up,
+    WARM_UP_ON_START,
 )
 from flask_restx import Api, Resource
-
-load_dotenv()
 app = Flask(__name__)
-api = Api(app, title="Blockchain API", version="1.0", prefix="/api-blockchain")
+api = Api(app, title="Blockchain API", version="1.0", prefix=api_routes.PREFIX)
+profiler = profiling.RequestProfiler()
+
+
+def handle_request_error(error):
+    """
+    Answers the errors of the client raised past the route handlers, with the status
+    asgi.py answers them with.
+
+    Args:
+        error (Exception): The error.
+
+    Returns:
+        tuple: The JSON error body and the status code.
+    """
+    body, status = api_routes.error_response(error)
+    # flask_restx sends the `data` of an error as is, rather than adding a "message".
+    error.data = dict(body)
+    return body, status
+
+
+for error_type, _ in api_routes.ERROR_STATUSES:
+    api.errorhandler(error_type)(handle_request_error)
+
+
+@app.before_request
+def start_request_timer():
+    """
+    Stores the start time of the request, to record its latency, and starts
+    profiling it when requested by the admin header or sampled.
+    """
+    g.request_start = time.perf_counter()
+    rule = request.url_rule.rule if request.url_rule else ""
+    if rule and not rule.startswith(api_routes.PREFIX + "/profiles") and profiler.should_profile(
+        request.headers.get(profiling.PROFILE_HEADER)
+    ):
+        g.profile = profiler.start()
+
+
+@app.after_request
+def record_request_latency(response):
+    """
+    Records the latency of the request, labelled by route template rather than by
+    path so that the number of series stays bounded, and saves its profile, named in
+    the X-Profile-Id header, if profiled.
+
+    Args:
+        response (Response): The response being sent.
+
+    Returns:
+        Response: The same response.
+    """
+    start = g.get("request_start")
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        elapsed = time.perf_counter() - start
+        metrics.REQUEST_SECONDS.observe(
+            elapsed, route, request.method, str(response.status_code)
+        )
+        profile = g.pop("profile", None)
+        if profile is not None:
+            response.headers["X-Profile-Id"] = profiler.finish(
+                profile, request.method, route, elapsed
+            )
+    return response
 
 
 @api.route("/")
@@ -31,7 +110,8 @@ class GenerateAddress(Resource):
     def post(self):
         """
         Generates an address for the given cryptocurrency, according to the proper method
-        applied in each case.
+        applied in each case, or takes a pre-generated one from the address pool when
+        it is enabled.
 
         Request Body:
             crypto_currency (str): The cryptocurrency symbol.
@@ -39,27 +119,126 @@ class GenerateAddress(Resource):
         Returns:
             str: The generated address.
         """
-        data = request.get_json()
+        data = api_routes.json_object(request.get_json())
         crypto_currency = data.get("crypto_currency")
         if crypto_currency:
-            address = generate_address_to_crypto(crypto_currency)
-            persist_address(address, crypto_currency)
+            address = issue_address(crypto_currency)
             return {"address": address}, 201
         else:
             return {"error": "Missing crypto_currency parameter"}, 400
 
 
+@api.route("/generate/batch")
+class GenerateAddressBatch(Resource):
+    def post(self):
+        """
+        Generates a batch of addresses for the given cryptocurrency and persists them
+        in a single transaction.
+
+        Request Body:
+            crypto_currency (str): The cryptocurrency symbol.
+            count (int): The number of addresses to generate, up to MAX_BATCH_SIZE.
+
+        Returns:
+            list: The generated addresses.
+        """
+        try:
+            crypto_currency, count = parse_batch_request(api_routes.json_object(request.get_json()))
+        except ValueError as error:
+            return {"error": str(error)}, 400
+        addresses = generate_addresses_to_crypto(crypto_currency, count)
+        persist_addresses(addresses, crypto_currency)
+        return {"addresses": addresses}, 201
+
+
+@api.route("/validate/batch")
+class ValidateAddressBatch(Resource):
+    def post(self):
+        """
+        Validates a batch of addresses against the format of their cryptocurrency, and
+        checks which ones are stored.
+
+        Request Body:
+            addresses (list): The addresses, up to MAX_VALIDATE_BATCH.
+            crypto_currency (str, optional): The expected cryptocurrency symbol, or
+                none to detect it from each address.
+
+        Returns:
+            dict: The result of each address, and the valid, invalid and stored counts.
+        """
+        try:
+            addresses, crypto_currency = parse_validate_request(
+                api_routes.json_object(request.get_json())
+            )
+        except ValueError as error:
+            return {"error": str(error)}, 400
+        return validate_addresses(addresses, crypto_currency)
+
+
 @api.route("/list")
 class ListAddresses(Resource):
     def get(self):
         """
-        Lists all addresses currently stored in the database.
+        Lists the addresses currently stored in the database, one page at a time, or
+        streams all of them as NDJSON.
+
+        Query Parameters:
+            after_id (int, optional): Only addresses with a greater ID are listed.
+            limit (int, optional): Page size, up to MAX_LIST_PAGE_SIZE.
+            format (str, optional): "ndjson" streams every address after `after_id`,
+                one JSON object per line. Also selected by an
+                "Accept: application/x-ndjson" header.
+
+        Headers:
+            If-None-Match (str, optional): The ETag of the client copy of the page,
+                answered with 304 Not Modified while the table is unchanged.
+
+        Returns:
+            str: The page of addresses and the `next_after_id` cursor of the next page,
+                with its ETag, or the NDJSON stream.
+        """
+        try:
+            after_id, limit = parse_list_query(request.args)
+        except ValueError as error:
+            return {"error": str(error)}, 400
+
+        ndjson = "application/x-ndjson"
+        if request.args.get("format") == "ndjson" or request.accept_mimetypes.best == ndjson:
+            lines = (
+                json.dumps({"id": id, "address": address}) + "\n"
+                for id, address in stream_addresses(after_id)
+            )
+            return Response(lines, mimetype=ndjson)
+
+        body, etag = list_addresses_page_response(
+            after_id, limit, request.headers.get("If-None-Match")
+        )
+        if body is None:
+            return Response(status=304, headers={"ETag": etag})
+        return Response(body, content_type="application/json", headers={"ETag": etag})
+
+
+@api.route("/export")
+class ExportAddresses(Resource):
+    def get(self):
+        """
+        Streams the stored addresses, with their ID and cryptocurrency, as an export
+        file read and encoded in chunks.
+
+        Query Parameters:
+            format (str, optional): "csv" (default), or "columnar" for the compact
+                columnar format.
+            since_id (int, optional): Only rows with a greater ID are exported.
 
         Returns:
-            str: The list of addresses.
+            Response: The streamed export file.
         """
-        addresses = list_addresses()
-        return jsonify({"addresses": addresses})
+        try:
+            format, since_id = parse_export_query(request.args)
+        except ValueError as error:
+            return {"error": str(error)}, 400
+        chunks, content_type = export_addresses(format, since_id)
+        return Response(chunks, content_type=content_type)
 
 
 @api.route("/addresses/<address_id>")
@@ -83,6 +262,110 @@ class RetrieveAddress(Resource):
             return {"error": "Address Id not found"}, 404
 
 
+@api.route("/addresses/lookup/<address>")
+class LookupAddress(Resource):
+    def get(self, address):
+        """
+        Checks whether an address is stored in the database, rejecting unknown
+        addresses through an in-memory Bloom filter.
+
+        Args:
+            address (str): The address.
+
+        Returns:
+            dict: The ID, address and cryptocurrency of the stored address.
+        """
+        row = lookup_address(address)
+        if row:
+            return row
+        else:
+            return {"error": "Address not found"}, 404
+
+
+@api.route("/stats")
+class Stats(Resource):
+    def get(self):
+        """
+        Exposes the runtime counters of the service caches.
+
+        Returns:
+            dict: The counters, grouped by component.
+        """
+        return get_stats()
+
+
+@api.route("/ready")
+class Ready(Resource):
+    def get(self):
+        """
+        Readiness probe: answers 200 once the warm-up, if started, has finished and
+        the database answers, and 503 otherwise.
+
+        Returns:
+            dict: The state of each check.
+        """
+        ready, checks = check_readiness()
+        return checks, 200 if ready else 503
+
+
+@api.route("/metrics")
+class Metrics(Resource):
+    def get(self):
+        """
+        Exposes the latency histograms of the generation stages and of the routes, in
+        the Prometheus text format.
+
+        Returns:
+            str: The metrics.
+        """
+        return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
+@api.route("/profiles")
+class Profiles(Resource):
+    def get(self):
+        """
+        Lists the saved request profiles, most recent first. Requires the admin token
+        in the X-Profile-Token header, and answers 404 when PROFILE_ADMIN_TOKEN is not
+        set.
+
+        Returns:
+            dict: The name, size and creation time of each profile.
+        """
+        denied = profiler.check_access(request.headers.get(profiling.PROFILE_HEADER))
+        if denied:
+            return denied
+        return {"profiles": profiler.list()}
+
+
+@api.route("/profiles/<name>")
+class DownloadProfile(Resource):
+    def get(self, name):
+        """
+        Downloads a saved request profile, in the pstats format. Requires the admin
+        token in the X-Profile-Token header, and answers 404 when PROFILE_ADMIN_TOKEN
+        is not set.
+
+        Args:
+            name (str): The profile name.
+
+        Returns:
+            Response: The profile file.
+        """
+        denied = profiler.check_access(request.headers.get(profiling.PROFILE_HEADER))
+        if denied:
+            return denied
+        path = profiler.path(name)
+        if path is None:
+            return {"error": "Profile not found"}, 404
+        return send_file(
+            os.path.abspath(path), mimetype="application/octet-stream",
+            as_attachment=True, download_name=name,
+        )
+
+
 if __name__ == "__main__":
     port = int(os.environ.get("API_PORT"))
+    if WARM_UP_ON_START:
+        warm_up()
     app.run(port=port, debug=True)
@@ -0,0 +1,18 @@
+import threading
+from dotenv import load_dotenv
+
+_loaded = False
+_lock = threading.Lock()
+
+
+def load_settings() -> None:
+    """
+    Loads the variables of the .env file into the environment, once per process. Every
+    module reading its settings from the environment at import calls it first, so the
+    settings do not depend on the import order.
+    """
+    global _loaded
+    with _lock:
+        if not _loaded:
+            load_dotenv()
+            _loaded = True
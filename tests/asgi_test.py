@@ -0,0 +1,485 @@
+import io
+import json
+import asyncio
+import pytest
+import asgi
+import export
+import profiling
+import api_routes
+from unittest import mock
+from typing import Any, Dict, Optional, Tuple
+from benchmarks.standins import use_standins
+
+
+def call(method: str, path: str, body: Optional[Any] = None, query: str = "",
+         headers: Optional[Dict[str, str]] = None) -> Tuple[int, Dict[str, str], bytes]:
+    """
+    Sends a request to the ASGI app in-process.
+
+    Args:
+        method (str): The HTTP method.
+        path (str): The request path.
+        body (Any, optional): The JSON request body. Defaults to None.
+        query (str, optional): The query string. Defaults to "".
+        headers (dict, optional): The request headers. Defaults to None.
+
+    Returns:
+        tuple: The status code, the response headers and the response body.
+    """
+    messages = []
+    scope = {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "query_string": query.encode(),
+        "headers": [(k.encode(), v.encode()) for k, v in (headers or {}).items()],
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": json.dumps(body).encode() if body else b""}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(asgi.app(scope, receive, send))
+    response_headers = {k.decode(): v.decode() for k, v in messages[0]["headers"]}
+    return messages[0]["status"], response_headers, b"".join(
+        message.get("body", b"") for message in messages[1:]
+    )
+
+
+@pytest.fixture
+def standins():
+    """
+    Fixture pointing the service at a fake S3 bucket and an embedded database.
+
+    Yields:
+        dict: The fake S3 client and the embedded database.
+    """
+    with use_standins() as standins:
+        yield standins
+
+
+class TestAsgiApp:
+    def test_hello_world(self, standins) -> None:
+        """
+        Test the "Hello, World!" endpoint.
+
+        Returns:
+            None
+        """
+        status, _, body = call("GET", "/api-blockchain/")
+        assert status == 200
+        assert json.loads(body) == "Hello, World!"
+
+    def test_generate_address(self, standins) -> None:
+        """
+        Test that a generated address is persisted and its key saved in the bucket.
+
+        Returns:
+            None
+        """
+        status, _, body = call("POST", "/api-blockchain/generate", {"crypto_currency": "ETH"})
+        assert status == 201
+        address = json.loads(body)["address"]
+        assert standins["db"].list_all_addresses() == [address]
+        assert standins["s3"].objects
+
+    def test_generate_address_missing_parameter(self, standins) -> None:
+        """
+        Test the generate address endpoint with a missing parameter.
+
+        Returns:
+            None
+        """
+        status, _, body = call("POST", "/api-blockchain/generate", {"other": "BTC"})
+        assert status == 400
+        assert "error" in json.loads(body)
+
+    def test_generate_address_batch(self, standins) -> None:
+        """
+        Test the batch generate address endpoint.
+
+        Returns:
+            None
+        """
+        data = {"crypto_currency": "BTC", "count": 3}
+        status, _, body = call("POST", "/api-blockchain/generate/batch", data)
+        assert status == 201
+        assert len(json.loads(body)["addresses"]) == 3
+        assert len(standins["db"].list_all_addresses()) == 3
+
+    def test_generate_deterministic_batch(self, standins) -> None:
+        """
+        Test that batches of Ethereum addresses are refused without HD derivation,
+        since they would all be the same address.
+
+        Returns:
+            None
+        """
+        with mock.patch("hd_wallet.HD_DERIVATION_ENABLED", False):
+            status, _, body = call(
+                "POST", "/api-blockchain/generate/batch", {"crypto_currency": "eth", "count": 2}
+            )
+            single = call(
+                "POST", "/api-blockchain/generate/batch", {"crypto_currency": "ETH", "count": 1}
+            )
+
+        assert status == 400
+        assert "HD derivation" in json.loads(body)["error"]
+        assert single[0] == 201
+        assert len(standins["db"].list_all_addresses()) == 1
+
+    def test_generate_unknown_currency(self, standins) -> None:
+        """
+        Test that an unknown cryptocurrency is refused before its key is recovered.
+
+        Returns:
+            None
+        """
+        with mock.patch("controller.KeyManager") as key_manager:
+            status, _, body = call("POST", "/api-blockchain/generate", {"crypto_currency": "xyz"})
+
+        assert status == 400
+        assert json.loads(body) == {"error": "Unknown crypto_currency: xyz"}
+        key_manager.assert_not_called()
+        assert not standins["db"].list_all_addresses()
+
+    def test_generate_address_batch_hd(self, standins) -> None:
+        """
+        Test that HD derivation generates distinct addresses from a single vault key.
+
+        Returns:
+            None
+        """
+        with mock.patch("hd_wallet.HD_DERIVATION_ENABLED", True):
+            status, _, body = call(
+                "POST", "/api-blockchain/generate/batch", {"crypto_currency": "ETH", "count": 3}
+            )
+            single = json.loads(call("POST", "/api-blockchain/generate",
+                                     {"crypto_currency": "ETH"})[2])["address"]
+
+        addresses = json.loads(body)["addresses"] + [single]
+        assert status == 201
+        assert len(set(addresses)) == 4
+        assert list(standins["s3"].objects) == ["keys/ETH.json"]
+
+    def test_list_addresses(self, standins) -> None:
+        """
+        Test the list addresses endpoint, paginated and streamed.
+
+        Returns:
+            None
+        """
+        standins["db"].persist_many_on_database(["a", "b", "c"], "BTC")
+
+        status, _, body = call("GET", "/api-blockchain/list", query="limit=2")
+        assert status == 200
+        assert json.loads(body) == {"addresses": ["a", "b"], "next_after_id": 2}
+
+        status, headers, body = call("GET", "/api-blockchain/list", query="format=ndjson")
+        assert status == 200
+        assert headers["content-type"] == "application/x-ndjson"
+        rows = [json.loads(line) for line in body.decode().splitlines()]
+        assert [row["address"] for row in rows] == ["a", "b", "c"]
+
+    def test_stream_failure_aborts_the_response(self, standins) -> None:
+        """
+        Test that an error raised once a streamed response has started is raised to
+        the server, without a second response start.
+
+        Returns:
+            None
+        """
+
+        def rows():
+            yield 1, "a"
+            raise RuntimeError("connection lost")
+
+        messages = []
+        scope = {"type": "http", "method": "GET", "path": "/api-blockchain/list",
+                 "query_string": b"format=ndjson", "headers": []}
+
+        async def receive():
+            return {"type": "http.request", "body": b""}
+
+        async def send(message):
+            messages.append(message)
+
+        with mock.patch("controller.stream_addresses", return_value=rows()):
+            with pytest.raises(RuntimeError):
+                asyncio.run(asgi.app(scope, receive, send))
+
+        starts = [message for message in messages if message["type"] == "http.response.start"]
+        assert [start["status"] for start in starts] == [200]
+        assert all(message.get("more_body") for message in messages[1:])
+
+    def test_validate_batch(self, standins) -> None:
+        """
+        Test the batch validation endpoint, which reports the validity and storage of
+        each address, matching Ethereum addresses whatever their case.
+
+        Returns:
+            None
+        """
+        eth = "0x5aaeb6053f3e94c9b9a09f33669435e7ef1beaed"
+        standins["db"].persist_many_on_database([eth], "ETH")
+        addresses = ["0x5aAeb6053F3E94C9b9A09f33669435E7Ef1BeAed", "1" + "a" * 30, "bad"]
+
+        status, _, body = call("POST", "/api-blockchain/validate/batch", {"addresses": addresses})
+        result = json.loads(body)
+
+        assert status == 200
+        assert (result["valid"], result["invalid"], result["stored"]) == (2, 1, 1)
+        assert [(r["crypto_currency"], r["stored"], r["id"]) for r in result["results"]] == [
+            ("ETH", True, 1), ("BTC", False, None), (None, False, None)
+        ]
+        assert result["results"][2]["reason"] == "unknown address format"
+        for body in ({"addresses": []}, {"addresses": [1]}, {"addresses": ["a"], "crypto_currency": "XX"}):
+            assert call("POST", "/api-blockchain/validate/batch", body)[0] == 400
+
+    def test_list_conditional_get(self, standins) -> None:
+        """
+        Test that a page is tagged with an ETag, answered with 304 without touching the
+        table while unchanged, and served anew after an insert.
+
+        Returns:
+            None
+        """
+        import controller
+
+        standins["db"].persist_many_on_database(["a", "b"], "BTC")
+        status, headers, body = call("GET", "/api-blockchain/list", query="limit=10")
+        etag = headers["etag"]
+        assert (status, etag) == (200, '"2-2"')
+
+        db = standins["db"]
+        with mock.patch.object(db, "table_state", side_effect=AssertionError), mock.patch.object(
+            db, "list_addresses_page", side_effect=AssertionError
+        ):
+            status, headers, body = call(
+                "GET", "/api-blockchain/list", query="limit=10", headers={"if-none-match": etag}
+            )
+            assert (status, headers["etag"], body) == (304, etag, b"")
+            status, _, cached = call("GET", "/api-blockchain/list", query="limit=10")
+            assert cached == b'{"addresses": ["a", "b"], "next_after_id": null}\n'
+
+        controller.persist_addresses(["c"], "BTC")
+        status, headers, body = call(
+            "GET", "/api-blockchain/list", query="limit=10", headers={"if-none-match": etag}
+        )
+        assert (status, headers["etag"]) == (200, '"3-3"')
+        assert json.loads(body)["addresses"] == ["a", "b", "c"]
+
+    def test_export(self, standins) -> None:
+        """
+        Test the export endpoint, as CSV since an ID and as a columnar file.
+
+        Returns:
+            None
+        """
+        standins["db"].persist_many_on_database(["a", "b"], "BTC")
+
+        status, headers, body = call("GET", "/api-blockchain/export", query="since_id=1")
+        assert status == 200
+        assert headers["content-type"] == "text/csv"
+        assert body == b"id,address,crypto_currency\r\n2,b,BTC\r\n"
+
+        status, _, body = call("GET", "/api-blockchain/export", query="format=columnar")
+        assert list(export.read_columnar(io.BytesIO(body))) == [(1, "a", "BTC"), (2, "b", "BTC")]
+
+        assert call("GET", "/api-blockchain/export", query="format=xml")[0] == 400
+
+    def test_retrieve_address(self, standins) -> None:
+        """
+        Test the retrieve address endpoint, found and not found.
+
+        Returns:
+            None
+        """
+        standins["db"].persist_on_database("a", "BTC")
+
+        status, _, body = call("GET", "/api-blockchain/addresses/1")
+        assert status == 200
+        assert json.loads(body) == {"address": "a"}
+
+        status, _, body = call("GET", "/api-blockchain/addresses/2")
+        assert status == 404
+        assert "error" in json.loads(body)
+
+    def test_lookup_address(self, standins) -> None:
+        """
+        Test the lookup endpoint, for a stored and an unknown address.
+
+        Returns:
+            None
+        """
+        standins["db"].persist_on_database("a", "BTC")
+
+        status, _, body = call("GET", "/api-blockchain/addresses/lookup/a")
+        assert status == 200
+        assert json.loads(body) == {"id": 1, "address": "a", "crypto_currency": "BTC"}
+
+        status, _, body = call("GET", "/api-blockchain/addresses/lookup/b")
+        assert status == 404
+        assert "error" in json.loads(body)
+
+    def test_ready(self, standins) -> None:
+        """
+        Test the readiness endpoint once the database answers.
+
+        Returns:
+            None
+        """
+        status, _, body = call("GET", "/api-blockchain/ready")
+        assert status == 200
+        assert json.loads(body)["database"] == "ok"
+
+    def test_unknown_route(self, standins) -> None:
+        """
+        Test that unknown paths and methods are rejected.
+
+        Returns:
+            None
+        """
+        assert call("GET", "/api-blockchain/unknown")[0] == 404
+        assert call("DELETE", "/api-blockchain/list")[0] == 405
+
+    def test_metrics(self, standins) -> None:
+        """
+        Test that the metrics endpoint reports the generation stages and the routes in
+        the Prometheus text format.
+
+        Returns:
+            None
+        """
+        call("POST", "/api-blockchain/generate", {"crypto_currency": "BTC"})
+        call("GET", "/api-blockchain/addresses/1")
+
+        status, headers, body = call("GET", "/api-blockchain/metrics")
+        text = body.decode()
+
+        assert status == 200
+        assert headers["content-type"].startswith("text/plain")
+        for stage in ("key_recovery", "derivation", "db_insert"):
+            assert f'blockchain_stage_duration_seconds_count{{stage="{stage}",currency="BTC"}}' in text
+        assert 'route="/api-blockchain/addresses/<address_id>",method="GET",status="200"' in text
+
+
+class TestRouteParity:
+    def test_both_servers_serve_the_shared_routes(self) -> None:
+        """
+        Test that run.py and asgi.py serve exactly the routes of api_routes.
+
+        Returns:
+            None
+        """
+        import run
+
+        flask_routes = {
+            (method, rule.rule[len(api_routes.PREFIX):])
+            for rule in run.app.url_map.iter_rules()
+            # The API documentation routes of flask_restx are Flask-only.
+            if rule.rule.startswith(api_routes.PREFIX)
+            and rule.endpoint not in ("specs", "root")
+            for method in rule.methods - {"HEAD", "OPTIONS"}
+        }
+        asgi_routes = {
+            (method, asgi.route_label(pattern)[len(api_routes.PREFIX):])
+            for method, pattern, _ in asgi.ROUTES
+        }
+
+        assert flask_routes == set(api_routes.ROUTES)
+        assert asgi_routes == set(api_routes.ROUTES)
+
+    def test_both_servers_refuse_duplicate_addresses(self, standins) -> None:
+        """
+        Test that both servers answer 409 when the registry keeps finding the
+        generated address known.
+
+        Returns:
+            None
+        """
+        import run
+
+        path = api_routes.PREFIX + "/generate"
+        body = {"crypto_currency": "ETH"}
+        with mock.patch("address_registry.ADDRESS_REGISTRY_ENABLED", True), mock.patch(
+            "controller.CurrenciesEncrypter"
+        ) as encrypter:
+            encrypter.return_value.generate_address.return_value = "0x" + "1" * 40
+            assert call("POST", path, body)[0] == 201
+            status, _, data = call("POST", path, body)
+            flask = run.app.test_client().post(path, json=body)
+
+        assert (status, flask.status_code) == (409, 409)
+        assert json.loads(data) == flask.json
+        assert "known ETH addresses" in flask.json["error"]
+
+    def test_both_servers_answer_alike(self, standins, tmp_path) -> None:
+        """
+        Test that both servers answer the same requests, valid or not, on every route,
+        with the same status, and the same body when it is deterministic.
+
+        Args:
+            tmp_path: The pytest temporary directory.
+
+        Returns:
+            None
+        """
+        import run
+
+        prefix = api_routes.PREFIX
+        standins["db"].persist_on_database("stored_address", "BTC")
+        profiler = profiling.RequestProfiler(str(tmp_path), admin_token="secret")
+        token = {"X-Profile-Token": "secret"}
+        profile = profiler.start() or pytest.skip("Another profiler is active")
+        name = profiler.finish(profile, "GET", "/", 0.0)
+        requests = [
+            ("GET", "/", None, "", {}),
+            ("POST", "/generate", {"crypto_currency": "BTC"}, "", {}),
+            ("POST", "/generate", {"other": "BTC"}, "", {}),
+            ("POST", "/generate", ["BTC"], "", {}),
+            ("POST", "/generate", {"crypto_currency": "XYZ"}, "", {}),
+            ("POST", "/generate/batch", {"crypto_currency": "XYZ", "count": 1}, "", {}),
+            ("POST", "/generate/batch", {"crypto_currency": "BTC", "count": 2}, "", {}),
+            ("POST", "/generate/batch", {"crypto_currency": "BTC", "count": 0}, "", {}),
+            ("POST", "/validate/batch", {"addresses": ["stored_address", "bad"]}, "", {}),
+            ("POST", "/validate/batch", {"addresses": []}, "", {}),
+            ("GET", "/list", None, "limit=1", {}),
+            ("GET", "/list", None, "limit=x", {}),
+            ("GET", "/export", None, "since_id=1", {}),
+            ("GET", "/export", None, "format=xml", {}),
+            ("GET", "/addresses/1", None, "", {}),
+            ("GET", "/addresses/999", None, "", {}),
+            ("GET", "/addresses/lookup/stored_address", None, "", {}),
+            ("GET", "/addresses/lookup/unknown", None, "", {}),
+            ("GET", "/stats", None, "", {}),
+            ("GET", "/ready", None, "", {}),
+            ("GET", "/metrics", None, "", {}),
+            ("GET", "/profiles", None, "", {}),
+            ("GET", "/profiles", None, "", token),
+            ("GET", f"/profiles/{name}", None, "", token),
+            ("GET", "/profiles/0-GET-x.prof", None, "", token),
+            ("GET", "/unknown", None, "", {}),
+            ("POST", "/list", {}, "", {}),
+        ]
+        deterministic = ("/", "/addresses/1", "/addresses/999", "/addresses/lookup/unknown")
+
+        client = run.app.test_client()
+        with mock.patch.object(run, "profiler", profiler), mock.patch.object(
+            asgi, "profiler", profiler
+        ):
+            for method, path, body, query, headers in requests:
+                flask = client.open(
+                    prefix + path, method=method, json=body, query_string=query, headers=headers
+                )
+                status, response_headers, data = call(method, prefix + path, body, query, headers)
+
+                assert (method, path, query, status) == (method, path, query, flask.status_code)
+                if status == 200 and path.startswith("/profiles/"):
+                    assert data == flask.data
+                elif path in deterministic or (
+                    status >= 400 and flask.is_json and "error" in flask.json
+                ):
+                    assert json.loads(data) == flask.json
@@ -1,11 +1,21 @@
 import os
 import pytest
 from typing import Dict
-from dotenv import load_dotenv
 from cryptography import KeyManager, CurrenciesEncrypter
 from db_mysql import DbCursor
+from key_vault import key_cache
+from settings import load_settings
 
-load_dotenv()
+load_settings()
+
+@pytest.fixture(autouse=True)
+def reset_key_cache() -> None:
+    """
+    Fixture clearing the process-wide key cache, so tests do not share cached keys.
+    """
+    key_cache.invalidate()
+    yield
+    key_cache.invalidate()
 
 @pytest.fixture
 def key_manager(request) -> Dict[str, KeyManager]:
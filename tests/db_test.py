@@ -1,4 +1,13 @@
+import time
+import threading
+import pytest
+import metrics
+import db_connector
+from unittest import mock
 from db_mysql import DbCursor
+from db_replicated import ReplicatedBackend
+from db_sharded import ShardedBackend
+from db_sqlite import SqliteCursor
 
 
 class TestDatabaseTasks:
@@ -15,12 +24,35 @@ class TestDatabaseTasks:
         address = "example_address"
         crypto = "BTC"
         db.persist_on_database(address, crypto)
-        db.cursor.execute(
-            "SELECT address FROM crypto_address WHERE address = %s", (address,)
-        )
-        result = db.cursor.fetchone()
+        with db.connection() as mydb:
+            cursor = mydb.cursor()
+            cursor.execute(
+                "SELECT address FROM crypto_address WHERE address = %s", (address,)
+            )
+            result = cursor.fetchone()
         assert result[0] == address
 
+    def test_persist_many_on_database(self, db: DbCursor) -> None:
+        """
+        Test the `persist_many_on_database` method of DbCursor.
+
+        Args:
+            db (DbCursor): DbCursor instance.
+
+        Returns:
+            None
+        """
+        addresses = ["batch_address_1", "batch_address_2", "batch_address_3"]
+        db.persist_many_on_database(addresses, "ETH")
+        with db.connection() as mydb:
+            cursor = mydb.cursor()
+            cursor.execute(
+                "SELECT address FROM crypto_address WHERE address IN (%s, %s, %s)",
+                addresses,
+            )
+            result = cursor.fetchall()
+        assert sorted(row[0] for row in result) == addresses
+
     def test_list_all_addresses(self, db: DbCursor) -> None:
         """
         Test the `list_all_addresses` method of DbCursor.
@@ -36,6 +68,51 @@ class TestDatabaseTasks:
         assert isinstance(addresses, list)
         assert len(addresses) > 1
 
+    def test_list_addresses_page(self, db: DbCursor) -> None:
+        """
+        Test the `list_addresses_page` method of DbCursor.
+
+        Args:
+            db (DbCursor): DbCursor instance.
+
+        Returns:
+            None
+        """
+        first_page = db.list_addresses_page(after_id=0, limit=1)
+        second_page = db.list_addresses_page(after_id=first_page[0][0], limit=1)
+
+        assert len(first_page) == 1
+        assert second_page[0][0] > first_page[0][0]
+
+    def test_iter_addresses(self, db: DbCursor) -> None:
+        """
+        Test the `iter_addresses` method of DbCursor.
+
+        Args:
+            db (DbCursor): DbCursor instance.
+
+        Returns:
+            None
+        """
+        rows = list(db.iter_addresses(chunk_size=1))
+
+        assert [address for _, address in rows] == db.list_all_addresses()
+
+    def test_recent_addresses(self, db: DbCursor) -> None:
+        """
+        Test the `recent_addresses` method of DbCursor.
+
+        Args:
+            db (DbCursor): DbCursor instance.
+
+        Returns:
+            None
+        """
+        rows = db.recent_addresses(2)
+
+        assert len(rows) == 2
+        assert rows[0][0] > rows[1][0]
+
     def test_retrieve_address(self, db: DbCursor) -> None:
         """
         Test the `retrieve_address` method of DbCursor.
@@ -49,4 +126,659 @@ class TestDatabaseTasks:
         address_id = 1
         address = db.retrieve_address(address_id)
 
-        assert isinstance(address, str)
\ No newline at end of file
+        assert isinstance(address, str)
+
+    def test_find_address(self, db: DbCursor) -> None:
+        """
+        Test the `find_address` method of DbCursor.
+
+        Args:
+            db (DbCursor): DbCursor instance.
+
+        Returns:
+            None
+        """
+        db.persist_on_database("lookup_address", "TRO")
+
+        id, crypto = db.find_address("lookup_address")
+
+        assert db.retrieve_address(id) == "lookup_address"
+        assert crypto == "TRO"
+        assert db.find_address("unknown_address") is None
+
+    def test_find_addresses(self, db: DbCursor) -> None:
+        """
+        Test the `find_addresses` method of DbCursor.
+
+        Args:
+            db (DbCursor): DbCursor instance.
+
+        Returns:
+            None
+        """
+        db.persist_many_on_database(["batch_lookup_1", "batch_lookup_2"], "BTC")
+
+        found = db.find_addresses(["batch_lookup_1", "batch_lookup_2", "unknown_address"])
+
+        assert sorted(found) == ["batch_lookup_1", "batch_lookup_2"]
+        assert found["batch_lookup_2"][1] == "BTC"
+        assert db.find_addresses([]) == {}
+
+    def test_table_state(self, db: DbCursor) -> None:
+        """
+        Test the `table_state` method of DbCursor.
+
+        Args:
+            db (DbCursor): DbCursor instance.
+
+        Returns:
+            None
+        """
+        max_id, count = db.table_state()
+        db.persist_on_database("state_address", "BTC")
+
+        new_max_id, new_count = db.table_state()
+
+        assert new_max_id > max_id
+        assert new_count == count + 1
+
+    def test_reserve_child_indexes(self, db: DbCursor) -> None:
+        """
+        Test the `reserve_child_indexes` method of DbCursor.
+
+        Args:
+            db (DbCursor): DbCursor instance.
+
+        Returns:
+            None
+        """
+        first = db.reserve_child_indexes("BTC", 10)
+
+        assert db.reserve_child_indexes("BTC", 1) == first + 10
+
+    def test_connection_is_reused(self, db: DbCursor) -> None:
+        """
+        Test that consecutive queries share a single pooled connection.
+
+        Args:
+            db (DbCursor): DbCursor instance.
+
+        Returns:
+            None
+        """
+        db.retrieve_address(1)
+        db.list_all_addresses()
+        stats = db.pool_stats()
+
+        assert stats["open"] == 1
+        assert stats["idle"] == 1
+        assert stats["in_use"] == 0
+
+
+class TestSqliteBackend:
+    @pytest.fixture
+    def sqlite_db(self, tmp_path) -> SqliteCursor:
+        """
+        Fixture for a SqliteCursor on a temporary database file.
+
+        Args:
+            tmp_path: The pytest temporary directory.
+
+        Returns:
+            SqliteCursor: SqliteCursor object.
+        """
+        return SqliteCursor(str(tmp_path / "test.db"))
+
+    def test_persist_and_read(self, sqlite_db: SqliteCursor) -> None:
+        """
+        Test persisting addresses and reading them back.
+
+        Args:
+            sqlite_db (SqliteCursor): SqliteCursor instance.
+
+        Returns:
+            None
+        """
+        sqlite_db.persist_on_database("first", "BTC")
+        sqlite_db.persist_many_on_database(["second", "third"], "ETH")
+
+        assert sqlite_db.list_all_addresses() == ["first", "second", "third"]
+        assert sqlite_db.list_addresses_page(after_id=1, limit=1) == [(2, "second")]
+        assert list(sqlite_db.iter_addresses(chunk_size=2)) == [
+            (1, "first"), (2, "second"), (3, "third")
+        ]
+        assert sqlite_db.recent_addresses(1) == [(3, "third")]
+        assert sqlite_db.retrieve_address(2) == "second"
+        assert sqlite_db.retrieve_address(4) is None
+
+    def test_iter_address_rows(self, sqlite_db: SqliteCursor) -> None:
+        """
+        Test streaming the full rows, across pages.
+
+        Args:
+            sqlite_db (SqliteCursor): SqliteCursor instance.
+
+        Returns:
+            None
+        """
+        sqlite_db.persist_many_on_database(["first", "second", "third"], "TRO")
+
+        assert list(sqlite_db.iter_address_rows(after_id=1, chunk_size=1)) == [
+            (2, "second", "TRO"), (3, "third", "TRO")
+        ]
+
+    def test_reserve_child_indexes(self, sqlite_db: SqliteCursor) -> None:
+        """
+        Test that child indexes are reserved in consecutive blocks per cryptocurrency.
+
+        Args:
+            sqlite_db (SqliteCursor): SqliteCursor instance.
+
+        Returns:
+            None
+        """
+        assert sqlite_db.reserve_child_indexes("ETH", 5) == 0
+        assert sqlite_db.reserve_child_indexes("ETH", 1) == 5
+        assert sqlite_db.reserve_child_indexes("TRO", 2) == 0
+
+    def test_find_address(self, sqlite_db: SqliteCursor) -> None:
+        """
+        Test finding an address by value through the address index.
+
+        Args:
+            sqlite_db (SqliteCursor): SqliteCursor instance.
+
+        Returns:
+            None
+        """
+        sqlite_db.persist_many_on_database(["first", "second"], "ETH")
+
+        assert sqlite_db.find_address("second") == (2, "ETH")
+        assert sqlite_db.find_address("unknown") is None
+        plan = sqlite_db._read(
+            "EXPLAIN QUERY PLAN SELECT id FROM crypto_address WHERE address = ?", ("x",)
+        )
+        assert "idx_crypto_address_address" in str(plan)
+
+    def test_find_addresses(self, sqlite_db: SqliteCursor) -> None:
+        """
+        Test finding many addresses by value in one query, beyond the limit on the
+        number of SQL parameters.
+
+        Args:
+            sqlite_db (SqliteCursor): SqliteCursor instance.
+
+        Returns:
+            None
+        """
+        sqlite_db.persist_many_on_database(["first", "second"], "ETH")
+        addresses = ["second"] + [f"unknown_{i}" for i in range(40000)]
+
+        assert sqlite_db.find_addresses(addresses) == {"second": (2, "ETH")}
+        assert sqlite_db.find_addresses([]) == {}
+
+    def test_table_state(self, sqlite_db: SqliteCursor) -> None:
+        """
+        Test the largest ID and row count of the address table.
+
+        Args:
+            sqlite_db (SqliteCursor): SqliteCursor instance.
+
+        Returns:
+            None
+        """
+        assert sqlite_db.table_state() == (0, 0)
+        sqlite_db.persist_many_on_database(["first", "second"], "ETH")
+
+        assert sqlite_db.table_state() == (2, 2)
+
+    def test_wal_mode(self, sqlite_db: SqliteCursor) -> None:
+        """
+        Test that file databases run in WAL mode.
+
+        Args:
+            sqlite_db (SqliteCursor): SqliteCursor instance.
+
+        Returns:
+            None
+        """
+        mode = sqlite_db._writer.execute("PRAGMA journal_mode").fetchone()[0]
+        assert mode == "wal"
+
+    def test_concurrent_writes_are_group_committed(self, sqlite_db: SqliteCursor) -> None:
+        """
+        Test that concurrent writers all land, in no more commits than writes.
+
+        Args:
+            sqlite_db (SqliteCursor): SqliteCursor instance.
+
+        Returns:
+            None
+        """
+        def write(n: int) -> None:
+            for i in range(50):
+                sqlite_db.persist_on_database(f"address_{n}_{i}", "BTC")
+
+        threads = [threading.Thread(target=write, args=(n,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        stats = sqlite_db.pool_stats()
+        assert len(sqlite_db.list_all_addresses()) == 400
+        assert stats["writes"] == 400
+        assert stats["commits"] <= 400
+        assert stats["pending"] == 0
+
+    def test_failed_commit_is_raised(self, sqlite_db: SqliteCursor) -> None:
+        """
+        Test that a write failing in its group commit raises to its writer.
+
+        Args:
+            sqlite_db (SqliteCursor): SqliteCursor instance.
+
+        Returns:
+            None
+        """
+        with pytest.raises(Exception):
+            sqlite_db.persist_on_database(None, "BTC")
+        sqlite_db.persist_on_database("address", "BTC")
+        assert sqlite_db.list_all_addresses() == ["address"]
+
+    def test_create_backend(self, tmp_path, monkeypatch) -> None:
+        """
+        Test that db_connector creates the configured backend.
+
+        Args:
+            tmp_path: The pytest temporary directory.
+            monkeypatch: The pytest monkeypatch fixture.
+
+        Returns:
+            None
+        """
+        monkeypatch.setenv("SQLITE_PATH", str(tmp_path / "backend.db"))
+
+        assert isinstance(db_connector.create_backend("sqlite"), SqliteCursor)
+        with pytest.raises(ValueError):
+            db_connector.create_backend("unknown")
+
+
+class TestShardedBackend:
+    @pytest.fixture
+    def sharded_db(self) -> ShardedBackend:
+        """
+        Fixture providing a ShardedBackend over three in-memory SQLite shards, with
+        Bitcoin on shard 0 and Ethereum on shard 2.
+
+        Returns:
+            ShardedBackend: ShardedBackend instance.
+        """
+        shards = [SqliteCursor() for _ in range(3)]
+        return ShardedBackend(shards, key="currency", currencies="BTC:0,ETH:2", bits=4)
+
+    def test_ids_encode_the_shard(self, sharded_db: ShardedBackend) -> None:
+        """
+        Test that rows are written to the shard of their cryptocurrency, and that
+        their global IDs lead back to it.
+
+        Args:
+            sharded_db (ShardedBackend): ShardedBackend instance.
+
+        Returns:
+            None
+        """
+        sharded_db.persist_many_on_database(["btc_1", "btc_2"], "BTC")
+        sharded_db.persist_on_database("eth_1", "ETH")
+
+        assert sharded_db.shards[0].list_all_addresses() == ["btc_1", "btc_2"]
+        assert sharded_db.shards[2].list_all_addresses() == ["eth_1"]
+        assert sharded_db.list_addresses_page(0, 10) == [
+            (16, "btc_1"), (32, "btc_2"), (50, "eth_1")
+        ]
+        assert sharded_db.retrieve_address(50) == "eth_1"
+        assert sharded_db.retrieve_address(49) is None
+        assert sharded_db.retrieve_address(34) is None
+        assert sharded_db.find_address("btc_2") == (32, "BTC")
+        assert sharded_db.find_addresses(["eth_1", "unknown"]) == {"eth_1": (50, "ETH")}
+        assert sharded_db.table_state() == (50, 3)
+        assert sharded_db.recent_addresses(2) == [(50, "eth_1"), (32, "btc_2")]
+
+    def test_ids_follow_the_order_of_inserts(self, sharded_db: ShardedBackend) -> None:
+        """
+        Test that a row inserted into a shard holding fewer rows gets a global ID past
+        the cursor of the rows read before, so incremental readers see it.
+
+        Args:
+            sharded_db (ShardedBackend): ShardedBackend instance.
+
+        Returns:
+            None
+        """
+        sharded_db.persist_many_on_database([f"btc_{i}" for i in range(100)], "BTC")
+        cursor = max(id for id, _, _ in sharded_db.iter_address_rows(0))
+        sharded_db.persist_on_database("eth_1", "ETH")
+
+        rows = list(sharded_db.iter_address_rows(cursor))
+
+        assert [(address, crypto) for _, address, crypto in rows] == [("eth_1", "ETH")]
+        assert sharded_db.table_state()[0] == rows[0][0]
+
+    def test_ids_reserved_in_blocks(self) -> None:
+        """
+        Test that row IDs are reserved from the shared counter a block at a time, and
+        that processes sharing it never hand out the same ID.
+
+        Returns:
+            None
+        """
+        shards = [SqliteCursor() for _ in range(2)]
+        first = ShardedBackend(shards, currencies="BTC:0,ETH:1", bits=4, id_block=10)
+        second = ShardedBackend(shards, currencies="BTC:0,ETH:1", bits=4, id_block=10)
+
+        with mock.patch.object(
+            shards[0], "reserve_child_indexes", wraps=shards[0].reserve_child_indexes
+        ) as reserve:
+            for i in range(15):
+                first.persist_on_database(f"btc_{i}", "BTC")
+            calls = reserve.call_count
+        second.persist_many_on_database(["eth_1", "eth_2"], "ETH")
+        first.persist_on_database("btc_15", "BTC")
+
+        # The alignment reads the counter, then two blocks cover the 15 inserts.
+        assert calls == 3
+        assert first.find_address("btc_15") == (16 << 4, "BTC")
+        assert second.find_addresses(["eth_1", "eth_2"]) == {
+            "eth_1": ((21 << 4) | 1, "ETH"), "eth_2": ((22 << 4) | 1, "ETH")
+        }
+
+    def test_ids_continue_past_rows_stored_before(self) -> None:
+        """
+        Test that the ID counter starts past the rows stored in any shard before it
+        was used.
+
+        Returns:
+            None
+        """
+        shards = [SqliteCursor() for _ in range(2)]
+        shards[1].persist_many_on_database(["eth_1", "eth_2", "eth_3"], "ETH")
+        sharded_db = ShardedBackend(shards, key="currency", currencies="BTC:0,ETH:1", bits=4)
+
+        sharded_db.persist_on_database("btc_1", "BTC")
+        sharded_db.persist_on_database("eth_4", "ETH")
+
+        assert [address for _, address in sharded_db.list_addresses_page(0, 10)] == [
+            "eth_1", "eth_2", "eth_3", "btc_1", "eth_4"
+        ]
+        assert sharded_db.find_address("btc_1") == (64, "BTC")
+
+    def test_pages_cover_all_shards(self) -> None:
+        """
+        Test that paging through the merged shards by global ID, with addresses spread
+        by hash, lists every row exactly once and in order, whatever the page size.
+
+        Returns:
+            None
+        """
+        sharded_db = ShardedBackend([SqliteCursor() for _ in range(3)], key="hash", bits=2)
+        addresses = [f"address_{i}" for i in range(100)]
+        sharded_db.persist_many_on_database(addresses, "BTC")
+
+        assert all(shard.table_state()[1] for shard in sharded_db.shards)
+        assert sharded_db.table_state()[1] == 100
+        for limit in (1, 7, 100):
+            rows, after_id = [], 0
+            while True:
+                page = sharded_db.list_addresses_page(after_id, limit)
+                if not page:
+                    break
+                rows.extend(page)
+                after_id = page[-1][0]
+            assert sorted(address for _, address in rows) == sorted(addresses)
+            assert [id for id, _ in rows] == sorted({id for id, _ in rows})
+        assert list(sharded_db.iter_addresses(0, 8)) == sharded_db.list_addresses_page(0, 100)
+        assert len(list(sharded_db.iter_address_rows(rows[49][0], 8))) == 50
+        assert sharded_db.find_addresses(addresses) == {
+            address: (id, "BTC") for id, address in rows
+        }
+
+    def test_child_indexes_on_the_currency_shard(self, sharded_db: ShardedBackend) -> None:
+        """
+        Test that HD child indexes of a cryptocurrency are reserved on one counter.
+
+        Args:
+            sharded_db (ShardedBackend): ShardedBackend instance.
+
+        Returns:
+            None
+        """
+        assert sharded_db.reserve_child_indexes("ETH", 5) == 0
+        assert sharded_db.reserve_child_indexes("ETH", 5) == 5
+        assert sharded_db.shards[2].reserve_child_indexes("ETH", 1) == 10
+
+    def test_create_sharded_backend(self, tmp_path) -> None:
+        """
+        Test that db_connector shards the backend over the listed databases.
+
+        Args:
+            tmp_path: The pytest temporary directory.
+
+        Returns:
+            None
+        """
+        shards = [str(tmp_path / f"shard_{i}.db") for i in range(2)]
+
+        backend = db_connector.create_backend("sqlite", shards)
+
+        assert isinstance(backend, ShardedBackend)
+        assert [shard.database for shard in backend.shards] == shards
+        assert backend.pool_stats()["backend"] == "sharded"
+        with pytest.raises(ValueError):
+            ShardedBackend(backend.shards, key="range")
+
+
+class TestReplicatedBackend:
+    @pytest.fixture
+    def replicated_db(self) -> ReplicatedBackend:
+        """
+        Fixture providing a ReplicatedBackend over in-memory SQLite databases standing
+        in for a primary and two replicas, which the tests replicate by hand.
+
+        Returns:
+            ReplicatedBackend: ReplicatedBackend instance.
+        """
+        return ReplicatedBackend(
+            SqliteCursor(), [SqliteCursor(), SqliteCursor()], max_lag=5, check_interval=0
+        )
+
+    @staticmethod
+    def replicate(replicated_db: ReplicatedBackend, index: int) -> None:
+        """
+        Copies to a replica the rows of the primary it does not have.
+
+        Args:
+            replicated_db (ReplicatedBackend): ReplicatedBackend instance.
+            index (int): The replica.
+
+        Returns:
+            None
+        """
+        replica = replicated_db.replicas[index]
+        for _, address, crypto in replicated_db.primary.iter_address_rows(replica.table_state()[0]):
+            replica.persist_on_database(address, crypto)
+
+    def test_reads_go_to_replicas(self, replicated_db: ReplicatedBackend) -> None:
+        """
+        Test that writes go to the primary, reads to the replicas in turn, and that
+        the latency of every target is recorded.
+
+        Args:
+            replicated_db (ReplicatedBackend): ReplicatedBackend instance.
+
+        Returns:
+            None
+        """
+        replicated_db.persist_many_on_database(["first", "second"], "BTC")
+        self.replicate(replicated_db, 0)
+        self.replicate(replicated_db, 1)
+        replicated_db.replicas[1].persist_on_database("only_on_replica_1", "BTC")
+        replicated_db.last_write -= replicated_db.max_lag + 1
+
+        pages = [replicated_db.list_addresses_page(0, 10) for _ in range(4)]
+        stats = replicated_db.pool_stats()
+
+        assert sorted(len(page) for page in pages) == [2, 2, 3, 3]
+        assert replicated_db.primary.list_all_addresses() == ["first", "second"]
+        assert stats["targets"]["replica_0"]["queries"] >= 2
+        assert stats["targets"]["replica_1"]["lag"] == 0
+        assert stats["targets"]["primary"]["queries"] >= 1
+        assert stats["targets"]["primary"]["max_ms"] >= stats["targets"]["primary"]["mean_ms"]
+        assert "blockchain_db_query_duration_seconds" in metrics.render()
+
+    def test_read_your_writes(self, replicated_db: ReplicatedBackend) -> None:
+        """
+        Test that the ID and address just created are read from the primary until the
+        replicas have them.
+
+        Args:
+            replicated_db (ReplicatedBackend): ReplicatedBackend instance.
+
+        Returns:
+            None
+        """
+        replicated_db.persist_on_database("created", "ETH")
+
+        assert replicated_db.retrieve_address(1) == "created"
+        assert replicated_db.find_address("created") == (1, "ETH")
+        assert replicated_db.pool_stats()["primary_reads"] == 2
+        self.replicate(replicated_db, 0)
+        self.replicate(replicated_db, 1)
+        replicated_db.check_replicas()
+        assert replicated_db.retrieve_address(1) == "created"
+        assert replicated_db.pool_stats()["primary_reads"] == 2
+
+    def test_list_state_follows_writes(self, replicated_db: ReplicatedBackend) -> None:
+        """
+        Test that the table state and the list pages are read from the primary
+        shortly after a write, so the list cache sees the rows just inserted.
+
+        Args:
+            replicated_db (ReplicatedBackend): ReplicatedBackend instance.
+
+        Returns:
+            None
+        """
+        replicated_db.persist_on_database("first", "BTC")
+        self.replicate(replicated_db, 0)
+        self.replicate(replicated_db, 1)
+        replicated_db.persist_on_database("second", "BTC")
+
+        assert replicated_db.table_state() == (2, 2)
+        assert replicated_db.list_addresses_page(0, 10) == [(1, "first"), (2, "second")]
+        replicated_db.last_write -= replicated_db.max_lag + 1
+        assert replicated_db.table_state() == (1, 1)
+
+    def test_write_behind_checks_the_primary(
+        self, replicated_db: ReplicatedBackend, tmp_path
+    ) -> None:
+        """
+        Test that the write-behind queue checks journaled rows against the primary
+        after a restart, when a lagging replica does not have them yet.
+
+        Args:
+            replicated_db (ReplicatedBackend): ReplicatedBackend instance.
+            tmp_path: The pytest temporary directory.
+
+        Returns:
+            None
+        """
+        import controller
+
+        replicated_db.persist_on_database("journaled", "BTC")
+        # A restarted process has not written yet.
+        replicated_db.last_write = None
+
+        assert replicated_db.find_address("journaled") is None
+        with mock.patch("db_connector.get_cursor", return_value=replicated_db):
+            queue = controller.create_write_queue(str(tmp_path / "journal"))
+            assert queue.exists("journaled")
+            assert not queue.exists("unknown")
+
+    def test_lagging_replicas_fall_back(self, replicated_db: ReplicatedBackend) -> None:
+        """
+        Test that reads skip the replicas lagging more than the bound or failing, and
+        fall back to the primary when none is left.
+
+        Args:
+            replicated_db (ReplicatedBackend): ReplicatedBackend instance.
+
+        Returns:
+            None
+        """
+        replicated_db.max_lag = 0.05
+        replicated_db.persist_on_database("first", "BTC")
+        replicated_db.check_replicas()
+        self.replicate(replicated_db, 1)
+        time.sleep(0.1)
+        replicated_db.check_replicas()
+
+        assert replicated_db.replica_lags[0] > 0.05
+        assert replicated_db.replica_lags[1] == 0
+        assert replicated_db._pick() == 1
+
+        replicated_db.replicas[1].max_id = mock.Mock(side_effect=RuntimeError("down"))
+        replicated_db.check_replicas()
+        fallbacks = replicated_db.pool_stats()["fallbacks"]
+
+        assert replicated_db.table_state() == (1, 1)
+        assert replicated_db.pool_stats()["fallbacks"] == fallbacks + 1
+        assert replicated_db.pool_stats()["targets"]["replica_1"]["healthy"] is False
+
+    def test_failing_primary_keeps_the_lags(self, replicated_db: ReplicatedBackend) -> None:
+        """
+        Test that a check failing on the primary keeps the previous lags, is not
+        retried before the next interval, and does not fail replica reads.
+
+        Args:
+            replicated_db (ReplicatedBackend): ReplicatedBackend instance.
+
+        Returns:
+            None
+        """
+        replicated_db.persist_on_database("first", "BTC")
+        self.replicate(replicated_db, 0)
+        self.replicate(replicated_db, 1)
+        replicated_db.last_write = None
+        replicated_db.check_replicas()
+        replicated_db.primary.max_id = mock.Mock(side_effect=RuntimeError("down"))
+        replicated_db.primary.table_state = mock.Mock(side_effect=AssertionError("scan"))
+        replicated_db.check_interval = 60
+        replicated_db.checked_at = None
+
+        assert replicated_db.list_addresses_page(0, 10) == [(1, "first")]
+        assert replicated_db.list_addresses_page(0, 10) == [(1, "first")]
+        assert replicated_db.primary.max_id.call_count == 1
+        assert replicated_db.replica_lags == [0, 0]
+        assert replicated_db.pool_stats()["fallbacks"] == 0
+
+    def test_create_replicated_backend(self, tmp_path, monkeypatch) -> None:
+        """
+        Test that db_connector reads from the listed replicas, and rejects replicas of
+        shards.
+
+        Args:
+            tmp_path: The pytest temporary directory.
+            monkeypatch: The pytest monkeypatch fixture.
+
+        Returns:
+            None
+        """
+        monkeypatch.setenv("SQLITE_PATH", str(tmp_path / "primary.db"))
+        replicas = [str(tmp_path / "replica.db")]
+
+        backend = db_connector.create_backend("sqlite", [], replicas)
+
+        assert isinstance(backend, ReplicatedBackend)
+        assert backend.replicas[0].database == replicas[0]
+        with pytest.raises(ValueError):
+            db_connector.create_backend("sqlite", [str(tmp_path / "shard.db")], replicas)
@@ -46,6 +46,32 @@ class TestApiIntegration:
         error_data = json.loads(response.text)
         assert "error" in error_data
 
+    def test_generate_address_batch(self) -> None:
+        """
+        Test the batch generate address endpoint.
+
+        Returns:
+            None
+        """
+        data = {"crypto_currency": "BTC", "count": 3}
+        response = post(SERVER_URL + "/api-blockchain/generate/batch", json=data)
+        assert response.status_code == 201
+        address_data = json.loads(response.text)
+        assert len(address_data["addresses"]) == 3
+
+    def test_generate_address_batch_invalid_count(self) -> None:
+        """
+        Test the batch generate address endpoint with an invalid count.
+
+        Returns:
+            None
+        """
+        data = {"crypto_currency": "BTC", "count": 0}
+        response = post(SERVER_URL + "/api-blockchain/generate/batch", json=data)
+        assert response.status_code == 400
+        error_data = json.loads(response.text)
+        assert "error" in error_data
+
     def test_list_addresses(self) -> None:
         """
         Test the list addresses endpoint.
@@ -58,6 +84,37 @@ class TestApiIntegration:
         addresses_data = json.loads(response.text)
         assert "addresses" in addresses_data
 
+    def test_list_addresses_paginated(self) -> None:
+        """
+        Test the list addresses endpoint with keyset pagination.
+
+        Returns:
+            None
+        """
+        response = get(SERVER_URL + "/api-blockchain/list?limit=1")
+        assert response.status_code == 200
+        first_page = json.loads(response.text)
+        assert len(first_page["addresses"]) == 1
+
+        after_id = first_page["next_after_id"]
+        response = get(SERVER_URL + f"/api-blockchain/list?after_id={after_id}&limit=1")
+        assert response.status_code == 200
+        second_page = json.loads(response.text)
+        assert second_page["addresses"] != first_page["addresses"]
+
+    def test_list_addresses_ndjson(self) -> None:
+        """
+        Test the list addresses endpoint in NDJSON streaming mode.
+
+        Returns:
+            None
+        """
+        response = get(SERVER_URL + "/api-blockchain/list?format=ndjson")
+        assert response.status_code == 200
+        assert response.headers["Content-Type"].startswith("application/x-ndjson")
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert all("id" in row and "address" in row for row in rows)
+
     def test_retrieve_address(self) -> None:
         """
         Test the retrieve address endpoint.
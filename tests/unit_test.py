@@ -1,5 +1,30 @@
+import io
+import os
+import sys
+import json
+import time
+import hashlib
+import subprocess
+import export
 import pytest
 from unittest import mock
+from botocore.exceptions import ClientError
+import key_vault
+from key_vault import KeyCache, LocalKeyStore, S3KeyStore
+from benchmarks import load_test, suite
+from benchmarks.standins import FakeS3Client, use_standins
+from address_pool import AddressPool
+from address_cache import AddressCache
+from bloom_filter import AddressFilter, BloomFilter
+from address_registry import AddressRegistry, DuplicateAddressError
+from list_cache import ListCache, etag_matches
+import validation
+from write_behind import WriteBehindQueue, recover_orphaned_journals
+from profiling import RequestProfiler
+from hd_wallet import HARDENED, ChildIndexAllocator, HDKeychain, derive_child, master_node
+from cryptography import CurrenciesEncrypter, DerivationEngine
+from db_mysql import ConnectionPool, DbCursor, PoolTimeoutError
+from metrics import Counter, Histogram, stage_timer, STAGE_ERRORS
 
 
 class TestKeyManager:
@@ -91,6 +116,31 @@ class TestKeyManager:
             # asserts that "persist_on_s3" was called one time, and with "private_key"
             # as an argument
 
+    def test_adopted_key_not_logged_as_fresh(self, caplog) -> None:
+        """
+        Test that a key lost to a concurrent writer is adopted and logged at info
+        level, and that only a key this process stored is logged as fresh.
+
+        Args:
+            caplog: The pytest log capture fixture.
+
+        Returns:
+            None
+        """
+        from cryptography import KeyManager
+
+        manager = KeyManager.__new__(KeyManager)
+        caplog.set_level("INFO")
+        with mock.patch.object(manager, "persist_private_key", return_value="winner_key"):
+            assert manager.generate_private_key("BTC") == "winner_key"
+        assert [record.levelname for record in caplog.records] == ["INFO"]
+
+        caplog.clear()
+        with mock.patch.object(manager, "persist_private_key", side_effect=lambda key, _: key):
+            manager.generate_private_key("BTC")
+        assert [record.levelname for record in caplog.records] == ["WARNING"]
+
+
 class TestCurrencyEncrypter:
 
     @pytest.mark.parametrize("crypto_n_prefix", [("BTC", ("1", "3", "bc1")),
@@ -243,3 +293,1464 @@ class TestCurrencyEncrypter:
             private_key = "private_key"
             generated_address = currencies_encrypter.tron_generator(private_key)
             assert generated_address == '41' + dummy_address
+
+    @pytest.mark.parametrize("crypto_symbol", ["BTC", "ETH", "TRO"])
+    def test_generate_addresses(self, currencies_encrypter, crypto_symbol) -> None:
+        """
+        Test generating a batch of addresses.
+
+        Args:
+            currencies_encrypter: The currencies encrypter fixture.
+            crypto_symbol: The crypto currency symbol.
+
+        Returns:
+            None
+        """
+        count = 5 if crypto_symbol == "BTC" else 1
+        addresses = currencies_encrypter.generate_addresses(crypto_symbol, "my_private_key", count)
+        assert len(addresses) == count
+        assert all(isinstance(address, str) for address in addresses)
+
+    @pytest.mark.parametrize("crypto_symbol", ["ETH", "TRO"])
+    def test_generate_deterministic_batch(self, currencies_encrypter, crypto_symbol) -> None:
+        """
+        Test that batches of Ethereum and Tron addresses of a single private key are
+        refused, rather than returning copies of one address.
+
+        Args:
+            currencies_encrypter: The currencies encrypter fixture.
+            crypto_symbol: The crypto currency symbol.
+
+        Returns:
+            None
+        """
+        with pytest.raises(ValueError):
+            currencies_encrypter.generate_addresses(crypto_symbol, "my_private_key", 2)
+
+    @pytest.mark.parametrize("crypto_symbol", ["ETH", "TRO"])
+    def test_derive_addresses(self, currencies_encrypter, crypto_symbol) -> None:
+        """
+        Test deriving the addresses of many private keys.
+
+        Args:
+            currencies_encrypter: The currencies encrypter fixture.
+            crypto_symbol: The crypto currency symbol.
+
+        Returns:
+            None
+        """
+        private_keys = [hashlib.sha256(str(i).encode()).hexdigest() for i in range(3)]
+        addresses = currencies_encrypter.derive_addresses(crypto_symbol, private_keys)
+        expected = [
+            currencies_encrypter.generate_address(crypto_symbol, key) for key in private_keys
+        ]
+        assert addresses == expected
+
+
+class TestDerivationEngine:
+    def test_parallel_derivation_matches_inline(self) -> None:
+        """
+        Test that a job sharded across worker processes keeps the inline results
+        and their order.
+
+        Returns:
+            None
+        """
+        private_keys = [hashlib.sha256(str(i).encode()).hexdigest() for i in range(50)]
+        inline = DerivationEngine(workers=1).derive("ETH", private_keys)
+        engine = DerivationEngine(workers=2, chunk_size=7, parallel_threshold=0)
+        try:
+            parallel = engine.derive("ETH", private_keys)
+        finally:
+            engine.shutdown()
+
+        assert parallel == inline
+        assert engine.stats()["addresses"] == 50
+        assert engine.stats()["addresses_per_sec"] > 0
+
+    def test_small_jobs_are_derived_inline(self) -> None:
+        """
+        Test that jobs below the threshold do not start worker processes.
+
+        Returns:
+            None
+        """
+        engine = DerivationEngine(workers=2, parallel_threshold=10)
+        with mock.patch.object(engine, "_get_executor") as mock_executor:
+            engine.derive("TRO", ["private_key"])
+            mock_executor.assert_not_called()
+
+
+class TestKeyCache:
+    def test_get_hits_after_first_load(self) -> None:
+        """
+        Test that only the first lookup reaches the vault.
+
+        Returns:
+            None
+        """
+        loader = mock.Mock(return_value={"BTC": "btc_key"})
+        cache = KeyCache(loader, ttl=60, refresh_interval=None)
+
+        assert cache.get("BTC") == "btc_key"
+        assert cache.get("BTC") == "btc_key"
+        assert cache.get("ETH") == ""
+        loader.assert_called_once()
+        assert cache.stats()["hits"] == 2
+        assert cache.stats()["misses"] == 1
+
+    def test_get_reloads_expired_keys(self) -> None:
+        """
+        Test that an expired mapping is reloaded from the vault.
+
+        Returns:
+            None
+        """
+        loader = mock.Mock(side_effect=[{"BTC": "old_key"}, {"BTC": "new_key"}])
+        cache = KeyCache(loader, ttl=0, refresh_interval=None)
+
+        assert cache.get("BTC") == "old_key"
+        assert cache.get("BTC") == "new_key"
+        assert cache.stats()["misses"] == 2
+
+    def test_invalidate_and_put(self) -> None:
+        """
+        Test explicit invalidation and storing freshly persisted keys.
+
+        Returns:
+            None
+        """
+        loader = mock.Mock(return_value={})
+        cache = KeyCache(loader, ttl=60, refresh_interval=None)
+
+        assert cache.get("ETH") == ""
+        cache.put("ETH", "eth_key")
+        assert cache.get("ETH") == "eth_key"
+        cache.invalidate()
+        assert cache.get("ETH") == ""
+        assert loader.call_count == 2
+
+    def test_refresh_keeps_keys_on_failure(self) -> None:
+        """
+        Test that a failed refresh keeps serving the previously loaded keys.
+
+        Returns:
+            None
+        """
+        loader = mock.Mock(side_effect=[{"TRO": "tro_key"}, Exception("S3 down")])
+        cache = KeyCache(loader, ttl=60, refresh_interval=None)
+
+        assert cache.get("TRO") == "tro_key"
+        cache.refresh()
+        assert cache.get("TRO") == "tro_key"
+        assert cache.stats()["refresh_errors"] == 1
+
+    def test_background_refresh(self) -> None:
+        """
+        Test that the background thread reloads the keys.
+
+        Returns:
+            None
+        """
+        refreshed = mock.Mock()
+        loader = mock.Mock(return_value={"BTC": "btc_key"})
+        cache = KeyCache(loader, ttl=60, refresh_interval=0.01)
+        cache.refresh = mock.Mock(side_effect=refreshed)
+
+        cache.get("BTC")
+        for _ in range(100):
+            if refreshed.called:
+                break
+            time.sleep(0.01)
+        cache.stop_background_refresh()
+        assert refreshed.called
+
+
+class TestKeyStores:
+    def test_local_store_keeps_first_key(self, tmp_path) -> None:
+        """
+        Test that the local store only writes the first key of a cryptocurrency.
+
+        Args:
+            tmp_path: The pytest temporary directory.
+
+        Returns:
+            None
+        """
+        store = LocalKeyStore(str(tmp_path))
+
+        assert store.create("BTC", "first_key") == "first_key"
+        assert store.create("BTC", "second_key") == "first_key"
+        assert store.create("ETH", "eth_key") == "eth_key"
+        assert store.read_all() == {"BTC": "first_key", "ETH": "eth_key"}
+
+    def test_s3_store_writes_one_object_per_currency(self) -> None:
+        """
+        Test that the S3 store writes per-currency objects conditionally.
+
+        Returns:
+            None
+        """
+        client = FakeS3Client()
+        store = S3KeyStore("bucket", client)
+
+        assert store.create("ETH", "first_key") == "first_key"
+        assert store.create("ETH", "second_key") == "first_key"
+        assert list(client.objects) == ["keys/ETH.json"]
+        assert store.read_all() == {"ETH": "first_key"}
+
+    def test_s3_store_reads_legacy_document(self) -> None:
+        """
+        Test that keys of the legacy shared document are still recovered.
+
+        Returns:
+            None
+        """
+        client = FakeS3Client()
+        client.objects[key_vault.LEGACY_OBJECT_KEY] = b'{"BTC": "legacy", "TRO": "legacy"}'
+        store = S3KeyStore("bucket", client)
+        store.create("TRO", "tro_key")
+
+        assert store.read_all() == {"BTC": "legacy", "TRO": "tro_key"}
+
+    def test_s3_store_never_shadows_unreadable_legacy_keys(self) -> None:
+        """
+        Test that a legacy document that cannot be read fails the recovery, without
+        caching an empty mapping, and that no per-currency object is created meanwhile.
+
+        Returns:
+            None
+        """
+        client = FakeS3Client()
+        client.objects[key_vault.LEGACY_OBJECT_KEY] = b'{"BTC": "legacy"}'
+        store = S3KeyStore("bucket", client)
+        denied = ClientError({"Error": {"Code": "AccessDenied"}}, "GetObject")
+        cache = KeyCache(key_vault.recover_from_s3, refresh_interval=0)
+
+        with mock.patch("key_vault._key_store", store):
+            with mock.patch.object(client, "get_object", side_effect=denied):
+                with pytest.raises(ClientError):
+                    cache.get("BTC")
+                with pytest.raises(ClientError):
+                    store.create("BTC", "new_key")
+            with mock.patch.object(client, "list_objects_v2", side_effect=denied):
+                with pytest.raises(ClientError):
+                    cache.get("BTC")
+            assert cache.get("BTC") == "legacy"
+
+        assert list(client.objects) == [key_vault.LEGACY_OBJECT_KEY]
+
+    def test_key_cache_serves_expired_keys_when_vault_fails(self) -> None:
+        """
+        Test that keys loaded before are served when a reload fails.
+
+        Returns:
+            None
+        """
+        loader = mock.Mock(side_effect=[{"BTC": "key"}, RuntimeError("down")])
+        cache = KeyCache(loader, ttl=0, refresh_interval=0)
+
+        assert cache.get("BTC") == "key"
+        assert cache.get("BTC") == "key"
+        assert cache.stats()["refresh_errors"] == 1
+
+    def test_persist_on_s3_coalesces_writes(self) -> None:
+        """
+        Test that a key persisted by the process is not written again.
+
+        Returns:
+            None
+        """
+        store = mock.Mock()
+        store.read_all.return_value = {}
+        store.create.side_effect = lambda crypto_currency, key: key
+        with mock.patch("key_vault._key_store", store):
+            key_vault.key_cache.get("BTC")
+            assert key_vault.persist_on_s3("first_key", "BTC") == "first_key"
+            assert key_vault.persist_on_s3("second_key", "BTC") == "first_key"
+
+        store.create.assert_called_once_with("BTC", "first_key")
+        assert key_vault.key_cache.get("BTC") == "first_key"
+
+
+class TestConnectionPool:
+    def test_connection_is_reused(self) -> None:
+        """
+        Test that a released connection is borrowed again instead of reopened.
+
+        Returns:
+            None
+        """
+        factory = mock.Mock(side_effect=lambda: mock.Mock())
+        pool = ConnectionPool(factory, size=2)
+
+        with pool.connection() as first:
+            assert pool.stats()["in_use"] == 1
+        with pool.connection() as second:
+            pass
+
+        assert first is second
+        factory.assert_called_once()
+        assert pool.stats()["idle"] == 1
+
+    def test_acquire_times_out_when_exhausted(self) -> None:
+        """
+        Test that borrowing from an exhausted pool fails after the wait timeout.
+
+        Returns:
+            None
+        """
+        pool = ConnectionPool(mock.Mock, size=1, timeout=0.01)
+        pool.acquire()
+
+        with pytest.raises(PoolTimeoutError):
+            pool.acquire()
+        assert pool.stats()["timeouts"] == 1
+
+    def test_stale_connection_is_reconnected(self) -> None:
+        """
+        Test that a connection failing the health check is replaced on borrow.
+
+        Returns:
+            None
+        """
+        stale = mock.Mock()
+        stale.is_connected.return_value = False
+        fresh = mock.Mock()
+        pool = ConnectionPool(mock.Mock(side_effect=[stale, fresh]), size=1)
+
+        pool.release(pool.acquire())
+        connection = pool.acquire()
+
+        assert connection is fresh
+        stale.close.assert_called_once()
+        assert pool.stats()["reconnects"] == 1
+
+    def test_failed_connect_frees_slot(self) -> None:
+        """
+        Test that a failing connect does not leak a pool slot.
+
+        Returns:
+            None
+        """
+        factory = mock.Mock(side_effect=[ConnectionError("down"), mock.Mock()])
+        pool = ConnectionPool(factory, size=1, timeout=0.01)
+
+        with pytest.raises(ConnectionError):
+            pool.acquire()
+        assert pool.acquire() is not None
+        assert pool.stats()["open"] == 1
+
+    def test_broken_connection_is_discarded(self) -> None:
+        """
+        Test that a connection whose rollback fails after an error is closed.
+
+        Returns:
+            None
+        """
+        broken = mock.Mock()
+        broken.rollback.side_effect = ConnectionError("lost")
+        pool = ConnectionPool(mock.Mock(return_value=broken), size=1)
+
+        with pytest.raises(RuntimeError):
+            with pool.connection():
+                raise RuntimeError("query failed")
+
+        broken.close.assert_called_once()
+        assert pool.stats()["open"] == 0
+
+
+class TestDbCursorStreaming:
+    @pytest.fixture
+    def connection(self):
+        """
+        Fixture patching the MySQL driver with a mocked connection.
+
+        Yields:
+            mock.Mock: The mocked connection.
+        """
+        with mock.patch("db_mysql.mysql.connector.connect") as mock_connect:
+            yield mock_connect.return_value
+
+    def test_iter_addresses_reads_in_chunks(self, connection) -> None:
+        """
+        Test that streamed rows are fetched in chunks and the connection is returned.
+
+        Args:
+            connection: The mocked connection fixture.
+
+        Returns:
+            None
+        """
+        cursor = connection.cursor.return_value
+        cursor.fetchmany.side_effect = [[(1, "a"), (2, "b")], [(3, "c")], []]
+        db = DbCursor("host", "user", "password", "database")
+
+        rows = list(db.iter_addresses(after_id=0, chunk_size=2))
+
+        assert rows == [(1, "a"), (2, "b"), (3, "c")]
+        cursor.fetchmany.assert_called_with(2)
+        assert db.pool_stats()["idle"] == 1
+
+    def test_iter_addresses_discards_partially_read_connection(self, connection) -> None:
+        """
+        Test that a stream closed early discards its connection.
+
+        Args:
+            connection: The mocked connection fixture.
+
+        Returns:
+            None
+        """
+        cursor = connection.cursor.return_value
+        cursor.fetchmany.return_value = [(1, "a"), (2, "b")]
+        db = DbCursor("host", "user", "password", "database")
+
+        rows = db.iter_addresses()
+        next(rows)
+        rows.close()
+
+        connection.close.assert_called_once()
+        assert db.pool_stats()["open"] == 0
+
+
+    def test_connections_autocommit(self) -> None:
+        """
+        Test that connections are opened in autocommit mode, so pooled connections
+        used for reads do not keep a stale snapshot.
+
+        Returns:
+            None
+        """
+        with mock.patch("db_mysql.mysql.connector.connect") as mock_connect:
+            DbCursor("host", "user", "password", "database").table_state()
+
+        assert mock_connect.call_args.kwargs["autocommit"] is True
+
+class TestMigrations:
+    def test_migrations_create_the_schema_of_the_queries(self) -> None:
+        """
+        Test that the shipped migrations apply in order and create the index and the
+        table that DbCursor queries.
+
+        Returns:
+            None
+        """
+        import sqlite3
+
+        directory = os.path.join(os.path.dirname(os.path.dirname(__file__)), "migrations")
+        migrations = sorted(name for name in os.listdir(directory) if name.endswith(".sql"))
+        connection = sqlite3.connect(":memory:")
+        connection.execute(
+            "CREATE TABLE crypto_address (id INTEGER PRIMARY KEY, address TEXT, "
+            "crypto_currency TEXT)"
+        )
+        for name in migrations:
+            with open(os.path.join(directory, name)) as file:
+                connection.executescript(file.read())
+
+        names = {row[0] for row in connection.execute("SELECT name FROM sqlite_master")}
+        assert {"idx_crypto_address_address", "hd_child_index"} <= names
+        connection.execute(
+            "INSERT INTO hd_child_index (crypto_currency, next_index) VALUES ('BTC', 0)"
+        )
+
+
+class TestAddressPool:
+    @staticmethod
+    def refill(crypto_symbol: str, count: int) -> list:
+        """
+        Stand-in refill generating numbered addresses.
+
+        Args:
+            crypto_symbol: The crypto currency symbol.
+            count: The number of addresses.
+
+        Returns:
+            list: The addresses.
+        """
+        return [f"{crypto_symbol}_{i}" for i in range(count)]
+
+    def test_refill_tops_up_to_high_watermark(self) -> None:
+        """
+        Test that a refill reaches the high watermark in batches.
+
+        Returns:
+            None
+        """
+        refill = mock.Mock(side_effect=self.refill)
+        pool = AddressPool(["BTC"], refill, low_watermark=2, high_watermark=5, batch_size=2)
+
+        assert pool.refill_once("BTC") == 5
+        assert [call.args[1] for call in refill.call_args_list] == [2, 2, 1]
+        assert pool.stats()["BTC"]["depth"] == 5
+        assert pool.stats()["BTC"]["refill_rate"] > 0
+
+    def test_pop_serves_addresses_in_order(self) -> None:
+        """
+        Test that addresses are served first in, first out.
+
+        Returns:
+            None
+        """
+        pool = AddressPool(["ETH"], self.refill, high_watermark=2)
+        pool.refill_once("ETH")
+
+        assert pool.pop("ETH") == "ETH_0"
+        assert pool.pop("ETH") == "ETH_1"
+        assert pool.stats()["ETH"]["popped"] == 2
+
+    def test_pop_from_dry_or_unknown_pool(self) -> None:
+        """
+        Test that a dry pool counts a miss and unknown currencies are not pooled.
+
+        Returns:
+            None
+        """
+        pool = AddressPool(["TRO"], self.refill)
+
+        assert pool.pop("TRO") is None
+        assert pool.pop("XYZ") is None
+        assert pool.stats()["TRO"]["misses"] == 1
+
+    def test_warmer_refills_below_low_watermark(self) -> None:
+        """
+        Test that the background warmer fills the pool and refills it once drained
+        below the low watermark.
+
+        Returns:
+            None
+        """
+        pool = AddressPool(["BTC"], self.refill, low_watermark=2, high_watermark=3, interval=0.01)
+        pool.start()
+        try:
+            for _ in range(100):
+                if pool.stats()["BTC"]["depth"] == 3:
+                    break
+                time.sleep(0.01)
+            pool.pop("BTC")
+            pool.pop("BTC")
+            for _ in range(100):
+                if pool.stats()["BTC"]["refilled"] == 5:
+                    break
+                time.sleep(0.01)
+        finally:
+            pool.stop()
+
+        assert pool.stats()["BTC"]["refilled"] == 5
+        assert pool.stats()["BTC"]["depth"] == 3
+
+
+    def test_deterministic_currencies_pooled_with_hd(self) -> None:
+        """
+        Test that Ethereum and Tron are only pooled with HD derivation, since their
+        private key otherwise yields a single address.
+
+        Returns:
+            None
+        """
+        import controller
+
+        with mock.patch("hd_wallet.HD_DERIVATION_ENABLED", False):
+            assert list(controller.create_pool().pools) == ["BTC"]
+        with mock.patch("hd_wallet.HD_DERIVATION_ENABLED", True):
+            assert list(controller.create_pool().pools) == ["BTC", "ETH", "TRO"]
+
+class TestAddressCache:
+    def test_lookups_hit_after_first_load(self) -> None:
+        """
+        Test that only the first lookup of an ID reaches the loader.
+
+        Returns:
+            None
+        """
+        loader = mock.Mock(return_value="address")
+        cache = AddressCache()
+
+        assert cache.get_or_load(1, loader) == "address"
+        assert cache.get_or_load(1, loader) == "address"
+        loader.assert_called_once_with(1)
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    def test_least_recently_used_is_evicted(self) -> None:
+        """
+        Test that the cache keeps its size limit by evicting the least recently used.
+
+        Returns:
+            None
+        """
+        cache = AddressCache(max_size=2)
+        cache.put(1, "first")
+        cache.put(2, "second")
+        cache.get_or_load(1, mock.Mock())
+        cache.put(3, "third")
+
+        loader = mock.Mock(return_value="second")
+        cache.get_or_load(2, loader)
+        loader.assert_called_once_with(2)
+        assert cache.stats()["evictions"] == 2
+
+    def test_missing_ids_are_cached_briefly(self) -> None:
+        """
+        Test that missing IDs are cached until their TTL expires or an insert.
+
+        Returns:
+            None
+        """
+        loader = mock.Mock(return_value=None)
+        cache = AddressCache(negative_ttl=60)
+
+        assert cache.get_or_load(7, loader) is None
+        assert cache.get_or_load(7, loader) is None
+        assert loader.call_count == 1
+        assert cache.stats()["negative_hits"] == 1
+
+        cache.forget_missing()
+        cache.get_or_load(7, loader)
+        assert loader.call_count == 2
+
+        expired = AddressCache(negative_ttl=0)
+        expired.get_or_load(7, loader)
+        expired.get_or_load(7, loader)
+        assert loader.call_count == 4
+
+    def test_warm(self) -> None:
+        """
+        Test warming the cache with recent rows.
+
+        Returns:
+            None
+        """
+        cache = AddressCache()
+        loader = mock.Mock()
+
+        assert cache.warm([(2, "second"), (1, "first")]) == 2
+        assert cache.get_or_load(1, loader) == "first"
+        loader.assert_not_called()
+
+
+class TestBenchmarkSuite:
+    def test_run_measures_cases(self) -> None:
+        """
+        Test that the suite runs offline and reports each selected case.
+
+        Returns:
+            None
+        """
+        results = suite.run(iterations=2, warmup=0, only="generator")
+
+        assert set(results["results"]) == {"generator.BTC", "generator.ETH", "generator.TRO"}
+        assert results["results"]["generator.BTC"]["ops_per_sec"] > 0
+
+    def test_run_measures_cold_start(self) -> None:
+        """
+        Test that the cold start case serves a first request in a fresh process.
+
+        Returns:
+            None
+        """
+        results = suite.run(iterations=1, warmup=0, only="coldstart.asgi", coldstart_runs=1)
+
+        assert set(results["results"]) == {"coldstart.asgi"}
+        assert results["results"]["coldstart.asgi"]["first_request_ms"] > 0
+
+    def test_compare_flags_regressions(self) -> None:
+        """
+        Test that only cases slower than the tolerated regression are reported.
+
+        Returns:
+            None
+        """
+        baseline = {"results": {"fast": {"median_us": 10.0}, "slow": {"median_us": 10.0},
+                                "custom": {"median_us": 10.0, "max_regression": 1.0}}}
+        results = {"results": {"fast": {"median_us": 11.0}, "slow": {"median_us": 13.0},
+                               "custom": {"median_us": 15.0}}}
+
+        regressions = suite.compare(results, baseline, max_regression=0.25)
+
+        assert len(regressions) == 1
+        assert regressions[0].startswith("slow")
+
+
+class TestMetrics:
+    def test_histogram_renders_cumulative_buckets(self) -> None:
+        """
+        Test that a histogram renders cumulative buckets, the sum and the count of
+        each label set.
+
+        Returns:
+            None
+        """
+        histogram = Histogram("latency_seconds", "Latency.", ("route",), buckets=(0.1, 1.0))
+        histogram.observe(0.05, "/a")
+        histogram.observe(0.5, "/a")
+        histogram.observe(5.0, "/a")
+
+        lines = histogram.render()
+
+        assert 'latency_seconds_bucket{route="/a",le="0.1"} 1' in lines
+        assert 'latency_seconds_bucket{route="/a",le="1.0"} 2' in lines
+        assert 'latency_seconds_bucket{route="/a",le="+Inf"} 3' in lines
+        assert 'latency_seconds_sum{route="/a"} 5.55' in lines
+        assert 'latency_seconds_count{route="/a"} 3' in lines
+
+    def test_counter_escapes_labels(self) -> None:
+        """
+        Test that label values are escaped.
+
+        Returns:
+            None
+        """
+        counter = Counter("errors_total", "Errors.", ("route",))
+        counter.inc('say "hi"')
+        counter.inc('say "hi"', amount=2)
+
+        assert 'errors_total{route="say \\"hi\\""} 3.0' in counter.render()
+
+    def test_stage_timer_counts_failures(self) -> None:
+        """
+        Test that a failing stage is timed and counted as an error.
+
+        Returns:
+            None
+        """
+        with pytest.raises(RuntimeError):
+            with stage_timer("test_stage", "BTC"):
+                raise RuntimeError("boom")
+
+        assert 'blockchain_stage_errors_total{stage="test_stage",currency="BTC"} 1.0' in (
+            STAGE_ERRORS.render()
+        )
+
+    def test_stage_timer_bounds_currency_labels(self) -> None:
+        """
+        Test that unknown cryptocurrencies are recorded under a single label.
+
+        Returns:
+            None
+        """
+        for currency in ("XYZ", "abc"):
+            with pytest.raises(RuntimeError):
+                with stage_timer("label_stage", currency):
+                    raise RuntimeError("boom")
+
+        rendered = STAGE_ERRORS.render()
+        assert 'blockchain_stage_errors_total{stage="label_stage",currency="other"} 2.0' in (
+            rendered
+        )
+        assert "XYZ" not in rendered
+
+
+class TestBloomFilter:
+    def test_no_false_negatives(self) -> None:
+        """
+        Test that every added item is reported, and that the false positive rate stays
+        near the configured rate at capacity.
+
+        Returns:
+            None
+        """
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add(f"added-{i}")
+
+        assert all(f"added-{i}" in bloom for i in range(1000))
+        false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+        assert false_positives < 300
+
+    def test_address_filter_rejects_unknown_addresses(self) -> None:
+        """
+        Test that unknown addresses are answered without calling the finder, and that
+        the filter is built from the stored rows on the first lookup.
+
+        Returns:
+            None
+        """
+        address_filter = AddressFilter(capacity=100)
+        finder = mock.Mock(return_value=(1, "BTC"))
+        stream = mock.Mock(return_value=iter([(1, "stored")]))
+
+        assert address_filter.lookup("unknown", finder, stream) is None
+        assert address_filter.lookup("stored", finder, stream) == (1, "BTC")
+        finder.assert_called_once_with("stored")
+        stream.assert_called_once_with(0)
+
+        address_filter.add("inserted")
+        assert address_filter.lookup("inserted", finder, stream) == (1, "BTC")
+
+    def test_address_filter_syncs_and_rebuilds(self) -> None:
+        """
+        Test that syncs add the rows stored since the last one, and that the filter is
+        rebuilt with a larger capacity once it outgrows the configured one.
+
+        Returns:
+            None
+        """
+        rows = [(i, f"address-{i}") for i in range(1, 31)]
+        address_filter = AddressFilter(capacity=10)
+
+        def stream(after_id):
+            return iter([row for row in rows if row[0] > after_id])
+
+        assert address_filter.sync(stream) == 30
+        assert address_filter.sync(stream) == 0
+        assert address_filter.stats()["capacity"] == 60
+        assert address_filter.last_id == 30
+        assert all(address in address_filter._bloom for _, address in rows)
+
+
+class TestStartup:
+    def test_import_does_no_io(self) -> None:
+        """
+        Test that importing the service neither creates the storage backend nor loads
+        the heavy clients.
+
+        Returns:
+            None
+        """
+        code = (
+            "import sys, asgi, db_connector\n"
+            "loaded = [m for m in ('boto3', 'coincurve', 'db_mysql', 'db_sqlite') if m in sys.modules]\n"
+            "print(loaded, db_connector.cursor)"
+        )
+        output = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True
+        ).stdout
+
+        assert output.strip() == "[] None"
+
+    def test_warm_up_survives_failures(self) -> None:
+        """
+        Test that a failing warm-up step is reported without stopping the others, and
+        that readiness follows the database.
+
+        Returns:
+            None
+        """
+        import controller
+
+        with mock.patch("db_connector.get_cursor", side_effect=OSError("unreachable")), \
+                mock.patch("controller.key_vault.key_cache.get") as get_key:
+            results = controller.warm_up()
+            ready, checks = controller.check_readiness()
+
+        assert results["database"] == "unreachable"
+        assert results["derivation"] == "ok"
+        get_key.assert_called_once()
+        assert not ready
+        assert checks == {"warm_up": "done", "database": "unreachable"}
+
+
+class TestHDWallet:
+    def test_bip32_test_vector(self) -> None:
+        """
+        Test the derivation against the first test vector of BIP32, for a hardened and
+        a normal child.
+
+        Returns:
+            None
+        """
+        master = master_node(bytes.fromhex("000102030405060708090a0b0c0d0e0f"))
+        hardened = derive_child(master, HARDENED)
+        child = derive_child(hardened, 1)
+
+        assert format(master.private_key, "064x") == (
+            "e8f32e723decf4051aefac8e2c93c9c5b214313817cdb01a1494b917c8436b35"
+        )
+        assert hardened.chain_code.hex() == (
+            "47fdacbd0f1097043b78c63c20c34ef4ed9a111d980047ad16282c7ae6236141"
+        )
+        assert format(child.private_key, "064x") == (
+            "3c6cb8d0f6a264c91ea8b5030fadaa8e538b020f0a387421a12de9319dc93368"
+        )
+
+    def test_keychain_caches_parent_nodes(self) -> None:
+        """
+        Test that child keys are deterministic and distinct, and that the parent node
+        is derived once per cryptocurrency and master secret.
+
+        Returns:
+            None
+        """
+        keychain = HDKeychain()
+        secret = hashlib.sha256(b"master").hexdigest()
+
+        keys = keychain.child_keys("ETH", secret, [0, 1, 2])
+
+        assert len(set(keys)) == 3
+        assert keychain.child_key("ETH", secret, 1) == keys[1]
+        assert keychain.child_key("TRO", secret, 1) != keys[1]
+        assert keychain.stats() == {"size": 2, "hits": 1, "misses": 2}
+
+    def test_allocator_reserves_blocks(self) -> None:
+        """
+        Test that indexes are served from reserved blocks, and that a batch larger than
+        a block reserves what it needs at once.
+
+        Returns:
+            None
+        """
+        counter = {"next": 0}
+
+        def reserve(crypto, count):
+            first = counter["next"]
+            counter["next"] += count
+            return first
+
+        allocator = ChildIndexAllocator(mock.Mock(side_effect=reserve), block_size=3)
+
+        assert allocator.allocate("ETH") == [0]
+        assert allocator.allocate("ETH", 2) == [1, 2]
+        assert allocator.allocate("ETH", 5) == [3, 4, 5, 6, 7]
+        assert allocator.allocate("ETH") == [8]
+        assert allocator.reserve.call_count == 3
+
+
+class TestWriteBehindQueue:
+    def test_append_is_journaled_then_flushed(self, tmp_path) -> None:
+        """
+        Test that appended rows are in the journal on return, and that a flush persists
+        them per cryptocurrency and checkpoints them.
+
+        Args:
+            tmp_path: The pytest temporary directory.
+
+        Returns:
+            None
+        """
+        persist = mock.Mock()
+        path = str(tmp_path / "journal")
+        queue = WriteBehindQueue(persist, lambda address: False, path=path, interval=60)
+
+        queue.append([("a", "BTC"), ("b", "ETH"), ("c", "BTC")])
+
+        with open(path) as journal:
+            assert len(journal.readlines()) == 3
+        assert queue.stats()["depth"] == 3
+        assert queue.flush_once()
+        persist.assert_has_calls([mock.call(["a", "c"], "BTC"), mock.call(["b"], "ETH")])
+        assert queue.stats()["depth"] == 0
+        with open(path + ".checkpoint") as checkpoint:
+            assert checkpoint.read() == "3"
+        queue.stop()
+
+    def test_replay_after_failed_flush(self, tmp_path) -> None:
+        """
+        Test that rows never flushed are replayed by the next queue on the journal,
+        skipping stored rows and a torn last line.
+
+        Args:
+            tmp_path: The pytest temporary directory.
+
+        Returns:
+            None
+        """
+        path = str(tmp_path / "journal")
+        failing = WriteBehindQueue(
+            mock.Mock(side_effect=OSError("down")), lambda address: False, path=path, interval=60
+        )
+        failing.append([("a", "BTC"), ("b", "BTC"), ("c", "BTC")])
+        failing.stop()
+        with open(path, "a") as journal:
+            journal.write('[4, "torn"')
+
+        persist = mock.Mock()
+        queue = WriteBehindQueue(persist, lambda address: address == "a", path=path, interval=60)
+        queue.start()
+
+        assert queue.stats()["replayed"] == 2
+        assert queue.flush_once()
+        persist.assert_called_once_with(["b", "c"], "BTC")
+        queue.append([("d", "ETH")])
+        with open(path) as journal:
+            assert journal.readlines()[-1] == '[4, "d", "ETH"]\n'
+        queue.stop()
+
+    def test_replay_after_compaction(self, tmp_path) -> None:
+        """
+        Test that rows journaled after a compaction and a restart are numbered past
+        the checkpoint, so that they are replayed after a crash.
+
+        Args:
+            tmp_path: The pytest temporary directory.
+
+        Returns:
+            None
+        """
+        path = str(tmp_path / "journal")
+        compacted = WriteBehindQueue(
+            mock.Mock(), lambda address: False, path=path, interval=60, compact_bytes=1
+        )
+        compacted.append([("a", "BTC"), ("b", "BTC")])
+        assert compacted.flush_once()
+        compacted.stop()
+        assert os.path.getsize(path) == 0
+
+        failing = WriteBehindQueue(
+            mock.Mock(side_effect=OSError("down")), lambda address: False, path=path, interval=60
+        )
+        failing.append([("c", "BTC"), ("d", "BTC")])
+        failing.stop()
+
+        persist = mock.Mock()
+        queue = WriteBehindQueue(persist, lambda address: False, path=path, interval=60)
+        queue.start()
+
+        assert queue.stats()["replayed"] == 2
+        assert queue.flush_once()
+        persist.assert_called_once_with(["c", "d"], "BTC")
+        queue.stop()
+
+
+class TestExport:
+    ROWS = [(1, "addr_1", "BTC"), (2, "addr,2", "ETH"), (300, "addr_3", "BTC"), (2 ** 40, "a4", "TRO")]
+
+    def test_csv(self) -> None:
+        """
+        Test the CSV encoding, quoting included.
+
+        Returns:
+            None
+        """
+        data = b"".join(export.export_csv(self.ROWS[:2], chunk_size=1))
+
+        assert data == b'id,address,crypto_currency\r\n1,addr_1,BTC\r\n2,"addr,2",ETH\r\n'
+
+    def test_columnar_round_trip(self) -> None:
+        """
+        Test that the columnar encoding decodes back to the same rows, across row
+        groups.
+
+        Returns:
+            None
+        """
+        data = b"".join(export.export_columnar(self.ROWS, chunk_size=3))
+
+        assert list(export.read_columnar(io.BytesIO(data))) == self.ROWS
+        with pytest.raises(ValueError):
+            list(export.read_columnar(io.BytesIO(b"not columnar")))
+
+    def test_cli_exports_since_id(self, tmp_path, capsys) -> None:
+        """
+        Test that the command exports the rows after `--since-id` to a file.
+
+        Args:
+            tmp_path: The pytest temporary directory.
+            capsys: The pytest capture fixture.
+
+        Returns:
+            None
+        """
+        output = tmp_path / "export.col"
+        with use_standins() as standins:
+            standins["db"].persist_many_on_database(["a", "b", "c"], "ETH")
+            status = export.main(["--format", "columnar", "--since-id", "1",
+                                  "--output", str(output)])
+
+        with open(output, "rb") as file:
+            assert list(export.read_columnar(file)) == [(2, "b", "ETH"), (3, "c", "ETH")]
+        assert status == 0
+        assert "Exported 2 rows, last id 3" in capsys.readouterr().err
+
+
+class TestAddressRegistry:
+    def test_claims_detect_duplicates(self) -> None:
+        """
+        Test that claiming a known address fails per cryptocurrency, and that the
+        tables grow at a bounded number of bytes per address.
+
+        Returns:
+            None
+        """
+        registry = AddressRegistry(capacity=8, max_load=0.5)
+
+        assert all(registry.claim("BTC", f"address-{i}") for i in range(1000))
+        assert not registry.claim("BTC", "address-7")
+        assert registry.claim("ETH", "address-7")
+        assert registry.contains("BTC", "address-999")
+        assert not registry.contains("BTC", "unknown")
+        stats = registry.stats()
+        assert stats["BTC"]["addresses"] == 1000
+        assert 8 / 0.5 <= stats["BTC"]["bytes_per_address"] <= 2 * 8 / 0.5
+        assert stats["duplicates"] == 1
+
+    def test_sync_loads_stored_rows(self) -> None:
+        """
+        Test that syncs record the rows stored since the last one, which can then no
+        longer be claimed.
+
+        Returns:
+            None
+        """
+        rows = [(1, "a", "BTC"), (2, "b", "ETH"), (3, "c", "BTC")]
+        registry = AddressRegistry(capacity=8)
+
+        def stream(after_id):
+            return iter([row for row in rows if row[0] > after_id])
+
+        assert registry.sync(stream) == 3
+        assert registry.sync(stream) == 0
+        assert registry.last_id == 3
+        assert not registry.claim("BTC", "c")
+        assert registry.claim("BTC", "b")
+
+    def test_generation_replaces_duplicates(self) -> None:
+        """
+        Test that generated addresses already known, or repeated in the batch, are
+        generated again, and that an address always repeated is refused.
+
+        Returns:
+            None
+        """
+        import controller
+
+        with use_standins(), mock.patch(
+            "address_registry.ADDRESS_REGISTRY_ENABLED", True
+        ), mock.patch("controller.CurrenciesEncrypter") as encrypter:
+            encrypter.return_value.generate_addresses.side_effect = [
+                ["known", "new-1", "new-1"], ["new-2", "new-3"]
+            ]
+            encrypter.return_value.generate_address.return_value = "same"
+            controller.registry.claim("BTC", "known")
+
+            assert controller.generate_addresses_to_crypto("BTC", 3) == ["new-1", "new-2", "new-3"]
+            assert controller.generate_address_to_crypto("ETH") == "same"
+            with pytest.raises(DuplicateAddressError):
+                controller.generate_address_to_crypto("ETH")
+
+    def test_lowercase_request_found_after_sync(self) -> None:
+        """
+        Test that an address requested with a lower-case symbol is stored under the
+        upper-case one, and still known to the registry after a resync.
+
+        Returns:
+            None
+        """
+        import controller
+
+        with use_standins() as standins, mock.patch(
+            "address_registry.ADDRESS_REGISTRY_ENABLED", True
+        ), mock.patch("address_pool.ADDRESS_POOL_ENABLED", False):
+            standins["db"].persist_on_database("legacy", "btc")
+            address = controller.issue_address("btc")
+            controller.registry.clear()
+            controller.sync_address_registry()
+
+            assert standins["db"].find_address(address)[1] == "BTC"
+            assert controller.registry.contains("BTC", address)
+            assert controller.registry.contains("BTC", "legacy")
+            assert "btc" not in controller.registry.stats()
+
+    def test_warns_without_hd_derivation(self, caplog) -> None:
+        """
+        Test that enabling the registry without HD derivation is logged at startup.
+
+        Args:
+            caplog: The pytest log capture fixture.
+
+        Returns:
+            None
+        """
+        import controller
+
+        with mock.patch("address_registry.ADDRESS_REGISTRY_ENABLED", True):
+            with mock.patch("hd_wallet.HD_DERIVATION_ENABLED", True):
+                controller.create_registry()
+            assert not caplog.records
+            with mock.patch("hd_wallet.HD_DERIVATION_ENABLED", False):
+                controller.create_registry()
+
+        assert "HD_DERIVATION_ENABLED" in caplog.text
+
+
+class TestRequestProfiler:
+    def test_saves_and_prunes_profiles(self, tmp_path) -> None:
+        """
+        Test that profiles are saved in the pstats format, listed most recent first,
+        and pruned beyond `keep`.
+
+        Args:
+            tmp_path: The pytest temporary directory.
+
+        Returns:
+            None
+        """
+        import pstats
+
+        profiler = RequestProfiler(str(tmp_path), sample_rate=0.0, admin_token="secret", keep=2)
+        assert not profiler.should_profile(None)
+        assert not profiler.should_profile("wrong")
+        assert profiler.should_profile("secret")
+
+        names = []
+        for _ in range(3):
+            profile = profiler.start()
+            sum(range(1000))
+            names.append(profiler.finish(profile, "get", "/api-blockchain/list", 0.01))
+
+        assert [profile["name"] for profile in profiler.list()] == names[:0:-1]
+        assert pstats.Stats(profiler.path(names[2])).total_calls > 0
+        assert profiler.path(names[0]) is None
+        assert profiler.path("../secret.prof") is None
+
+    def test_flask_routes(self, tmp_path) -> None:
+        """
+        Test that a request carrying the admin token is profiled, and that its profile
+        can be listed and downloaded with the token only.
+
+        Args:
+            tmp_path: The pytest temporary directory.
+
+        Returns:
+            None
+        """
+        import run
+
+        headers = {"X-Profile-Token": "secret"}
+        with use_standins() as standins, mock.patch.object(
+            run, "profiler", RequestProfiler(str(tmp_path), admin_token="secret")
+        ):
+            standins["db"].persist_on_database("address", "BTC")
+            client = run.app.test_client()
+            assert "X-Profile-Id" not in client.get("/api-blockchain/addresses/1").headers
+            response = client.get("/api-blockchain/addresses/1", headers=headers)
+            name = response.headers["X-Profile-Id"]
+
+            assert response.json == {"address": "address"}
+            assert "api_blockchain_addresses_address_id" in name
+            assert client.get("/api-blockchain/profiles").status_code == 403
+            listed = client.get("/api-blockchain/profiles", headers=headers).json
+            assert [profile["name"] for profile in listed["profiles"]] == [name]
+            download = client.get(f"/api-blockchain/profiles/{name}", headers=headers)
+            assert download.status_code == 200
+            assert download.data == (tmp_path / name).read_bytes()
+            missing = client.get("/api-blockchain/profiles/0-GET-x.prof", headers=headers)
+            assert missing.status_code == 404
+
+    def test_profiles_hidden_without_admin_token(self, tmp_path) -> None:
+        """
+        Test that sampled profiles are neither listed nor downloaded when no admin
+        token is set.
+
+        Args:
+            tmp_path: The pytest temporary directory.
+
+        Returns:
+            None
+        """
+        import run
+
+        profiler = RequestProfiler(str(tmp_path), sample_rate=1.0, admin_token="")
+        with use_standins(), mock.patch.object(run, "profiler", profiler):
+            client = run.app.test_client()
+            name = client.get("/api-blockchain/").headers["X-Profile-Id"]
+
+            assert client.get("/api-blockchain/profiles").status_code == 404
+            assert client.get(f"/api-blockchain/profiles/{name}").status_code == 404
+
+
+class TestForkSafety:
+    def test_forked_process_renews_shared_state(self) -> None:
+        """
+        Test that a forked process drops the backend, key store and reserved child
+        indexes of its parent, and journals to its own file.
+
+        Returns:
+            None
+        """
+        import controller
+        import db_connector
+
+        with use_standins():
+            db_connector.get_cursor()
+            key_vault.get_key_store()
+            read, write = os.pipe()
+            pid = os.fork()
+            if pid == 0:
+                state = [
+                    db_connector.cursor is None,
+                    key_vault._key_store is None,
+                    controller.write_queue.path.endswith(f".{os.getpid()}"),
+                    controller.child_indexes._blocks == {},
+                ]
+                os.write(write, json.dumps(state).encode())
+                os._exit(0)
+            os.close(write)
+            with os.fdopen(read) as pipe:
+                state = json.loads(pipe.read())
+            os.waitpid(pid, 0)
+
+            assert state == [True, True, True, True]
+            assert db_connector.cursor is not None
+
+    def test_orphaned_journals_are_recovered(self, tmp_path) -> None:
+        """
+        Test that the journal of a stopped worker is flushed by another queue, then
+        removed, while a journal held by a live queue is left alone.
+
+        Args:
+            tmp_path: The pytest temporary directory.
+
+        Returns:
+            None
+        """
+        base = str(tmp_path / "journal")
+        with open(base + ".123", "w") as journal:
+            journal.write(json.dumps([1, "orphan", "BTC"]) + "\n")
+        live = WriteBehindQueue(mock.Mock(), lambda address: False, path=base + ".456", interval=60)
+        live.start()
+        persist = mock.Mock()
+        queue = WriteBehindQueue(persist, lambda address: False, path=base, interval=60)
+
+        assert recover_orphaned_journals(queue, base) == 1
+        persist.assert_called_once_with(["orphan"], "BTC")
+        assert sorted(os.listdir(tmp_path)) == ["journal.456"]
+        live.stop()
+
+
+class TestLoadTest:
+    def test_parse_mix(self) -> None:
+        """
+        Test that a mix is parsed to route weights, and that unknown routes and
+        invalid weights are refused.
+
+        Returns:
+            None
+        """
+        assert load_test.parse_mix("generate=1, list=0.5") == {"generate": 1.0, "list": 0.5}
+        for mix in ("stats=1", "list=x", "list=-1", "list=0"):
+            with pytest.raises(ValueError):
+                load_test.parse_mix(mix)
+
+    def test_report_percentiles(self) -> None:
+        """
+        Test the per-route and total summaries of the recorded requests.
+
+        Returns:
+            None
+        """
+        recorder = load_test.Recorder()
+        for i in range(1, 101):
+            recorder.record("list", i / 1000, ok=i != 100)
+        recorder.record("generate", 0.5, ok=True)
+
+        report = recorder.report(elapsed=2.0)
+
+        assert report["list"] == {
+            "requests": 100, "errors": 1, "error_rate": 0.01, "throughput_rps": 50.0,
+            "p50_ms": 50.0, "p95_ms": 95.0, "p99_ms": 99.0, "max_ms": 100.0,
+        }
+        assert report["total"]["requests"] == 101
+        assert report["total"]["max_ms"] == 500.0
+
+    @pytest.mark.parametrize("rate", [None, 200.0])
+    def test_in_process_run(self, rate) -> None:
+        """
+        Test a short closed- and open-loop run against the in-process app, which
+        serves every route of the mix without errors.
+
+        Args:
+            rate (float): The open-loop arrival rate, or None for a closed loop.
+
+        Returns:
+            None
+        """
+        mix = load_test.parse_mix(load_test.DEFAULT_MIX)
+
+        report = load_test.run(mix, duration=0.3, concurrency=4, rate=rate, max_id=50, seed=1)
+
+        assert report["mode"] == ("open" if rate else "closed")
+        assert set(report["routes"]) == {"generate", "list", "addresses", "total"}
+        assert report["routes"]["total"]["errors"] == 0
+        if rate:
+            assert 20 <= report["routes"]["total"]["requests"] <= 120
+
+
+class TestListCache:
+    def test_state_is_loaded_once_per_ttl(self) -> None:
+        """
+        Test that the table state is loaded again only once expired or invalidated,
+        and that pages are cached per ETag.
+
+        Returns:
+            None
+        """
+        load_state = mock.Mock(return_value=(5, 5))
+        build = mock.Mock(return_value=b"page")
+        cache = ListCache(load_state, state_ttl=60)
+
+        assert cache.respond((0, 10), None, build) == (b"page", '"5-5"')
+        assert cache.respond((0, 10), None, build) == (b"page", '"5-5"')
+        assert cache.respond((0, 10), '"5-5"', build) == (None, '"5-5"')
+        assert (load_state.call_count, build.call_count) == (1, 1)
+
+        load_state.return_value = (6, 6)
+        cache.invalidate()
+        assert cache.respond((0, 10), '"5-5"', build) == (b"page", '"6-6"')
+        assert (load_state.call_count, build.call_count) == (2, 2)
+        assert cache.stats() == {
+            "size": 1, "hits": 1, "misses": 2, "not_modified": 1, "state_loads": 2
+        }
+
+    def test_etag_matches(self) -> None:
+        """
+        Test the weak comparison of If-None-Match headers.
+
+        Returns:
+            None
+        """
+        assert etag_matches('"1-1"', '"1-1"')
+        assert etag_matches('"0-0", W/"1-1"', '"1-1"')
+        assert etag_matches("*", '"1-1"')
+        assert not etag_matches('"1-2"', '"1-1"')
+
+
+class TestValidation:
+    PRIVATE_KEY = "4c0883a69102937d6231471b5dbb6204fe5129617082792ae468d01a3f362318"
+
+    def test_generated_addresses_are_valid(self) -> None:
+        """
+        Test that the addresses of every generator pass the rules of their
+        cryptocurrency, and are detected as such.
+
+        Returns:
+            None
+        """
+        encrypter = CurrenciesEncrypter(seed=1)
+        addresses = {
+            "BTC": [encrypter.bitcoin_generator(str(i)) for i in range(200)],
+            "ETH": [encrypter.ethereum_generator(self.PRIVATE_KEY)],
+            "TRO": [encrypter.tron_generator(self.PRIVATE_KEY)],
+        }
+
+        for crypto, generated in addresses.items():
+            for address in generated:
+                assert validation.validate_address(address) == (crypto, None)
+                assert validation.validate_address(address, crypto) == (crypto, None)
+
+    def test_invalid_addresses(self) -> None:
+        """
+        Test the reasons given for malformed addresses, addresses of another
+        cryptocurrency and bad EIP-55 checksums.
+
+        Returns:
+            None
+        """
+        hex40 = "5aaeb6053f3e94c9b9a09f33669435e7ef1beaed"
+
+        assert validation.validate_address("1" + "a" * 24) == (None, "unknown address format")
+        assert validation.validate_address("1" + "a" * 35) == (None, "unknown address format")
+        assert validation.validate_address("0x" + hex40[:-1]) == (None, "unknown address format")
+        assert validation.validate_address("41" + hex40 + "0") == (None, "unknown address format")
+        assert validation.validate_address(42) == (None, "not a string")
+        assert validation.validate_address("41" + hex40, "ETH") == (
+            "ETH", "invalid ETH address format"
+        )
+        assert validation.validate_address("0x5aAeb6053F3E94C9b9A09f33669435E7Ef1BeAed") == (
+            "ETH", None
+        )
+        assert validation.validate_address("0x5aAeb6053F3E94C9b9A09f33669435E7Ef1BeAeD") == (
+            "ETH", "invalid EIP-55 checksum"
+        )
+        assert validation.validate_address("0x" + hex40.upper()) == ("ETH", None)
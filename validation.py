@@ -0,0 +1,120 @@
+import re
+from typing import Dict, List, Optional, Pattern, Tuple
+from sha3 import keccak_256
+
+# The address formats produced by CurrenciesEncrypter: a "1", "3" or "bc1" prefix
+# followed by letters and digits for 26 to 35 characters in all (trim_bitcoin_key),
+# "0x" and 40 hex digits (ethereum_generator), "41" and 40 hex digits (tron_generator).
+PATTERNS: Dict[str, Pattern] = {
+    "BTC": re.compile(r"(?:[13][0-9A-Za-z]{25,34}|bc1[0-9A-Za-z]{23,32})"),
+    "ETH": re.compile(r"0x[0-9A-Fa-f]{40}"),
+    "TRO": re.compile(r"41[0-9A-Fa-f]{40}"),
+}
+# Hex addresses are case-insensitive, and stored in lower case.
+CASE_INSENSITIVE = ("ETH", "TRO")
+
+
+def detect_currency(address: str) -> Optional[str]:
+    """
+    Finds the cryptocurrency whose address format matches an address. The formats are
+    disjoint.
+
+    Args:
+        address (str): The address.
+
+    Returns:
+        str: The cryptocurrency symbol, or None if no format matches.
+    """
+    for crypto, pattern in PATTERNS.items():
+        if pattern.fullmatch(address):
+            return crypto
+    return None
+
+
+def is_checksum_address(address: str) -> bool:
+    """
+    Checks the EIP-55 mixed-case checksum of an Ethereum address: each letter is upper
+    case if and only if the matching nibble of the Keccak-256 digest of the lower case
+    address is 8 or more.
+
+    Args:
+        address (str): The "0x"-prefixed address.
+
+    Returns:
+        bool: True if the checksum holds.
+    """
+    hex_address = address[2:]
+    digest = keccak_256(hex_address.lower().encode()).hexdigest()
+    return all(
+        char.isupper() == (int(nibble, 16) >= 8)
+        for char, nibble in zip(hex_address, digest)
+        if char.isalpha()
+    )
+
+
+def validate_address(
+    address: str, crypto: Optional[str] = None
+) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Validates an address against the format of a cryptocurrency, or of any when none
+    is given. Mixed-case Ethereum addresses must carry a valid EIP-55 checksum.
+
+    Args:
+        address (str): The address.
+        crypto (str, optional): The expected cryptocurrency symbol. Defaults to None.
+
+    Returns:
+        tuple: The cryptocurrency of the address, or None if unknown, and the reason it
+            is invalid, or None if it is valid.
+    """
+    if not isinstance(address, str):
+        return None, "not a string"
+    if crypto is None:
+        crypto = detect_currency(address)
+        if crypto is None:
+            return None, "unknown address format"
+    elif not PATTERNS[crypto].fullmatch(address):
+        return crypto, f"invalid {crypto} address format"
+    if crypto == "ETH" and address[2:] not in (address[2:].lower(), address[2:].upper()):
+        if not is_checksum_address(address):
+            return crypto, "invalid EIP-55 checksum"
+    return crypto, None
+
+
+def validate_addresses(addresses: List[str], crypto: Optional[str] = None) -> List[Dict]:
+    """
+    Validates a batch of addresses.
+
+    Args:
+        addresses (List[str]): The addresses.
+        crypto (str, optional): The expected cryptocurrency symbol. Defaults to None,
+            to detect the cryptocurrency of each address.
+
+    Returns:
+        List[dict]: The address, cryptocurrency, validity and reason of each address,
+            in the same order.
+    """
+    results = []
+    for address in addresses:
+        detected, reason = validate_address(address, crypto)
+        results.append({
+            "address": address,
+            "crypto_currency": detected,
+            "valid": reason is None,
+            "reason": reason,
+        })
+    return results
+
+
+def storage_form(address: str, crypto: str) -> str:
+    """
+    Returns the form in which an address is stored, lower case for hex addresses.
+
+    Args:
+        address (str): The valid address.
+        crypto (str): Its cryptocurrency symbol.
+
+    Returns:
+        str: The stored form.
+    """
+    return address.lower() if crypto in CASE_INSENSITIVE else address
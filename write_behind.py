@@ -0,0 +1,314 @@
+import os
+import glob
+import json
+import time
+import fcntl
+import atexit
+import logging
+import threading
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+from settings import load_settings
+
+load_settings()
+
+logger = logging.getLogger()
+
+WRITE_BEHIND_ENABLED = os.environ.get("WRITE_BEHIND_ENABLED", "false").lower() == "true"
+WRITE_BEHIND_JOURNAL = os.environ.get("WRITE_BEHIND_JOURNAL", "write_behind.journal")
+WRITE_BEHIND_BATCH_SIZE = int(os.environ.get("WRITE_BEHIND_BATCH_SIZE", 1000))
+WRITE_BEHIND_INTERVAL = float(os.environ.get("WRITE_BEHIND_INTERVAL", 0.05))
+WRITE_BEHIND_COMPACT_BYTES = int(
+    os.environ.get("WRITE_BEHIND_COMPACT_BYTES", 16 * 1024 * 1024)
+)
+
+Row = Tuple[str, str]
+
+
+class WriteBehindQueue:
+    def __init__(
+        self,
+        persist: Callable[[List[str], str], None],
+        exists: Callable[[str], bool],
+        path: str = WRITE_BEHIND_JOURNAL,
+        batch_size: int = WRITE_BEHIND_BATCH_SIZE,
+        interval: float = WRITE_BEHIND_INTERVAL,
+        compact_bytes: int = WRITE_BEHIND_COMPACT_BYTES,
+    ) -> None:
+        """
+        Initializes a WriteBehindQueue object, which makes address writes durable in a
+        local append-only journal and persists them to the database in the background.
+
+        An append returns once its rows are fsync'd to the journal, and concurrent
+        appends share a single fsync. A flusher thread group-commits the journaled rows
+        in batches, and records the last committed sequence number in a checkpoint
+        file. On start, the rows of the journal past the checkpoint are replayed,
+        skipping those already stored. The journal is truncated once fully committed
+        and larger than `compact_bytes`. It is locked, so each process needs its own.
+
+        Args:
+            persist (Callable): Persists a batch of addresses of a cryptocurrency in
+                one transaction.
+            exists (Callable): Checks whether an address is already stored.
+            path (str, optional): The journal file. Defaults to WRITE_BEHIND_JOURNAL.
+            batch_size (int, optional): Maximum number of rows per flush. Defaults to
+                WRITE_BEHIND_BATCH_SIZE.
+            interval (float, optional): Seconds the flusher waits for rows, and between
+                retries of a failed flush. Defaults to WRITE_BEHIND_INTERVAL.
+            compact_bytes (int, optional): Journal size from which it is truncated once
+                fully committed. Defaults to WRITE_BEHIND_COMPACT_BYTES.
+        """
+        self.persist = persist
+        self.exists = exists
+        self.path = path
+        self.checkpoint_path = path + ".checkpoint"
+        self.batch_size = batch_size
+        self.interval = interval
+        self.compact_bytes = compact_bytes
+        self.flushed = 0
+        self.batches = 0
+        self.errors = 0
+        self.replayed = 0
+        self._pending: Deque[Tuple[int, float, Row]] = deque()
+        self._sequence = 0
+        self._written = 0
+        self._synced = 0
+        self._size = 0
+        self._journal = None
+        self._condition = threading.Condition()
+        self._sync_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._owner: Optional[int] = None
+
+    def start(self) -> None:
+        """
+        Opens and replays the journal, then starts the flusher thread, unless already
+        started.
+
+        Raises:
+            BlockingIOError: If another process holds the journal.
+        """
+        with self._condition:
+            if self._thread is not None:
+                return
+            self._journal = open(self.path, "a+b")
+            try:
+                fcntl.flock(self._journal, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                self._replay()
+            except Exception:
+                self._journal.close()
+                self._pending.clear()
+                raise
+            self._stopped.clear()
+            self._owner = os.getpid()
+            self._thread = threading.Thread(
+                target=self._run, name="write-behind-flusher", daemon=True
+            )
+            self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self) -> None:
+        """
+        Stops the flusher thread after a last flush, and closes the journal. Rows left
+        unflushed are replayed on the next start. Does nothing in a forked process,
+        the rows being the parent's to flush.
+        """
+        if self._owner != os.getpid():
+            return
+        with self._condition:
+            thread, self._thread = self._thread, None
+            self._stopped.set()
+            self._condition.notify_all()
+        if thread is None:
+            return
+        thread.join()
+        try:
+            while self._pending and self.flush_once():
+                pass
+        finally:
+            self._journal.close()
+
+    def append(self, rows: List[Row]) -> None:
+        """
+        Appends rows to the journal, and returns once they are durable.
+
+        Args:
+            rows (List[Row]): The address and cryptocurrency of each row.
+        """
+        self.start()
+        now = time.time()
+        with self._condition:
+            lines = []
+            for row in rows:
+                self._sequence += 1
+                lines.append(json.dumps([self._sequence, row[0], row[1]]) + "\n")
+                self._pending.append((self._sequence, now, row))
+            data = "".join(lines).encode()
+            self._journal.write(data)
+            self._written += len(data)
+            self._size += len(data)
+            target = self._written
+            if len(self._pending) >= self.batch_size:
+                self._condition.notify_all()
+        self._sync(target)
+
+    def flush_once(self) -> bool:
+        """
+        Persists a batch of journaled rows, one transaction per cryptocurrency, and
+        checkpoints them.
+
+        Returns:
+            bool: False if the flush failed, and the rows stay queued for a retry.
+        """
+        with self._flush_lock:
+            with self._condition:
+                batch = list(self._pending)[: self.batch_size]
+            if not batch:
+                return True
+            groups: Dict[str, List[Tuple[int, str]]] = {}
+            for sequence, _, (address, crypto) in batch:
+                groups.setdefault(crypto, []).append((sequence, address))
+            for crypto, entries in groups.items():
+                try:
+                    self.persist([address for _, address in entries], crypto)
+                except Exception as error:
+                    self.errors += 1
+                    logger.warning(f"Write-behind flush failed: {error}")
+                    return False
+                committed = {sequence for sequence, _ in entries}
+                with self._condition:
+                    self._pending = deque(
+                        entry for entry in self._pending if entry[0] not in committed
+                    )
+                self.flushed += len(entries)
+                self.batches += 1
+            self._checkpoint()
+            return True
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns the queue gauges and counters.
+
+        Returns:
+            dict: The number of rows waiting for a flush, the age in seconds of the
+                oldest one, the number of rows flushed and replayed, of batches, of
+                failed flushes, and the journal size in bytes.
+        """
+        with self._condition:
+            oldest = self._pending[0][1] if self._pending else None
+            return {
+                "depth": len(self._pending),
+                "flush_lag": round(time.time() - oldest, 3) if oldest else 0.0,
+                "flushed": self.flushed,
+                "batches": self.batches,
+                "errors": self.errors,
+                "replayed": self.replayed,
+                "journal_bytes": self._size,
+            }
+
+    def _sync(self, target: int) -> None:
+        # Group fsync: an appender waiting for the lock usually finds its bytes
+        # already synced by the previous holder.
+        if self._synced >= target:
+            return
+        with self._sync_lock:
+            if self._synced >= target:
+                return
+            with self._condition:
+                self._journal.flush()
+                written = self._written
+            os.fsync(self._journal.fileno())
+            self._synced = written
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            with self._condition:
+                if len(self._pending) < self.batch_size and not self._stopped.is_set():
+                    self._condition.wait(self.interval)
+            if not self.flush_once():
+                self._stopped.wait(self.interval)
+
+    def _checkpoint(self) -> None:
+        with self._condition:
+            committed = self._pending[0][0] - 1 if self._pending else self._sequence
+            if not self._pending and self._size >= self.compact_bytes:
+                self._journal.flush()
+                self._journal.truncate(0)
+                self._size = 0
+        temporary = self.checkpoint_path + ".tmp"
+        with open(temporary, "w") as file:
+            file.write(str(committed))
+        os.replace(temporary, self.checkpoint_path)
+
+    def _replay(self) -> None:
+        # Called with the condition held, before the flusher starts. Rows past the
+        # checkpoint may have been committed just before a crash, so stored ones are
+        # skipped. A torn last line, whose append never returned, is dropped. A
+        # compacted journal no longer holds the committed rows, so the sequence
+        # resumes from the checkpoint, or new rows would be taken for committed ones.
+        self._pending.clear()
+        committed = 0
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path) as file:
+                committed = int(file.read().strip() or 0)
+        self._sequence = max(self._sequence, committed)
+        self._journal.seek(0)
+        now = time.time()
+        valid = 0
+        for line in self._journal:
+            try:
+                sequence, address, crypto = json.loads(line)
+            except ValueError:
+                break
+            if not line.endswith(b"\n"):
+                break
+            valid += len(line)
+            self._sequence = max(self._sequence, sequence)
+            if sequence > committed and not self.exists(address):
+                self._pending.append((sequence, now, (address, crypto)))
+                self.replayed += 1
+        self._journal.truncate(valid)
+        self._size = valid
+
+
+def recover_orphaned_journals(queue: WriteBehindQueue, base: str = WRITE_BEHIND_JOURNAL) -> int:
+    """
+    Persists the rows left in the journals of stopped processes. In multi-process
+    serving, each worker journals to `<base>.<pid>`, which no new worker reopens, so
+    a journal that no live process holds is replayed and flushed by `queue`, then
+    removed with its checkpoint.
+
+    Args:
+        queue (WriteBehindQueue): The queue of this process, whose persistence and
+            settings are used.
+        base (str, optional): The journal path of single-process serving, also the
+            prefix of the per-process journals. Defaults to WRITE_BEHIND_JOURNAL.
+
+    Returns:
+        int: The number of rows persisted.
+    """
+    recovered = 0
+    for path in sorted(glob.glob(glob.escape(base) + "*")):
+        suffix = path[len(base):]
+        if path == queue.path or (suffix and not (suffix[0] == "." and suffix[1:].isdigit())):
+            continue
+        orphan = WriteBehindQueue(
+            queue.persist, queue.exists, path, queue.batch_size, queue.interval,
+            queue.compact_bytes,
+        )
+        try:
+            orphan.start()
+        except BlockingIOError:
+            continue
+        orphan.stop()
+        if orphan.stats()["depth"]:
+            continue
+        recovered += orphan.replayed
+        for leftover in (path, orphan.checkpoint_path):
+            try:
+                os.remove(leftover)
+            except FileNotFoundError:
+                pass
+    return recovered